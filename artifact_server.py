@@ -0,0 +1,225 @@
+"""
+Cache-friendly artifact serving for the FastAPI backend.
+
+Mount with app.include_router(build_router(), prefix="/artifacts"):
+- GET /artifacts/runs/{run}          listing of a run's files with versioned URLs
+- GET /artifacts/runs/{run}/zip      every file of a run as one streamed zip
+- GET /artifacts/file/{path}         one file; ?size=thumb|small|medium for a resized JPEG
+
+Every file response carries an ETag and Last-Modified and answers conditional
+requests with 304. URLs from the listing carry ?v=<content hash>; a request whose
+v matches the file's current hash is content-addressed and is served with an
+immutable, year-long Cache-Control, so repeat views cost no request at all.
+Resized variants are cached on disk under ARTIFACT_ROOT/.thumbs keyed by content
+hash. All paths are resolved inside ARTIFACT_ROOT; anything escaping it is a 404.
+"""
+
+import hashlib
+import io
+import os
+import threading
+import zipfile
+from email.utils import formatdate, parsedate_to_datetime
+
+from script_runner import ARTIFACT_ROOT
+
+try:
+    from PIL import Image
+except ImportError:  # size variants need pillow
+    Image = None
+
+# --- Configuration ---
+THUMB_DIR = ".thumbs"
+SIZE_VARIANTS = {"thumb": 160, "small": 320, "medium": 800}
+THUMB_QUALITY = 80
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+VERSION_LENGTH = 16  # hex digits of the content hash in versioned URLs (?v=)
+REVALIDATE_CACHE = "no-cache"
+ZIP_CHUNK = 64 * 1024
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp")
+
+_hash_cache = {}  # path -> ((size, mtime_ns), sha256 hex)
+_hash_lock = threading.Lock()
+
+
+def resolve_artifact(relative_path: str, root: str = ARTIFACT_ROOT) -> str:
+    """Absolute path of relative_path inside root; ValueError if it escapes root"""
+    real_root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(real_root, relative_path.lstrip("/\\")))
+    if os.path.commonpath([real_root, path]) != real_root:
+        raise ValueError("Path escapes the artifact root")
+    return path
+
+
+def content_hash(path: str) -> str:
+    """sha256 of a file, cached until its size or mtime changes"""
+    stat = os.stat(path)
+    key = (stat.st_size, stat.st_mtime_ns)
+    with _hash_lock:
+        cached = _hash_cache.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    with _hash_lock:
+        _hash_cache[path] = (key, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def not_modified(path: str, etag: str, if_none_match: str = None, if_modified_since: str = None) -> bool:
+    """True when the client's cached copy is still current"""
+    if if_none_match:
+        return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if if_modified_since:
+        try:
+            return int(os.path.getmtime(path)) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def cache_headers(path: str, version: str = None, size: str = None) -> dict:
+    """ETag/Last-Modified plus immutable caching when the request names the file's current content hash"""
+    digest = content_hash(path)
+    immutable = version == digest[:VERSION_LENGTH]
+    return {
+        "ETag": f'"{digest[:32]}{"-" + size if size else ""}"',
+        "Last-Modified": formatdate(os.path.getmtime(path), usegmt=True),
+        "Cache-Control": IMMUTABLE_CACHE if immutable else REVALIDATE_CACHE
+    }
+
+
+def size_variant(path: str, size: str, root: str = ARTIFACT_ROOT) -> str:
+    """Path of a resized JPEG of an image, created once per content hash"""
+    if Image is None:
+        raise RuntimeError("Install pillow to serve size variants")
+    if size not in SIZE_VARIANTS:
+        raise ValueError(f"Unknown size: {size}")
+    thumb_dir = os.path.join(root, THUMB_DIR)
+    variant = os.path.join(thumb_dir, f"{content_hash(path)[:32]}_{size}.jpg")
+    if not os.path.exists(variant):
+        os.makedirs(thumb_dir, exist_ok=True)
+        with Image.open(path) as image:
+            image.thumbnail((SIZE_VARIANTS[size], SIZE_VARIANTS[size] * 4))
+            tmp = variant + f".{threading.get_ident()}.tmp"
+            image.convert("RGB").save(tmp, "JPEG", quality=THUMB_QUALITY, optimize=True)
+        os.replace(tmp, variant)
+    return variant
+
+
+def list_run(run_path: str, root: str = ARTIFACT_ROOT, url_prefix: str = "/artifacts") -> list:
+    """Files of a run with versioned (content-addressed) URLs and thumbnail URLs for images"""
+    run_dir = resolve_artifact(run_path, root)
+    real_root = os.path.realpath(root)
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(run_dir):
+        dirnames[:] = sorted(d for d in dirnames if d != THUMB_DIR)
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            relative = os.path.relpath(path, real_root).replace(os.sep, "/")
+            version = content_hash(path)[:VERSION_LENGTH]
+            entry = {
+                "path": relative,
+                "size": os.path.getsize(path),
+                "url": f"{url_prefix}/file/{relative}?v={version}"
+            }
+            if name.lower().endswith(IMAGE_EXTENSIONS) and Image is not None:
+                entry["thumb_url"] = f"{url_prefix}/file/{relative}?v={version}&size=thumb"
+            entries.append(entry)
+    return entries
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """Write-only sink whose contents are drained between zip writes"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def stream_zip(run_path: str, root: str = ARTIFACT_ROOT):
+    """Yield a zip of every file in a run without building it in memory or on disk"""
+    run_dir = resolve_artifact(run_path, root)
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for dirpath, dirnames, filenames in os.walk(run_dir):
+            dirnames[:] = sorted(d for d in dirnames if d != THUMB_DIR)
+            for name in sorted(filenames):
+                path = os.path.join(dirpath, name)
+                arcname = os.path.relpath(path, run_dir).replace(os.sep, "/")
+                # Images are already compressed; store them, deflate everything else
+                method = zipfile.ZIP_STORED if name.lower().endswith(IMAGE_EXTENSIONS) else zipfile.ZIP_DEFLATED
+                info = zipfile.ZipInfo.from_file(path, arcname)
+                info.compress_type = method
+                with open(path, "rb") as src, archive.open(info, "w") as dst:
+                    for chunk in iter(lambda: src.read(ZIP_CHUNK), b""):
+                        dst.write(chunk)
+                        data = buffer.drain()
+                        if data:
+                            yield data
+                yield buffer.drain()
+    yield buffer.drain()
+
+
+def build_router(root: str = ARTIFACT_ROOT, url_prefix: str = "/artifacts"):
+    """FastAPI router serving ARTIFACT_ROOT; mount with app.include_router(..., prefix=url_prefix)"""
+    from fastapi import APIRouter, Header, HTTPException
+    from fastapi.responses import FileResponse, Response, StreamingResponse
+    from typing import Optional
+
+    router = APIRouter()
+
+    def _resolve(path: str) -> str:
+        try:
+            resolved = resolve_artifact(path, root)
+        except ValueError:
+            raise HTTPException(status_code=404, detail="Artifact not found")
+        return resolved
+
+    @router.get("/runs/{run_path:path}/zip")
+    def download_run(run_path: str):
+        run_dir = _resolve(run_path)
+        if not os.path.isdir(run_dir):
+            raise HTTPException(status_code=404, detail="Run not found")
+        filename = os.path.basename(run_dir) + ".zip"
+        return StreamingResponse(stream_zip(run_path, root), media_type="application/zip",
+                                 headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+    @router.get("/runs/{run_path:path}")
+    def run_listing(run_path: str):
+        if not os.path.isdir(_resolve(run_path)):
+            raise HTTPException(status_code=404, detail="Run not found")
+        return {"run": run_path, "files": list_run(run_path, root, url_prefix),
+                "zip_url": f"{url_prefix}/runs/{run_path}/zip"}
+
+    @router.get("/file/{file_path:path}")
+    def get_artifact(file_path: str, v: Optional[str] = None, size: Optional[str] = None,
+                     if_none_match: Optional[str] = Header(None), if_modified_since: Optional[str] = Header(None)):
+        path = _resolve(file_path)
+        if not os.path.isfile(path):
+            raise HTTPException(status_code=404, detail="Artifact not found")
+        headers = cache_headers(path, v, size)
+        if not_modified(path, headers["ETag"], if_none_match, if_modified_since):
+            return Response(status_code=304, headers=headers)
+        if size:
+            try:
+                path = size_variant(path, size, root)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            except RuntimeError as e:
+                raise HTTPException(status_code=501, detail=str(e))
+        return FileResponse(path, headers=headers)
+
+    return router
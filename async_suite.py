@@ -0,0 +1,280 @@
+"""
+Async suite executor: many test cases, one browser.
+
+Every case runs in its own browser context (isolated cookies, storage and cache)
+inside a single browser launched through ``async_playwright`` - the pattern from
+testplaywrite.py. Cases run concurrently up to ``max_contexts``; each gets its
+own artifact directory and its own captured output.
+
+A case is code defining ``async def run_case(page, artifact_dir)``. Standalone
+sync scripts produced by generate_playwright_script are converted with
+sync_script_to_case().
+"""
+
+import ast
+import asyncio
+import io
+import os
+import re
+import shutil
+import time
+import traceback
+
+from network_profiles import install_async
+from script_runner import BROWSER_ENGINES, collect_screenshots, new_run_dir
+from test_scheduler import script_test_id
+
+# --- Configuration ---
+DEFAULT_MAX_CONTEXTS = 4
+DEFAULT_CASE_TIMEOUT = 300  # seconds
+
+# Page/Locator methods that return another locator synchronously (never awaited)
+LOCATOR_BUILDERS = {
+    "locator", "get_by_role", "get_by_text", "get_by_label", "get_by_placeholder",
+    "get_by_test_id", "get_by_alt_text", "get_by_title", "frame_locator", "nth",
+    "filter", "and_", "or_", "content_frame", "owner"
+}
+
+
+class _AsyncRewriter(ast.NodeTransformer):
+    """Await Playwright calls rooted at the page (or locators built from it) and expect()"""
+
+    def __init__(self, page_names: set):
+        self.page_names = set(page_names)
+
+    def _root(self, node):
+        while isinstance(node, (ast.Call, ast.Attribute, ast.Subscript)):
+            node = node.func if isinstance(node, ast.Call) else node.value
+        return node
+
+    def _is_page_chain(self, node) -> bool:
+        root = self._root(node)
+        return isinstance(root, ast.Name) and root.id in self.page_names
+
+    def _is_expect_chain(self, node) -> bool:
+        while isinstance(node, (ast.Call, ast.Attribute)):
+            if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "expect":
+                return True
+            node = node.func if isinstance(node, ast.Call) else node.value
+        return False
+
+    def visit_Assign(self, node):
+        self.generic_visit(node)
+        # `btn = page.locator(...)` makes btn a page-rooted name too
+        value = node.value
+        builds_locator = (
+            isinstance(value, ast.Call) and isinstance(value.func, ast.Attribute) and value.func.attr in LOCATOR_BUILDERS
+        ) or (isinstance(value, ast.Attribute) and value.attr in ("first", "last"))
+        if builds_locator and self._is_page_chain(value):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    self.page_names.add(target.id)
+        return node
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        func = node.func
+        # time.sleep(x) -> await asyncio.sleep(x)
+        if isinstance(func, ast.Attribute) and func.attr == "sleep" and isinstance(func.value, ast.Name) and func.value.id == "time":
+            return ast.Await(value=ast.Call(
+                func=ast.Attribute(value=ast.Name(id="asyncio", ctx=ast.Load()), attr="sleep", ctx=ast.Load()),
+                args=node.args, keywords=node.keywords
+            ))
+        if not isinstance(func, ast.Attribute):
+            return node
+        if func.attr == "screenshot":
+            for kw in node.keywords:
+                if kw.arg == "path":
+                    kw.value = ast.Call(
+                        func=ast.Attribute(
+                            value=ast.Attribute(value=ast.Name(id="os", ctx=ast.Load()), attr="path", ctx=ast.Load()),
+                            attr="join", ctx=ast.Load()
+                        ),
+                        args=[ast.Name(id="artifact_dir", ctx=ast.Load()), kw.value], keywords=[]
+                    )
+        if func.attr in LOCATOR_BUILDERS:
+            return node
+        if self._is_page_chain(node) or self._is_expect_chain(node):
+            return ast.Await(value=node)
+        return node
+
+
+def _find_page_block(body: list):
+    """Locate the statement list that contains `page = <...>.new_page()`; returns (stmts, index, page_name)"""
+    for i, stmt in enumerate(body):
+        if isinstance(stmt, ast.Assign) and isinstance(stmt.value, ast.Call) \
+                and isinstance(stmt.value.func, ast.Attribute) and stmt.value.func.attr == "new_page" \
+                and isinstance(stmt.targets[0], ast.Name):
+            return body, i, stmt.targets[0].id
+        for field in ("body", "orelse", "finalbody"):
+            inner = getattr(stmt, field, None)
+            if isinstance(inner, list):
+                found = _find_page_block(inner)
+                if found:
+                    return found
+        for handler in getattr(stmt, "handlers", []):
+            found = _find_page_block(handler.body)
+            if found:
+                return found
+    return None
+
+
+def _is_teardown(stmt) -> bool:
+    return isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Call) \
+        and isinstance(stmt.value.func, ast.Attribute) and stmt.value.func.attr == "close"
+
+
+def sync_script_to_case(script_code: str) -> str:
+    """Convert a standalone sync Playwright script into ``async def run_case(page, artifact_dir)``"""
+    tree = ast.parse(script_code)
+    found = _find_page_block(tree.body)
+    if not found:
+        raise ValueError("Could not find `page = ....new_page()` in the script")
+    stmts, index, page_name = found
+    case_body = [s for s in stmts[index + 1:] if not _is_teardown(s)] or [ast.Pass()]
+
+    imports = [
+        s for s in tree.body
+        if isinstance(s, (ast.Import, ast.ImportFrom))
+        and not (isinstance(s, ast.ImportFrom) and (s.module or "").startswith("playwright"))
+        and not (isinstance(s, ast.Import) and any(a.name.startswith("playwright") for a in s.names))
+    ]
+    rewriter = _AsyncRewriter({page_name})
+    case_body = [rewriter.visit(s) for s in case_body]
+
+    func = ast.AsyncFunctionDef(
+        name="run_case",
+        args=ast.arguments(
+            posonlyargs=[], args=[ast.arg(arg=page_name), ast.arg(arg="artifact_dir")],
+            kwonlyargs=[], kw_defaults=[], defaults=[]
+        ),
+        body=case_body, decorator_list=[], returns=None, type_params=[]
+    )
+    header = ast.parse("import asyncio\nimport os\nfrom playwright.async_api import expect").body
+    module = ast.Module(body=header + imports + [func], type_ignores=[])
+    return ast.unparse(ast.fix_missing_locations(module))
+
+
+def load_case(code: str):
+    """Compile case code and return (run_case, namespace); sync scripts are converted first"""
+    if "async def run_case" not in code:
+        code = sync_script_to_case(code)
+    namespace = {"__name__": "generated_case"}
+    exec(compile(code, "<generated_case>", "exec"), namespace)
+    return namespace["run_case"], namespace
+
+
+def case_dir_name(index: int, name: str) -> str:
+    """Unique per-case directory name: suite position plus a slug of the (possibly repeated) name"""
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", name or "").strip("_.")[:40]
+    return f"{index:03d}_{slug or 'case'}"
+
+
+async def _run_case(browser, case: dict, case_dir: str, semaphore, case_timeout: float, context_options: dict,
+                    network_profile: str = "full", step_timeout: float = None) -> dict:
+    name = case.get("name") or "case"
+    # Start every attempt from an empty directory so a retry never shows the previous attempt's screenshots
+    shutil.rmtree(case_dir, ignore_errors=True)
+    os.makedirs(case_dir, exist_ok=True)
+    output = io.StringIO()
+    async with semaphore:
+        started = time.perf_counter()
+        context = None
+        network = None
+        status, return_code = "success", 0
+        try:
+            run_case, namespace = load_case(case["script_code"])
+            # Per-case print so concurrent cases do not interleave their output
+            namespace["print"] = lambda *args, **kwargs: print(*args, **{**kwargs, "file": output})
+            context = await browser.new_context(**context_options)
+            if step_timeout:
+                context.set_default_timeout(step_timeout * 1000)
+            if network_profile != "full":
+                network = await install_async(context, network_profile)
+            page = await context.new_page()
+            await asyncio.wait_for(run_case(page, case_dir), timeout=case_timeout)
+        except asyncio.TimeoutError:
+            status, return_code = "timeout", -1
+            output.write(f"\nCase timed out after {case_timeout} seconds\n")
+        except Exception:
+            status, return_code = "error", 1
+            output.write(traceback.format_exc())
+        finally:
+            if context is not None:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+        return {
+            "name": name,
+            "status": status,
+            "output": output.getvalue(),
+            "screenshots": collect_screenshots(case_dir),
+            "return_code": return_code,
+            "duration": time.perf_counter() - started,
+            "network": network.data if network else None
+        }
+
+
+async def run_suite_async(cases: list, browser_type: str = "chromium", headless: bool = True,
+                          max_contexts: int = DEFAULT_MAX_CONTEXTS, case_timeout: float = DEFAULT_CASE_TIMEOUT,
+                          context_options: dict = None, network_profile: str = "full", scheduler=None,
+                          step_timeout: float = None) -> dict:
+    """Run every {"name", "script_code"} case as its own context in one shared browser
+
+    case_timeout bounds each case; step_timeout (seconds) is every action's default timeout.
+
+    With a test_scheduler.SuiteScheduler, cases start failure-first and likely-flaky
+    failures are retried within the scheduler's budget.
+    """
+    from playwright.async_api import async_playwright
+
+    if browser_type not in BROWSER_ENGINES:
+        raise ValueError(f"Unsupported browser type: {browser_type}")
+    suite_dir = new_run_dir("suite")
+    case_dirs = {}
+    for i, case in enumerate(cases, 1):
+        if not case.get("name"):  # API cases send "name": None
+            case["name"] = f"case_{i}"
+        case.setdefault("test_id", script_test_id(case["script_code"]))
+        case_dirs[id(case)] = os.path.join(suite_dir, case_dir_name(i, case["name"]))
+    if scheduler is not None:
+        cases = scheduler.order(cases, key=lambda case: case["test_id"])
+        scheduler.start_suite([case["test_id"] for case in cases])
+
+    started = time.perf_counter()
+    async with async_playwright() as p:
+        browser = await getattr(p, browser_type).launch(headless=headless)
+        try:
+            semaphore = asyncio.Semaphore(max(1, max_contexts))
+
+            async def run_with_retries(case):
+                attempt = 0
+                while True:
+                    attempt += 1
+                    result = await _run_case(browser, case, case_dirs[id(case)], semaphore, case_timeout,
+                                             context_options or {}, network_profile, step_timeout)
+                    result["attempts"] = attempt
+                    if scheduler is None:
+                        return result
+                    scheduler.record(case["test_id"], result, attempt)
+                    if not scheduler.should_retry(case["test_id"], result, attempt):
+                        return result
+
+            results = await asyncio.gather(*[run_with_retries(case) for case in cases])
+        finally:
+            await browser.close()
+
+    return {
+        "run_dir": suite_dir,
+        "cases": results,
+        "schedule": scheduler.summary() if scheduler is not None else None,
+        "wall_time": time.perf_counter() - started,
+        "passed": sum(1 for r in results if r["status"] == "success"),
+        "failed": sum(1 for r in results if r["status"] != "success")
+    }
+
+
+def run_suite(cases: list, **kwargs) -> dict:
+    """Blocking wrapper around run_suite_async (for Streamlit and sync FastAPI handlers)"""
+    return asyncio.run(run_suite_async(cases, **kwargs))
@@ -0,0 +1,58 @@
+"""
+Cross-browser matrix execution.
+
+Runs one generated script on several Playwright engines in parallel. Each engine
+gets its own run directory, so the matrix takes roughly as long as the slowest
+engine instead of the sum of all of them.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from script_runner import (
+    BROWSER_ENGINES,
+    DEFAULT_TIMEOUT,
+    apply_browser_options,
+    new_run_dir,
+    run_script,
+)
+
+
+def run_matrix(script_code: str, engines: list = None, headless: bool = True, timeout: float = DEFAULT_TIMEOUT,
+               options: dict = None, executor: str = "subprocess") -> dict:
+    """Run script_code on every engine concurrently and return per-engine results with timing"""
+    engines = [e for e in (engines or BROWSER_ENGINES) if e in BROWSER_ENGINES]
+    if not engines:
+        raise ValueError(f"Select at least one of: {', '.join(BROWSER_ENGINES)}")
+
+    matrix_dir = new_run_dir("matrix")
+
+    def run_engine(engine):
+        engine_code = apply_browser_options(script_code, engine, headless)
+        result = run_script(engine_code, run_dir=os.path.join(matrix_dir, engine), timeout=timeout,
+                            options=options, executor=executor)
+        result["browser"] = engine
+        return engine, result
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(engines)) as pool:
+        results = dict(pool.map(run_engine, engines))
+    wall_time = time.perf_counter() - started
+
+    return {
+        "run_dir": matrix_dir,
+        "engines": results,
+        "wall_time": wall_time,
+        "sequential_time": sum(r["duration"] for r in results.values()),
+        "all_passed": all(r["status"] == "success" for r in results.values())
+    }
+
+
+def format_matrix_summary(matrix: dict) -> str:
+    """Render a matrix result as a small side-by-side text table"""
+    lines = [f"{'Engine':<10} {'Status':<8} {'Time (s)':>9} {'Shots':>6}"]
+    for engine, result in matrix["engines"].items():
+        lines.append(f"{engine:<10} {result['status'].upper():<8} {result['duration']:>9.1f} {len(result['screenshots']):>6}")
+    lines.append(f"Wall time: {matrix['wall_time']:.1f}s (sequential would be {matrix['sequential_time']:.1f}s)")
+    return "\n".join(lines)
@@ -0,0 +1,106 @@
+"""
+Change-aware screenshot capture.
+
+Generated scripts call ``page.screenshot(path="step_N.png")`` after every step,
+including steps such as ``time.sleep(3)`` that leave the page untouched. When
+installed, each screenshot call first computes a cheap in-page fingerprint
+(URL, viewport, scroll position, rendered text, form state and a capped layout
+walk). If it matches the fingerprint of the page's previous capture, no image
+is taken and the step is recorded in capture_manifest.json as a reference to
+the previous image instead.
+"""
+
+import json
+import os
+
+# --- Configuration ---
+MANIFEST_FILE = "capture_manifest.json"
+
+# Hashing happens in the page so only an 8-char string crosses the driver connection
+FINGERPRINT_JS = """
+() => {
+    let h = 0x811c9dc5;
+    const add = (s) => {
+        s = String(s);
+        for (let i = 0; i < s.length; i++) {
+            h ^= s.charCodeAt(i);
+            h = Math.imul(h, 0x01000193);
+        }
+    };
+    add(location.href);
+    add([innerWidth, innerHeight, scrollX, scrollY, document.documentElement.scrollHeight].join(","));
+    add(document.body ? document.body.innerText : "");
+    for (const el of document.querySelectorAll("input, textarea, select")) {
+        add(el.value); add(el.checked);
+    }
+    add(document.activeElement ? document.activeElement.tagName + document.activeElement.id : "");
+    const els = document.body ? document.body.getElementsByTagName("*") : [];
+    for (let i = 0; i < els.length && i < 2000; i++) {
+        const r = els[i].getBoundingClientRect();
+        add([r.x | 0, r.y | 0, r.width | 0, r.height | 0].join(","));
+    }
+    return (h >>> 0).toString(16);
+}
+"""
+
+_state = {"manifest": {}, "last": {}, "captured": 0, "skipped": 0}
+
+
+def _write_manifest():
+    with open(MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump({"captured": _state["captured"], "skipped": _state["skipped"], "steps": _state["manifest"]}, f, indent=2)
+
+
+def page_fingerprint(page, options: dict) -> str:
+    """Fingerprint of what a screenshot with these options would show"""
+    extra = json.dumps({k: options.get(k) for k in ("full_page", "clip", "omit_background")}, sort_keys=True, default=str)
+    return page.evaluate(FINGERPRINT_JS) + extra
+
+
+def install():
+    """Patch the sync Page.screenshot to skip captures of unchanged pages"""
+    from playwright.sync_api import Page
+
+    original = Page.screenshot
+    if getattr(original, "_change_aware", False):
+        return
+
+    def screenshot(self, *args, **kwargs):
+        path = kwargs.get("path")
+        if not path or args:
+            return original(self, *args, **kwargs)
+        path = str(path)
+        try:
+            fingerprint = page_fingerprint(self, kwargs)
+        except Exception:
+            fingerprint = None  # page navigating/closed: fall back to a real capture
+
+        previous = _state["last"].get(id(self))
+        if fingerprint and previous and previous[0] == fingerprint and os.path.exists(previous[1]):
+            _state["manifest"][path] = {"ref": previous[1]}
+            _state["skipped"] += 1
+            _write_manifest()
+            with open(previous[1], "rb") as f:
+                return f.read()
+
+        data = original(self, *args, **kwargs)
+        _state["last"][id(self)] = (fingerprint, path)
+        _state["manifest"][path] = {"captured": True}
+        _state["captured"] += 1
+        _write_manifest()
+        return data
+
+    screenshot._change_aware = True
+    Page.screenshot = screenshot
+
+
+def load_manifest(run_dir: str) -> dict:
+    """Read a run's capture manifest ({} if the run did not use change-aware capture)"""
+    path = os.path.join(run_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
@@ -11,7 +11,48 @@ Setup Instructions:
 """
 
 import vertexai
-from vertexai.generative_models import GenerativeModel, Part
+from vertexai.generative_models import GenerativeModel
+from model_client import get_shared_client, vertex_generate_fn
+from script_runner import (
+    BROWSER_ENGINES,
+    CAPTURE_MODES,
+    DEFAULT_TIMEOUT,
+    EXECUTORS,
+    apply_browser_options,
+    collect_screenshots,
+    fork_server_available,
+    make_run_options,
+    new_run_dir,
+    run_script,
+    settle_capture,
+)
+from network_profiles import PROFILES, PROFILE_NAMES
+from test_case_pipeline import (
+    STRUCTURED_GENERATION_CONFIG,
+    build_structured_prompt,
+    case_to_steps,
+    default_run_case,
+    format_test_cases,
+    parse_test_cases,
+    run_pipeline,
+)
+from test_scheduler import SuiteScheduler, format_suite_summary
+from browser_matrix import format_matrix_summary, run_matrix
+from async_suite import run_suite
+from execution_store import ExecutionHistory, all_records, history_stats, load_full_output
+from resource_monitor import format_usage, is_supported as accounting_supported
+from page_outline import build_outline_section
+from playwright_specs import OUTPUT_MODES, build_spec_prompt, generate_specs, results_to_history, run_specs, write_spec
+from script_verifier import verify_script
+from script_index import get_index as get_script_index
+from parameterized_runs import format_data_run, parameters_to_csv, parameterize, parse_data_table, run_data_table
+from report_renderer import batch_execution_pdfs, render_session_report, session_pdf
+from trace_capture import RECORDING_MODES, step_capture_instruction
+try:
+    from visual_regression import BaselineStore
+except ImportError:  # numpy / pillow not installed
+    BaselineStore = None
+import hashlib
 import subprocess
 import sys
 import os
@@ -23,6 +64,7 @@ REGION = "us-central1"
 MODEL_NAME = "gemini-2.0-flash-lite"
 GENERATED_SCRIPT = "generated_playwright_test.py"
 LOGO_PATH = "C:\\Users\\khandelwal.ankit\\.vscode\\M1\\M1_Singapore_2020.svg"  # Path to your logo file
+EXPORT_FRAME_WAIT = 60  # seconds an export waits for step frames still being extracted from a recording
 
 # --- Initialize Vertex AI ---
 try:
@@ -38,24 +80,32 @@ except Exception as e:
     print(f"Error loading model '{MODEL_NAME}': {e}")
     sys.exit(1)
 
-def generate_playwright_script(test_steps: str) -> str:
+# --- Shared rate-limited client (retries, concurrency cap, request coalescing) ---
+llm = get_shared_client(MODEL_NAME, vertex_generate_fn(model))
+
+def generate_playwright_script(test_steps: str, browser_type: str = "chromium", headless: bool = False,
+                               page_context: bool = True, output_mode: str = "python_script",
+                               test_name: str = "generated test", capture_mode: str = "every_step") -> str:
+    outline = build_outline_section(test_steps) if page_context else ""
+    if output_mode == "playwright_spec":
+        return llm.generate(build_spec_prompt(test_steps, test_name, outline), label="generate_spec")
     prompt = f"""
 You are an assistant that converts natural language test instructions into a complete Python Playwright script.
 Generate a Python script that performs the following test steps using Playwright:
 
 {test_steps}
+{outline}
 
 The script should:
 - Import necessary modules
-- Launch a Chromium browser (headless=False)
+- Launch a {browser_type} browser (headless={headless})
 - Execute the steps
-- Take a screenshot after each step (save as 'step_1.png', 'step_2.png', etc.)
+{step_capture_instruction(capture_mode)}
 - Close the browser at the end
 
 Only output the Python code, nothing else.
 """
-    response = model.generate_content([Part.from_text(prompt)])
-    return response.text
+    return llm.generate(prompt, label="generate_script")
 
 def clean_script_code(script_code: str) -> str:
     # Remove triple backticks and language hints from start/end
@@ -78,48 +128,60 @@ def save_and_run_script(script_code: str, filename: str):
     print(f"\nGenerated script saved to {filename}. Running the script...\n")
     subprocess.run(["python", filename], check=False)
 
-def run_playwright_script(script_code: str) -> dict:
+def run_playwright_script(script_code: str, browser_type: str = None, headless: bool = None,
+                          options: dict = None, executor: str = "subprocess", timeout: float = DEFAULT_TIMEOUT) -> dict:
     """Execute Playwright script and return results"""
+    if browser_type is not None:
+        script_code = apply_browser_options(script_code, browser_type, bool(headless))
+    return run_script(script_code, run_dir=".", script_name=GENERATED_SCRIPT, timeout=timeout,
+                      options=options, executor=executor)
+
+def run_spec_suite(spec_paths: list, history, browser_type: str = None, headless: bool = True,
+                   shards: int = 1, timeout: float = DEFAULT_TIMEOUT) -> dict:
+    """Run specs through the Playwright Test runner and record each result in history"""
     try:
-        # Remove old screenshots
-        import glob
-        for f in glob.glob("step_*.png"):
-            os.remove(f)
-        
-        # Save and run script
-        with open(GENERATED_SCRIPT, "w", encoding="utf-8") as f:
-            f.write(script_code)
-        
-        result = subprocess.run(
-            ["python", GENERATED_SCRIPT],
-            capture_output=True,
-            text=True,
-            timeout=500
-        )
-        
-        # Collect screenshots
-        screenshots = sorted(glob.glob("step_*.png"))
-        
-        return {
-            "status": "success" if result.returncode == 0 else "error",
-            "output": result.stdout + "\n" + result.stderr,
-            "screenshots": screenshots,
-            "return_code": result.returncode
-        }
-    except subprocess.TimeoutExpired:
-        return {
-            "status": "timeout",
-            "output": "Script execution timed out after 5 minutes",
-            "screenshots": [],
-            "return_code": -1
-        }
+        run = run_specs(spec_paths, projects=[browser_type] if browser_type else None, shards=shards,
+                        headed=not headless, test_timeout=timeout)
+    except RuntimeError as e:
+        return {"results": [], "output": str(e), "passed": 0, "failed": 0, "flaky": 0, "wall_time": 0.0}
+    for entry in results_to_history(run):
+        history.append(entry)
+    return run
+
+def format_spec_run(run: dict) -> str:
+    """One-line summary of a Playwright Test runner invocation"""
+    return (f"Playwright Test runner: {run['passed']} passed, {run['failed']} failed, {run['flaky']} flaky "
+            f"in {run['wall_time']:.1f}s" + (f" over {run['shards']} shard(s)" if run.get("shards") else ""))
+
+def format_network_stats(network: dict) -> str:
+    """One-line summary of a run's network profile savings"""
+    return (
+        f"Network profile '{network['profile']}': {network['blocked']} request(s) blocked, "
+        f"~{network['estimated_bytes_saved'] / 1024:.0f} KB saved, "
+        f"{network['bytes_downloaded'] / 1024:.0f} KB downloaded"
+    )
+
+def parse_ignore_regions(text: str) -> list:
+    """Parse 'x,y,w,h; x,y,w,h' into a list of integer tuples"""
+    regions = []
+    for chunk in text.split(";"):
+        parts = [p.strip() for p in chunk.split(",")]
+        if len(parts) == 4 and all(p.lstrip("-").isdigit() for p in parts):
+            regions.append(tuple(int(p) for p in parts))
+    return regions
+
+def check_visual_regression(script_code: str, browser_type: str, screenshots: list,
+                            max_diff_ratio: float = 0.001, ignore_regions: list = None) -> dict:
+    """Compare a run's screenshots against stored baselines (None if the engine is unavailable)"""
+    if BaselineStore is None or not screenshots:
+        return None
+    test_key = f"{hashlib.sha1(script_code.encode('utf-8')).hexdigest()[:12]}_{browser_type}"
+    try:
+        # Keep this execution's images (and diffs) in a directory of their own: the next run overwrites step_N.png
+        return BaselineStore().check_run(test_key, screenshots, ignore_regions, max_diff_ratio=max_diff_ratio,
+                                         run_dir=new_run_dir("visual"))
     except Exception as e:
-        return {
-            "status": "error",
-            "output": f"Error running script: {str(e)}",
-            "screenshots": [],
-            "return_code": -1
-        }
+        return {"test_key": test_key, "error": str(e), "steps": [], "regressions": 0, "new_baselines": 0}
 
 def generate_test_report(report_type: str, session_state: dict) -> str:
     """Generate different types of test reports"""
@@ -140,8 +202,7 @@ def generate_execution_summary(session_state: dict) -> str:
     if not history:
         return "No test executions found."
     
-    total = len(history)
-    successful = sum(1 for exec in history if exec.get("status") == "success")
+    total, successful = history_stats(history)
     failed = total - successful
     success_rate = (successful / total * 100) if total > 0 else 0
     
@@ -157,13 +218,15 @@ Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 ## Recent Executions
 """
     
-    for i, execution in enumerate(history[-10:], 1):
+    for execution in history[-10:]:
         report += f"""
-### Execution {i}
+### Execution {execution.get('run_number', '')}
 - Timestamp: {execution.get('timestamp', 'Unknown')}
 - Status: {execution.get('status', 'Unknown').upper()}
 - Screenshots: {len(execution.get('screenshots', []))}
 """
+        if execution.get("resources"):
+            report += f"- Resources: {format_usage(execution['resources'])}\n"
     
     return report
 
@@ -223,8 +286,11 @@ Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 - Project: {PROJECT_ID}
 """
 
-def prepare_export_data(session_state: dict, format_type: str) -> str:
-    """Prepare data for export in various formats"""
+def prepare_export_data(session_state: dict, format_type: str):
+    """Prepare data for export in various formats (str, or bytes for PDF exports)"""
+    # Recorded runs may still be extracting step frames; exports include them
+    for execution in session_state.get("execution_history", []):
+        settle_capture(execution, EXPORT_FRAME_WAIT)
     if format_type == "JSON":
         import json
         export_data = {
@@ -232,75 +298,27 @@ def prepare_export_data(session_state: dict, format_type: str) -> str:
             "test_cases": session_state.get("test_cases", ""),
             "script_code": session_state.get("script_code", ""),
             "verification_results": session_state.get("verification_results", ""),
-            "execution_history": session_state.get("execution_history", [])
+            "execution_history": list(all_records(session_state.get("execution_history", [])))
         }
         return json.dumps(export_data, indent=2)
     
     elif format_type == "CSV":
-        history = session_state.get("execution_history", [])
-        if not history:
-            return "timestamp,status,output_length,screenshots_count\n"
-        
-        csv_data = "timestamp,status,output_length,screenshots_count\n"
-        for execution in history:
-            csv_data += f"{execution.get('timestamp', '')},{execution.get('status', '')},{len(execution.get('output', ''))},{len(execution.get('screenshots', []))}\n"
+        header = "timestamp,status,output_length,screenshots_count,peak_rss_mb,cpu_seconds,browser_processes\n"
+        csv_data = header
+        for execution in all_records(session_state.get("execution_history", [])):
+            resources = execution.get("resources") or {}
+            csv_data += f"{execution.get('timestamp', '')},{execution.get('status', '')},{execution.get('output_chars', len(execution.get('output', '')))},{len(execution.get('screenshots', []))},"
+            csv_data += f"{resources.get('peak_rss_mb', '')},{resources.get('cpu_seconds', '')},{resources.get('browser_processes', '')}\n"
         return csv_data
     
     elif format_type == "HTML":
-        logo_section = ""
-        if os.path.exists(LOGO_PATH):
-            import base64
-            try:
-                with open(LOGO_PATH, "rb") as img_file:
-                    img_data = base64.b64encode(img_file.read()).decode()
-                logo_section = f'<img src="data:image/svg+xml;base64,{img_data}" alt="Logo" style="max-width: 80px; height: 60px; display: block; margin: 0 auto;">'
-            except:
-                logo_section = ""
-        
-        return f"""<!DOCTYPE html>
-<html>
-<head>
-    <title>Test Automation Report</title>
-    <style>
-        body {{ font-family: Arial, sans-serif; margin: 20px; }}
-        .header {{ background-color: #f0f0f0; padding: 20px; text-align: center; }}
-        .section {{ margin: 20px 0; }}
-        pre {{ background-color: #f5f5f5; padding: 10px; overflow-x: auto; }}
-        .logo {{ margin-bottom: 20px; }}
-        .footer {{ text-align: center; margin-top: 40px; font-size: 12px; color: #666; }}
-    </style>
-</head>
-<body>
-    <div class="header">
-        <div class="logo">{logo_section}</div>
-        <h1>🤖 Gemini Test Automation Suite</h1>
-        <h2>Test Automation Report</h2>
-        <p>Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-    </div>
-    
-    <div class="section">
-        <h2>Test Cases</h2>
-        <pre>{session_state.get("test_cases", "No test cases available")}</pre>
-    </div>
-    
-    <div class="section">
-        <h2>Generated Script</h2>
-        <pre>{session_state.get("script_code", "No script generated")}</pre>
-    </div>
-    
-    <div class="section">
-        <h2>Verification Results</h2>
-        <pre>{session_state.get("verification_results", "No verification results")}</pre>
-    </div>
-    
-    <div class="footer">
-        <p>Generated by Gemini Test Automation Suite | Powered by Google Vertex AI</p>
-    </div>
-</body>
-</html>"""
-    
-    else:  # PDF placeholder
-        return "PDF export not yet implemented. Use HTML format for now."
+        return render_session_report(session_state, LOGO_PATH)
+
+    elif format_type == "PDF":
+        return session_pdf(session_state, LOGO_PATH)
+
+    else:  # "PDF (one per execution)": zip of per-execution reports
+        return batch_execution_pdfs(session_state.get("execution_history", []), LOGO_PATH)
 
 def cli_mode():
     print("Enter your test steps (type 'END' on a new line to finish):")
@@ -338,34 +356,21 @@ For each test case, provide:
 
 Format as a structured list with clear separation between test cases.
 """
-    response = model.generate_content([Part.from_text(prompt)])
-    return response.text
+    return llm.generate(prompt, label="generate_test_cases")
 
-def verify_test_script(script_code: str) -> str:
-    """Verify and analyze test script for best practices"""
-    prompt = f"""
-Analyze the following Playwright test script and provide:
-
-1. Code Quality Assessment
-2. Best Practices Check
-3. Potential Issues/Bugs
-4. Performance Optimization Suggestions
-5. Security Considerations
-6. Maintainability Score (1-10)
-7. Specific Improvements
-
-Test Script:
-{script_code}
+def generate_structured_test_cases(requirements: str) -> list:
+    """Generate schema-constrained test case records (id, steps, expected results, priority)"""
+    text = llm.generate(build_structured_prompt(requirements), label="structured_test_cases",
+                        generation_config=STRUCTURED_GENERATION_CONFIG)
+    return parse_test_cases(text)
 
-Provide detailed feedback with specific line references where applicable.
-"""
-    response = model.generate_content([Part.from_text(prompt)])
-    return response.text
+def verify_test_script(script_code: str) -> str:
+    """Verify and analyze test script for best practices (chunked and parallel for large scripts)"""
+    return verify_script(script_code, llm.generate)["report"]
 
 def streamlit_mode():
     import streamlit as st
     import os
-    from glob import glob
     import json
     from datetime import datetime
 
@@ -398,7 +403,9 @@ def streamlit_mode():
     if "verification_results" not in st.session_state:
         st.session_state["verification_results"] = ""
     if "execution_history" not in st.session_state:
-        st.session_state["execution_history"] = []
+        st.session_state["execution_history"] = ExecutionHistory()
+    if "suite_cases" not in st.session_state:
+        st.session_state["suite_cases"] = []
 
     # Sidebar configuration
     with st.sidebar:
@@ -410,14 +417,85 @@ def streamlit_mode():
         st.header("⚙️ Configuration")
         browser_type = st.selectbox("Browser", ["chromium", "firefox", "webkit"], index=0)
         headless = st.checkbox("Headless Mode", value=False)
-        timeout = st.number_input("Timeout (ms)", value=30000, min_value=1000, max_value=120000)
+        timeout = st.number_input(
+            "Step Timeout (ms)", value=30000, min_value=1000, max_value=120000,
+            help="Default timeout of each browser action; a run with no progress for this long is killed"
+        )
+        run_timeout = st.number_input("Run Timeout (s)", value=DEFAULT_TIMEOUT, min_value=10, max_value=3600)
+        capture_mode = st.selectbox(
+            "Screenshot Capture", CAPTURE_MODES, index=0,
+            help="on_change skips screenshots when the page has not changed since the previous step; "
+                 "trace/video record the run and extract each step's frame afterwards in the background"
+        )
+        screenshot_sample = 0
+        if capture_mode in RECORDING_MODES:
+            screenshot_sample = st.number_input(
+                "Real Screenshot Every N Steps (0 = none)", value=0, min_value=0, max_value=50,
+                help="Sampled steps keep a full-quality PNG; the others use the recorded frame"
+            )
+        executor = st.selectbox(
+            "Execution Mode", EXECUTORS if fork_server_available() else EXECUTORS[:1], index=0,
+            help="fork_server reuses a pre-warmed process with Playwright already imported"
+        )
+        output_mode = st.selectbox(
+            "Output Mode", OUTPUT_MODES, index=0,
+            help="playwright_spec writes @playwright/test specs into the configured testDir and runs them with the Node runner"
+        )
+        spec_shards = 1
+        if output_mode == "playwright_spec":
+            spec_shards = st.number_input("Runner Shards", value=1, min_value=1, max_value=8)
+        network_profile = st.selectbox(
+            "Network Profile", PROFILE_NAMES, index=0,
+            format_func=lambda name: f"{name} - {PROFILES[name]['description']}"
+        )
+        with st.expander("🧮 Resource Limits", expanded=False):
+            if not accounting_supported():
+                st.caption("Install psutil to enable resource accounting on this platform.")
+            max_rss_mb = st.number_input("Max Memory (MB, 0 = off)", value=0, min_value=0, step=256)
+            max_cpu_seconds = st.number_input("Max CPU Seconds (0 = off)", value=0, min_value=0, step=30)
+            max_browser_processes = st.number_input("Max Browser Processes (0 = off)", value=0, min_value=0)
+        run_options = make_run_options(
+            capture_mode, network_profile, step_timeout=timeout / 1000,
+            resource_limits={"max_rss_mb": max_rss_mb, "max_cpu_seconds": max_cpu_seconds,
+                             "max_browser_processes": max_browser_processes},
+            screenshot_sample=screenshot_sample
+        )
+        page_context = st.checkbox(
+            "Page Outline Context", value=True,
+            help="Fetch the target page once (cached) and give the model its real inputs, buttons and links"
+        )
+        reuse_scripts = st.checkbox(
+            "Reuse Passed Scripts", value=True,
+            help="Serve steps that match a previously passed script (same flow, new values) without calling the model"
+        )
+        smart_scheduling = st.checkbox(
+            "Failure-First Scheduling", value=True,
+            help="Order suites by past failures then duration, and retry only likely-flaky failures"
+        )
+
+        st.markdown("---")
+        st.header("🖼️ Visual Regression")
+        visual_checks = st.checkbox("Compare With Baselines", value=BaselineStore is not None, disabled=BaselineStore is None)
+        max_diff_percent = st.slider("Max Changed Pixels (%)", 0.0, 5.0, 0.1, step=0.05)
+        ignore_regions_text = st.text_input("Ignore Regions (x,y,w,h; ...)", value="")
+        if BaselineStore is None:
+            st.caption("Install numpy and pillow to enable baseline comparison.")
         
         st.markdown("---")
         st.header("📊 Quick Stats")
-        st.metric("Total Executions", len(st.session_state["execution_history"]))
-        if st.session_state["execution_history"]:
-            successful = sum(1 for exec in st.session_state["execution_history"] if exec.get("status") == "success")
-            st.metric("Success Rate", f"{(successful/len(st.session_state['execution_history'])*100):.1f}%")
+        total_runs, successful_runs = history_stats(st.session_state["execution_history"])
+        st.metric("Total Executions", total_runs)
+        if total_runs:
+            st.metric("Success Rate", f"{(successful_runs/total_runs*100):.1f}%")
+        with st.expander("🔢 Model Usage", expanded=False):
+            st.metric("Prompt Tokens", f"{llm.stats['prompt_tokens']:,}")
+            st.metric("Estimated Cost", f"${llm.stats['cost']:.4f}")
+            index_stats = get_script_index().stats
+            st.metric("Generations Served From Index", index_stats["exact_reuse"] + index_stats["adapted"],
+                      help=f"{index_stats['entries']} passed scripts indexed, {index_stats['misses']} misses")
+            for call in llm.recent_usage(10):
+                st.caption(f"{call['label'] or 'call'}: {call['prompt_tokens']:,} in / "
+                           f"{call['output_tokens']:,} out, ${call['cost']:.4f}, {call['duration']:.1f}s")
 
     # Main tabs
     tab1, tab2, tab3, tab4, tab5 = st.tabs([
@@ -449,6 +527,82 @@ def streamlit_mode():
                     st.success("✅ Test cases generated successfully!")
                 else:
                     st.warning("⚠️ Please enter requirements or user stories.")
+
+            if st.button("⚡ Generate & Execute Suite"):
+                if requirements.strip() and output_mode == "playwright_spec":
+                    with st.spinner("Generating structured test cases..."):
+                        cases = generate_structured_test_cases(requirements)
+                    st.session_state["test_cases"] = format_test_cases(cases)
+                    with st.spinner(f"Writing {len(cases)} spec(s)..."):
+                        records = generate_specs(cases, lambda steps, name: clean_script_code(
+                            generate_playwright_script(steps, browser_type, headless, page_context, output_mode, name)
+                        ))
+                    spec_paths = [r["spec_path"] for r in records if r.get("spec_path")]
+                    for record in records:
+                        if not record.get("spec_path"):
+                            st.session_state["execution_history"].append({
+                                "timestamp": datetime.now().isoformat(), "status": "error",
+                                "output": record["output"], "screenshots": [], "case": record["id"]
+                            })
+                    with st.spinner(f"Running {len(spec_paths)} spec(s) with the Playwright Test runner..."):
+                        spec_run = run_spec_suite(spec_paths, st.session_state["execution_history"], browser_type,
+                                                  headless, int(spec_shards), run_timeout)
+                    st.session_state["last_spec_run"] = spec_run
+                    st.session_state["pipeline_results"] = None
+                    st.success(format_spec_run(spec_run) if spec_run["results"] else "⚠️ No results: see runner output below")
+                elif requirements.strip():
+                    with st.spinner("Generating structured test cases..."):
+                        cases = generate_structured_test_cases(requirements)
+                    st.session_state["test_cases"] = format_test_cases(cases)
+                    progress = st.progress(0.0, text=f"0/{len(cases)} test cases executed")
+                    events = st.empty()
+                    finished = []
+
+                    def on_pipeline_event(event, record):
+                        if event == "generated":
+                            events.info(f"🛠️ Script ready for {record['id']}, executing...")
+                            return
+                        if event == "retrying":
+                            events.warning(f"🔁 {record['id']} failed and looks flaky, retrying...")
+                            return
+                        finished.append(record)
+                        progress.progress(len(finished) / max(1, len(cases)), text=f"{len(finished)}/{len(cases)} test cases executed")
+
+                    scheduler = SuiteScheduler() if smart_scheduling else None
+                    def generate_case_script(steps):
+                        generate = lambda s: clean_script_code(generate_playwright_script(s, browser_type, headless, page_context,
+                                                                                             capture_mode=capture_mode))
+                        if not reuse_scripts:
+                            return generate(steps)
+                        return get_script_index().generate(steps, generate, browser_type, headless)[0]
+
+                    records = run_pipeline(
+                        cases,
+                        generate_case_script,
+                        default_run_case(browser_type, headless, run_options, timeout=run_timeout, executor=executor),
+                        on_event=on_pipeline_event,
+                        scheduler=scheduler
+                    )
+                    st.session_state["pipeline_schedule"] = scheduler.summary() if scheduler else None
+                    events.empty()
+                    for record in records:
+                        if record.get("status") == "success" and record.get("script_code"):
+                            get_script_index().add(case_to_steps(record), record["script_code"])
+                        st.session_state["execution_history"].append({
+                            "timestamp": datetime.now().isoformat(),
+                            "status": record.get("status", "unknown"),
+                            "output": record.get("output", ""),
+                            "screenshots": record.get("screenshots", []),
+                            "browser": browser_type,
+                            "duration": record.get("duration"),
+                            "network": record.get("network"),
+                            "resources": record.get("resources"),
+                            "case": record["id"]
+                        })
+                    st.session_state["pipeline_results"] = records
+                    st.success(f"✅ {sum(1 for r in records if r.get('status') == 'success')}/{len(records)} test cases passed")
+                else:
+                    st.warning("⚠️ Please enter requirements or user stories.")
         
         with col2:
             st.markdown("### 📝 Test Case Templates")
@@ -463,6 +617,24 @@ def streamlit_mode():
             if st.button("Use Template"):
                 st.session_state["requirements_template"] = templates[selected_template]
         
+        if st.session_state.get("last_spec_run"):
+            spec_run = st.session_state["last_spec_run"]
+            st.markdown("### 🎭 Playwright Test Results")
+            if spec_run["results"]:
+                st.caption(format_spec_run(spec_run))
+                for result in spec_run["results"]:
+                    st.markdown(f"- **{result['name']}** [{result['project']}] — {result['status'].upper()} in {result['duration']:.1f}s" + (" (flaky)" if result["flaky"] else ""))
+            else:
+                st.code(spec_run["output"][-5000:])
+
+        if st.session_state.get("pipeline_results"):
+            st.markdown("### ⚡ Suite Results")
+            if st.session_state.get("pipeline_schedule"):
+                st.caption(format_suite_summary(st.session_state["pipeline_schedule"]))
+            for record in st.session_state["pipeline_results"]:
+                duration = f"{record['duration']:.1f}s" if record.get("duration") is not None else "-"
+                st.markdown(f"- **{record['id']}** {record['name']} ({record['priority']}) — {record.get('status', 'unknown').upper()} in {duration}")
+
         if st.session_state["test_cases"]:
             st.markdown("### 📋 Generated Test Cases")
             st.text_area("Test Cases", value=st.session_state["test_cases"], height=400, key="generated_test_cases")
@@ -488,11 +660,33 @@ def streamlit_mode():
             if st.button("🛠️ Generate Playwright Script", type="primary"):
                 if test_steps.strip():
                     with st.spinner("Generating Playwright script..."):
-                        script_code = generate_playwright_script(test_steps)
-                        cleaned_code = clean_script_code(script_code)
+                        test_name = test_steps.strip().splitlines()[0][:60]
+                        match = None
+                        if output_mode == "python_script" and reuse_scripts:
+                            match = get_script_index().find(test_steps, browser_type, headless)
+                        if match:
+                            cleaned_code = match["script"]
+                        else:
+                            script_code = generate_playwright_script(test_steps, browser_type, headless, page_context,
+                                                                     output_mode, test_name, capture_mode)
+                            cleaned_code = clean_script_code(script_code)
+                        if output_mode == "playwright_spec":
+                            st.session_state["spec_path"] = write_spec(cleaned_code, test_name)
                     st.session_state["script_code"] = cleaned_code
                     st.session_state["editable_script"] = cleaned_code
-                    st.success("✅ Script generated successfully!")
+                    st.session_state["script_steps"] = test_steps
+                    if match:
+                        changed = ", ".join(f"{s['from']} → {s['to']}" for s in match["substitutions"])
+                        st.success(f"♻️ Reused a script that passed {match['passes']} time(s) "
+                                   f"({match['score']:.0%} similar)" + (f", adapted: {changed}" if changed else ""))
+                    else:
+                        st.success("✅ Script generated successfully!")
+                        suggestions = get_script_index().suggest(test_steps) \
+                            if output_mode == "python_script" and reuse_scripts else []
+                        for suggestion in suggestions:
+                            with st.expander(f"💡 Similar passed script ({suggestion['score']:.0%} similar, different steps)"):
+                                st.caption("Not reused: " + "; ".join(suggestion["differences"]))
+                                st.code(suggestion["script"], language="python")
                 else:
                     st.warning("⚠️ Please enter test steps.")
         
@@ -524,8 +718,7 @@ def streamlit_mode():
         col1, col2, col3, col4 = st.columns(4)
         with col1:
             if st.button("📸 Show Screenshots"):
-                import glob
-                screenshots = sorted(glob.glob("step_*.png"))
+                screenshots = collect_screenshots(".")
                 if screenshots:
                     st.session_state["show_screenshots"] = True
                     st.success(f"Found {len(screenshots)} screenshots!")
@@ -533,7 +726,9 @@ def streamlit_mode():
                     st.warning("No screenshots found. Run a test first!")
 
         with col2:
-            st.download_button("📥 Download Script", edited_code, file_name=GENERATED_SCRIPT)
+            spec_path = st.session_state.get("spec_path") if output_mode == "playwright_spec" else None
+            st.download_button("📥 Download Script", edited_code,
+                               file_name=os.path.basename(spec_path) if spec_path else GENERATED_SCRIPT)
         
         with col3:
             if st.button("✅ Verify Script"):
@@ -543,20 +738,172 @@ def streamlit_mode():
                 st.success("Script analyzed!")
         
         with col4:
-            if st.button("▶️ Run Script", type="primary"):
-                execution_result = run_playwright_script(edited_code)
+            run_clicked = st.button("▶️ Run Script", type="primary")
+            if run_clicked and spec_path:
+                with open(spec_path, "w", encoding="utf-8") as f:
+                    f.write(edited_code)
+                with st.spinner("Running spec with the Playwright Test runner..."):
+                    spec_run = run_spec_suite([spec_path], st.session_state["execution_history"], browser_type,
+                                              headless, 1, run_timeout)
+                st.session_state["last_spec_run"] = spec_run
+                st.success(format_spec_run(spec_run) if spec_run["results"] else "⚠️ No results: see runner output in Test Case Generation")
+            elif run_clicked:
+                execution_result = run_playwright_script(edited_code, browser_type, headless, run_options, executor, run_timeout)
+                visual = None
+                if visual_checks:
+                    visual = check_visual_regression(
+                        edited_code, browser_type, execution_result.get("screenshots", []),
+                        max_diff_percent / 100, parse_ignore_regions(ignore_regions_text)
+                    )
                 st.session_state["execution_history"].append({
                     "timestamp": datetime.now().isoformat(),
                     "status": execution_result.get("status", "unknown"),
                     "output": execution_result.get("output", ""),
-                    "screenshots": execution_result.get("screenshots", [])
+                    "screenshots": execution_result.get("screenshots", []),
+                    "browser": browser_type,
+                    "duration": execution_result.get("duration"),
+                    "capture": execution_result.get("capture"),
+                    "run_dir": execution_result.get("run_dir"),
+                    "network": execution_result.get("network"),
+                    "stalled_step": execution_result.get("stalled_step"),
+                    "resources": execution_result.get("resources"),
+                    "visual": visual
                 })
+                if execution_result.get("status") == "success" and st.session_state.get("script_steps"):
+                    get_script_index().add(st.session_state["script_steps"], edited_code)
                 st.success("Script executed! Check screenshots below.")
+                if visual and visual.get("regressions"):
+                    st.error(f"🖼️ Visual regression detected in {visual['regressions']} step(s). See Execution Status.")
+
+        st.markdown("### 🌐 Cross-Browser Matrix")
+        matrix_engines = st.multiselect("Engines", BROWSER_ENGINES, default=BROWSER_ENGINES)
+        if st.button("🧪 Run Matrix"):
+            if matrix_engines:
+                with st.spinner(f"Running on {', '.join(matrix_engines)} in parallel..."):
+                    matrix = run_matrix(edited_code, matrix_engines, headless=headless, timeout=run_timeout,
+                                        options=run_options, executor=executor)
+                for engine, result in matrix["engines"].items():
+                    st.session_state["execution_history"].append({
+                        "timestamp": datetime.now().isoformat(),
+                        "status": result.get("status", "unknown"),
+                        "output": result.get("output", ""),
+                        "screenshots": result.get("screenshots", []),
+                        "browser": engine,
+                        "duration": result.get("duration"),
+                        "capture": result.get("capture"),
+                        "run_dir": result.get("run_dir"),
+                        "network": result.get("network"),
+                        "resources": result.get("resources")
+                    })
+                st.session_state["last_matrix"] = matrix
+            else:
+                st.warning("⚠️ Select at least one engine.")
+
+        if st.session_state.get("last_matrix"):
+            matrix = st.session_state["last_matrix"]
+            st.code(format_matrix_summary(matrix))
+            engine_cols = st.columns(len(matrix["engines"]))
+            for col, (engine, result) in zip(engine_cols, matrix["engines"].items()):
+                settle_capture(result, timeout=0)
+                with col:
+                    st.markdown(f"**{engine}** — {result['status'].upper()} in {result['duration']:.1f}s")
+                    for screenshot in result["screenshots"]:
+                        if os.path.exists(screenshot):
+                            st.image(screenshot, caption=os.path.basename(screenshot), use_column_width=True)
+
+        st.markdown("### 🧵 Suite Run (one browser, many contexts)")
+        suite_col1, suite_col2 = st.columns([2, 1])
+        with suite_col1:
+            if st.button("➕ Add Script to Suite"):
+                st.session_state["suite_cases"].append({
+                    "name": f"case_{len(st.session_state['suite_cases']) + 1}",
+                    "script_code": edited_code
+                })
+            st.caption(f"{len(st.session_state['suite_cases'])} case(s) in suite")
+            if st.session_state["suite_cases"] and st.button("🗑️ Clear Suite"):
+                st.session_state["suite_cases"] = []
+                st.rerun()
+        with suite_col2:
+            max_contexts = st.number_input("Parallel Contexts", value=4, min_value=1, max_value=32)
+
+        if st.button("🚀 Run Suite", disabled=not st.session_state["suite_cases"]):
+            with st.spinner(f"Running {len(st.session_state['suite_cases'])} case(s) in one {browser_type} browser..."):
+                suite = run_suite(
+                    [dict(case) for case in st.session_state["suite_cases"]],
+                    browser_type=browser_type, headless=headless, max_contexts=int(max_contexts),
+                    case_timeout=run_timeout, step_timeout=timeout / 1000, network_profile=network_profile, scheduler=SuiteScheduler() if smart_scheduling else None
+                )
+            for result in suite["cases"]:
+                st.session_state["execution_history"].append({
+                    "timestamp": datetime.now().isoformat(),
+                    "status": result.get("status", "unknown"),
+                    "output": result.get("output", ""),
+                    "screenshots": result.get("screenshots", []),
+                    "browser": browser_type,
+                    "duration": result.get("duration"),
+                    "network": result.get("network"),
+                    "case": result.get("name")
+                })
+            st.session_state["last_suite"] = suite
+
+        if st.session_state.get("last_suite"):
+            suite = st.session_state["last_suite"]
+            st.markdown(f"**Suite:** {suite['passed']} passed, {suite['failed']} failed in {suite['wall_time']:.1f}s")
+            if suite.get("schedule"):
+                st.caption(format_suite_summary(suite["schedule"]))
+            for result in suite["cases"]:
+                st.markdown(f"- `{result['name']}` — {result['status'].upper()} ({result['duration']:.1f}s, {len(result['screenshots'])} screenshots)")
+
+        st.markdown("### 📊 Data-Driven Run (one script, many rows)")
+        if st.button("🔣 Parameterize Script"):
+            try:
+                parameterized = parameterize(edited_code)
+            except SyntaxError as e:
+                st.error(f"Cannot parameterize: {e}")
+            else:
+                st.session_state["parameterized"] = parameterized
+                st.session_state["data_table"] = parameters_to_csv(parameterized["parameters"])
+        parameterized = st.session_state.get("parameterized")
+        if parameterized and not parameterized["parameters"]:
+            st.info("No typed, navigated or asserted values found to parameterize.")
+        elif parameterized:
+            st.caption("Parameters: " + ", ".join(f"`{p['name']}` (line {', '.join(map(str, p['lines']))})"
+                                                  for p in parameterized["parameters"]))
+            with st.expander("Parameterized script"):
+                st.code(parameterized["script"], language="python")
+            data_table = st.text_area("Data Table (CSV, header = parameter names)", key="data_table", height=150)
+            row_workers = st.number_input("Parallel Rows", value=4, min_value=1, max_value=32)
+            if st.button("▶️ Run Data Table"):
+                try:
+                    rows = parse_data_table(data_table)
+                except ValueError as e:
+                    rows = []
+                    st.error(f"Invalid data table: {e}")
+                if rows:
+                    with st.spinner(f"Running {len(rows)} row(s), {int(row_workers)} at a time..."):
+                        data_run = run_data_table(parameterized["script"], rows, parameterized["parameters"],
+                                                  browser_type, headless, run_timeout, run_options, executor,
+                                                  int(row_workers))
+                    for result in data_run["rows"]:
+                        st.session_state["execution_history"].append({
+                            "timestamp": datetime.now().isoformat(),
+                            "status": result.get("status", "unknown"),
+                            "output": result.get("output", ""),
+                            "screenshots": result.get("screenshots", []),
+                            "browser": browser_type,
+                            "duration": result.get("duration"),
+                            "capture": result.get("capture"),
+                            "run_dir": result.get("run_dir"),
+                            "resources": result.get("resources"),
+                            "case": f"row {result['row']}"
+                        })
+                    st.session_state["last_data_run"] = data_run
+            if st.session_state.get("last_data_run"):
+                st.code(format_data_run(st.session_state["last_data_run"]))
         
         # Display screenshots if requested or after running
         if st.session_state.get("show_screenshots", False) or any(exec.get("screenshots") for exec in st.session_state.get("execution_history", [])[-1:]):
-            import glob
-            screenshots = sorted(glob.glob("step_*.png"))
+            screenshots = collect_screenshots(".")
             if screenshots:
                 st.markdown("### 📸 Test Screenshots")
                 cols = st.columns(min(3, len(screenshots)))  # Max 3 columns
@@ -609,8 +956,7 @@ def streamlit_mode():
             
             # Summary metrics
             col1, col2, col3, col4 = st.columns(4)
-            total_executions = len(st.session_state["execution_history"])
-            successful = sum(1 for exec in st.session_state["execution_history"] if exec.get("status") == "success")
+            total_executions, successful = history_stats(st.session_state["execution_history"])
             failed = total_executions - successful
             success_rate = (successful / total_executions * 100) if total_executions > 0 else 0
             
@@ -622,8 +968,52 @@ def streamlit_mode():
             # Recent executions
             st.markdown("### 📋 Recent Executions")
             for i, execution in enumerate(reversed(st.session_state["execution_history"][-10:])):
-                with st.expander(f"Execution {len(st.session_state['execution_history'])-i} - {execution.get('timestamp', 'Unknown')} - {execution.get('status', 'Unknown').upper()}"):
+                visual = execution.get("visual") or {}
+                regression_flag = f" - 🖼️ {visual['regressions']} VISUAL REGRESSION(S)" if visual.get("regressions") else ""
+                with st.expander(f"Execution {execution.get('run_number', '')} - {execution.get('timestamp', 'Unknown')} - {execution.get('status', 'Unknown').upper()}{regression_flag}"):
                     st.text(execution.get("output", "No output available"))
+                    stalled_step = execution.get("stalled_step")
+                    if stalled_step:
+                        st.warning(f"⏱️ Killed by the step watchdog at step {stalled_step['step']}: {stalled_step['action']} {stalled_step['target']}")
+                    if execution.get("log_path"):
+                        st.caption(f"Showing the last part of {execution['output_chars']} characters of output.")
+                        if st.button("📄 Load Full Log", key=f"full_log_{execution['run_number']}"):
+                            st.download_button(
+                                "📥 Download Full Log", load_full_output(execution),
+                                file_name=f"execution_{execution['run_number']}.log",
+                                key=f"download_log_{execution['run_number']}"
+                            )
+                    capture = settle_capture(execution, timeout=0).get("capture")
+                    if capture and capture.get("mode") in RECORDING_MODES:
+                        frames = "extracting in the background" if capture["frames_pending"] else \
+                            f"{capture['frames']} extracted, {capture['missing']} missing"
+                        st.caption(f"Recorded as {capture['mode']}: {capture['captured']} sampled screenshot(s), "
+                                   f"step frames {frames}")
+                        if capture.get("extraction_error"):
+                            st.warning(f"Frame extraction: {capture['extraction_error']}")
+                    elif capture:
+                        st.caption(f"Screenshots captured: {capture['captured']}, skipped as unchanged: {capture['skipped']}")
+                    if execution.get("network"):
+                        st.caption(format_network_stats(execution["network"]))
+                    if execution.get("resources"):
+                        st.caption(format_usage(execution["resources"]))
+
+                    if visual.get("error"):
+                        st.warning(f"Visual comparison failed: {visual['error']}")
+                    for step in visual.get("steps", []):
+                        if step["status"] != "regression":
+                            continue
+                        st.markdown(f"**Regression in {os.path.basename(step['current'])}**: {step['diff_ratio']*100:.2f}% of pixels changed (matched by {step['matched_by']})")
+                        diff_cols = st.columns(3)
+                        for col, (label, path) in zip(diff_cols, [("Baseline", step["baseline"]), ("Current", step["current"]), ("Diff", step["diff_image"])]):
+                            if path and os.path.exists(path):
+                                col.image(path, caption=label, use_column_width=True)
+                        owned = visual.get("run_dir") and os.path.dirname(step["current"]) == visual["run_dir"]
+                        if owned and os.path.exists(step["current"]) and st.button("✅ Approve as Baseline", key=f"approve_{i}_{step['current']}"):
+                            BaselineStore().approve(visual["test_key"], step["current"])
+                            step["status"] = "passed"
+                            visual["regressions"] -= 1
+                            st.rerun()
                     
                     screenshots = execution.get("screenshots", [])
                     if screenshots:
@@ -660,15 +1050,22 @@ def streamlit_mode():
         
         with col2:
             st.markdown("### 💾 Export Options")
-            export_format = st.selectbox("Format", ["JSON", "CSV", "HTML", "PDF"])
+            export_format = st.selectbox("Format", ["JSON", "CSV", "HTML", "PDF", "PDF (one per execution)"])
             
             if st.button("📤 Export Data"):
-                export_data = prepare_export_data(st.session_state, export_format)
-                st.download_button(
-                    f"📥 Download {export_format}",
-                    export_data,
-                    file_name=f"test_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format.lower()}"
-                )
+                try:
+                    with st.spinner(f"Rendering {export_format}..."):
+                        export_data = prepare_export_data(st.session_state, export_format)
+                except Exception as e:
+                    st.error(f"Export failed: {e}. PDF export needs Playwright with Chromium installed "
+                             f"(playwright install chromium).")
+                else:
+                    extension = "zip" if export_format.startswith("PDF (") else export_format.lower()
+                    st.download_button(
+                        f"📥 Download {export_format}",
+                        export_data,
+                        file_name=f"test_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+                    )
         
         if "current_report" in st.session_state:
             st.markdown("### 📄 Generated Report")
@@ -684,7 +1081,7 @@ def streamlit_mode():
             st.text_area("Report Content", value=st.session_state["current_report"], height=400)
 
             # Display screenshots
-            screenshots = sorted(glob("step_*.png"))
+            screenshots = collect_screenshots(".")
             if screenshots:
                 st.markdown("#### Screenshots")
                 for img in screenshots:
@@ -13,23 +13,50 @@ Setup Instructions:
 from fastapi import FastAPI, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 import os
-import subprocess
-import glob
 from datetime import datetime
 
 import vertexai
-from vertexai.generative_models import GenerativeModel, Part
+from vertexai.generative_models import GenerativeModel
+from model_client import get_shared_client, vertex_generate_fn
+from script_runner import (BROWSER_ENGINES, DEFAULT_STEP_TIMEOUT, apply_browser_options, collect_screenshots,
+                           make_run_options)
+from script_runner import run_script as execute_script
+from resource_monitor import totals as resource_totals
+from browser_matrix import run_matrix
+from network_profiles import PROFILES
+from test_scheduler import SuiteScheduler
+from test_case_pipeline import (
+    STRUCTURED_GENERATION_CONFIG,
+    build_structured_prompt,
+    case_to_steps,
+    default_run_case,
+    parse_test_cases,
+    run_pipeline,
+)
+from async_suite import DEFAULT_MAX_CONTEXTS, run_suite
+from distributed import Coordinator, build_router
+from live_session import SessionManager, build_step_prompt
+from page_outline import build_outline_section, get_cache as get_outline_cache
+from playwright_specs import build_spec_prompt, clean_spec, generate_specs, run_specs, write_spec
+from script_verifier import verify_script as verify_script_chunked
+from script_index import get_index as get_script_index
+from parameterized_runs import parameterize, parse_data_table, run_data_table
+from live_session import build_router as build_session_router
+from artifact_server import build_router as build_artifact_router, cache_headers, not_modified, resolve_artifact
+from trace_capture import step_capture_instruction, wait_for_frames
 
 # --- Configuration ---
 PROJECT_ID = "project-1-3-464607"
 REGION = "us-central1"
 MODEL_NAME = "gemini-2.0-flash-lite"
 GENERATED_SCRIPT = "generated_playwright_test.py"
+RUN_TIMEOUT = 300  # seconds per run (per case for suites)
 
 vertexai.init(project=PROJECT_ID, location=REGION)
 model = GenerativeModel(MODEL_NAME)
+llm = get_shared_client(MODEL_NAME, vertex_generate_fn(model))
 
 app = FastAPI()
 
@@ -42,90 +69,307 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Distributed execution: workers on other hosts pull shards from /distributed/*
+coordinator = Coordinator()
+app.include_router(build_router(coordinator), prefix="/distributed")
+
+# Live sessions: one open browser per session, driven one natural-language step at a time
+sessions = SessionManager(translate=lambda instruction: llm.generate(build_step_prompt(instruction), label="session_step"))
+app.include_router(build_session_router(sessions), prefix="/sessions")
+app.include_router(build_artifact_router(), prefix="/artifacts")
+
 class TestStepsRequest(BaseModel):
     test_steps: str
+    browser_type: str = "chromium"
+    headless: bool = False
+    page_context: bool = True
+    output_mode: str = "python_script"
+    test_name: str = "generated test"
+    reuse: bool = True
+    capture_mode: str = "every_step"  # trace/video: screenshot calls only mark steps
 
 class ScriptRequest(BaseModel):
     script_code: str
+    browser_type: Optional[str] = None
+    headless: bool = False
+    capture_mode: str = "every_step"
+    screenshot_sample: int = 0  # trace/video: real screenshot every Nth step
+    network_profile: str = "full"
+    executor: str = "subprocess"
+    timeout: float = RUN_TIMEOUT
+    step_timeout: Optional[float] = DEFAULT_STEP_TIMEOUT
+    resource_limits: Optional[dict] = None
+    test_steps: Optional[str] = None  # recorded in the script index when the run passes
 
-@app.post("/generate_script")
-def generate_script(req: TestStepsRequest):
+class PipelineRequest(BaseModel):
+    requirements: str
+    browser_type: str = "chromium"
+    headless: bool = True
+    capture_mode: str = "every_step"
+    screenshot_sample: int = 0  # trace/video: real screenshot every Nth step
+    network_profile: str = "full"
+    executor: str = "subprocess"
+    timeout: float = RUN_TIMEOUT
+    step_timeout: Optional[float] = DEFAULT_STEP_TIMEOUT
+    resource_limits: Optional[dict] = None
+    max_generators: int = 4
+    max_executors: int = 2
+    smart_scheduling: bool = True
+    reuse: bool = True
+    output_mode: str = "python_script"
+    shards: int = 1
+
+class SuiteCase(BaseModel):
+    name: Optional[str] = None
+    script_code: str
+
+class SuiteRequest(BaseModel):
+    cases: List[SuiteCase]
+    browser_type: str = "chromium"
+    headless: bool = True
+    max_contexts: int = DEFAULT_MAX_CONTEXTS
+    network_profile: str = "full"
+    timeout: float = RUN_TIMEOUT
+    step_timeout: Optional[float] = DEFAULT_STEP_TIMEOUT
+    smart_scheduling: bool = True
+
+class SpecRunRequest(BaseModel):
+    spec_paths: Optional[List[str]] = None  # None runs the whole testDir
+    projects: Optional[List[str]] = None
+    shards: int = 1
+    workers: Optional[int] = None
+    headless: bool = True
+    timeout: float = RUN_TIMEOUT
+
+class ParameterizeRequest(BaseModel):
+    script_code: str
+
+class DataTableRequest(BaseModel):
+    script_code: str
+    rows: Optional[List[dict]] = None
+    csv: Optional[str] = None               # alternative to rows: header = parameter names
+    parameterize: bool = True               # lift literals first; False if script_code already reads PARAMS
+    browser_type: Optional[str] = None
+    headless: bool = True
+    capture_mode: str = "every_step"
+    screenshot_sample: int = 0  # trace/video: real screenshot every Nth step
+    network_profile: str = "full"
+    executor: str = "subprocess"
+    timeout: float = RUN_TIMEOUT
+    step_timeout: Optional[float] = DEFAULT_STEP_TIMEOUT
+    resource_limits: Optional[dict] = None
+    max_workers: int = 4
+
+class MatrixRequest(BaseModel):
+    script_code: str
+    engines: List[str] = BROWSER_ENGINES
+    headless: bool = True
+    capture_mode: str = "every_step"
+    screenshot_sample: int = 0  # trace/video: real screenshot every Nth step
+    network_profile: str = "full"
+    executor: str = "subprocess"
+    timeout: float = RUN_TIMEOUT
+    step_timeout: Optional[float] = DEFAULT_STEP_TIMEOUT
+    resource_limits: Optional[dict] = None
+
+def build_script(test_steps: str, browser_type: str = "chromium", headless: bool = False,
+                 page_context: bool = True, capture_mode: str = "every_step") -> str:
+    """Generate and clean a Playwright script for the given steps"""
+    outline = build_outline_section(test_steps) if page_context else ""
     prompt = f"""
 You are an assistant that converts natural language test instructions into a complete Python Playwright script.
 Generate a Python script that performs the following test steps using Playwright:
 
-{req.test_steps}
+{test_steps}
+{outline}
 
 The script should:
 - Import necessary modules
-- Launch a Chromium browser (headless=False)
+- Launch a {browser_type} browser (headless={headless})
 - Execute the steps
-- Take a screenshot after each step (save as 'step_1.png', 'step_2.png', etc.)
+{step_capture_instruction(capture_mode)}
 - Close the browser at the end
 
 Only output the Python code, nothing else.
 """
-    response = model.generate_content([Part.from_text(prompt)])
-    script_code = response.text
+    script_code = llm.generate(prompt, label="generate_script")
     # Clean code (remove ```python etc)
     lines = script_code.strip().splitlines()
     if lines and lines[0].strip().startswith("```"):
         lines = lines[1:]
     if lines and lines[-1].strip().startswith("```"):
         lines = lines[:-1]
-    script_code = "\n".join(lines).strip()
-    return {"script_code": script_code}
+    return "\n".join(lines).strip()
+
+def build_spec(test_steps: str, test_name: str, page_context: bool = True) -> str:
+    """Generate and clean a @playwright/test spec for the given steps"""
+    outline = build_outline_section(test_steps) if page_context else ""
+    return clean_spec(llm.generate(build_spec_prompt(test_steps, test_name, outline), label="generate_spec"))
+
+@app.post("/generate_script")
+def generate_script(req: TestStepsRequest):
+    if req.output_mode == "playwright_spec":
+        spec_code = build_spec(req.test_steps, req.test_name, req.page_context)
+        return {"script_code": spec_code, "spec_path": write_spec(spec_code, req.test_name)}
+    suggestions = []
+    if req.reuse:
+        match = get_script_index().find(req.test_steps, req.browser_type, req.headless)
+        if match:
+            return {"script_code": match.pop("script"), "reused": match}
+        suggestions = get_script_index().suggest(req.test_steps)
+    return {"script_code": build_script(req.test_steps, req.browser_type, req.headless, req.page_context,
+                                        req.capture_mode),
+            "reused": None, "suggestions": suggestions}
+
+@app.post("/run_specs")
+def run_specs_api(req: SpecRunRequest):
+    try:
+        return run_specs(req.spec_paths, req.projects, req.shards, req.workers, headed=not req.headless,
+                         test_timeout=req.timeout)
+    except RuntimeError as e:
+        return {"error": str(e)}
 
 @app.post("/run_script")
 def run_script(req: ScriptRequest):
-    # Remove old screenshots
-    for f in glob.glob("step_*.png"):
-        os.remove(f)
-    # Save and run script
-    with open(GENERATED_SCRIPT, "w", encoding="utf-8") as f:
-        f.write(req.script_code)
+    script_code = req.script_code
+    if req.browser_type:
+        script_code = apply_browser_options(script_code, req.browser_type, req.headless)
+    result = execute_script(
+        script_code,
+        run_dir=".",
+        script_name=GENERATED_SCRIPT,
+        timeout=req.timeout,
+        options=make_run_options(req.capture_mode, req.network_profile, req.step_timeout, req.resource_limits,
+                                 req.screenshot_sample),
+        executor=req.executor
+    )
+    if result["status"] == "success" and req.test_steps:
+        get_script_index().add(req.test_steps, req.script_code)
+    return {
+        "status": result["status"],
+        "output": result["output"],
+        "screenshots": [os.path.basename(s) for s in result["screenshots"]],
+        "return_code": result["return_code"],
+        "duration": result["duration"],
+        "capture": result.get("capture"),
+        "network": result.get("network"),
+        "stalled_step": result.get("stalled_step"),
+        "resources": result.get("resources")
+    }
+
+@app.get("/run_script/frames")
+def run_script_frames(timeout: float = 0):
+    # Step frames of a trace/video /run_script run are extracted after it returns
+    extraction = wait_for_frames(".", timeout)
+    if extraction is None:
+        return {"pending": True, "screenshots": []}
+    return {"pending": False, "screenshots": [os.path.basename(s) for s in collect_screenshots(".")],
+            "missing": extraction.get("missing", []), "error": extraction.get("error")}
+
+@app.post("/parameterize")
+def parameterize_api(req: ParameterizeRequest):
     try:
-        result = subprocess.run(
-            ["python", GENERATED_SCRIPT],
-            capture_output=True,
-            text=True,
-            timeout=300
-        )
-        screenshots = sorted(glob.glob("step_*.png"))
-        return {
-            "status": "success" if result.returncode == 0 else "error",
-            "output": result.stdout + "\n" + result.stderr,
-            "screenshots": [os.path.basename(s) for s in screenshots],
-            "return_code": result.returncode
-        }
-    except subprocess.TimeoutExpired:
-        return {
-            "status": "timeout",
-            "output": "Script execution timed out.",
-            "screenshots": [],
-            "return_code": -1
+        return parameterize(req.script_code)
+    except SyntaxError as e:
+        return {"error": f"Cannot parameterize: {e}"}
+
+@app.post("/run_data_table")
+def run_data_table_api(req: DataTableRequest):
+    try:
+        rows = [{k: str(v) for k, v in row.items()} for row in req.rows] if req.rows else parse_data_table(req.csv)
+        parameterized = parameterize(req.script_code) if req.parameterize else {"script": req.script_code,
+                                                                                 "parameters": []}
+    except (ValueError, SyntaxError) as e:
+        return {"error": str(e)}
+    if not rows:
+        return {"error": "Send rows or csv with at least one data row"}
+    run = run_data_table(parameterized["script"], rows, parameterized["parameters"], req.browser_type, req.headless,
+                         req.timeout, make_run_options(req.capture_mode, req.network_profile, req.step_timeout,
+                                                       req.resource_limits, req.screenshot_sample),
+                         req.executor, req.max_workers)
+    return {
+        "parameters": parameterized["parameters"],
+        "total": run["total"],
+        "passed": run["passed"],
+        "failed": run["failed"],
+        "unknown_columns": run["unknown_columns"],
+        "wall_time": run["wall_time"],
+        "sequential_time": run["sequential_time"],
+        "rows": [
+            {
+                "row": result["row"],
+                "params": result["params"],
+                "status": result["status"],
+                "duration": result["duration"],
+                "output": result["output"],
+                "screenshots": [os.path.relpath(s) for s in result["screenshots"]],
+                "run_dir": result["run_dir"],
+                "resources": result.get("resources")
+            }
+            for result in run["rows"]
+        ]
+    }
+
+@app.post("/run_matrix")
+def run_matrix_api(req: MatrixRequest):
+    matrix = run_matrix(req.script_code, req.engines, headless=req.headless, timeout=req.timeout,
+                        options=make_run_options(req.capture_mode, req.network_profile, req.step_timeout,
+                                                 req.resource_limits, req.screenshot_sample),
+                        executor=req.executor)
+    return {
+        "wall_time": matrix["wall_time"],
+        "sequential_time": matrix["sequential_time"],
+        "all_passed": matrix["all_passed"],
+        "engines": {
+            engine: {
+                "status": result["status"],
+                "duration": result["duration"],
+                "output": result["output"],
+                "screenshots": result["screenshots"],
+                "return_code": result["return_code"],
+                "network": result.get("network"),
+                "resources": result.get("resources")
+            }
+            for engine, result in matrix["engines"].items()
         }
+    }
 
-@app.post("/verify_script")
-def verify_script(req: ScriptRequest):
-    prompt = f"""
-Analyze the following Playwright test script and provide:
+@app.get("/metrics")
+def metrics():
+    """Model client counters and aggregate resource usage of runs executed by this process"""
+    return {
+        "model": dict(llm.stats),
+        "model_calls": llm.recent_usage(),
+        "executions": resource_totals.summary(),
+        "page_outlines": dict(get_outline_cache().stats),
+        "script_index": dict(get_script_index().stats)
+    }
 
-1. Code Quality Assessment
-2. Best Practices Check
-3. Potential Issues/Bugs
-4. Performance Optimization Suggestions
-5. Security Considerations
-6. Maintainability Score (1-10)
-7. Specific Improvements
+@app.get("/network_profiles")
+def list_network_profiles():
+    return {"profiles": PROFILES}
 
-Test Script:
-{req.script_code}
+@app.post("/run_suite")
+def run_suite_api(req: SuiteRequest):
+    suite = run_suite(
+        [case.dict() for case in req.cases],
+        browser_type=req.browser_type,
+        headless=req.headless,
+        max_contexts=req.max_contexts,
+        case_timeout=req.timeout,
+        step_timeout=req.step_timeout,
+        network_profile=req.network_profile,
+        scheduler=SuiteScheduler() if req.smart_scheduling else None
+    )
+    for result in suite["cases"]:
+        result["screenshots"] = [os.path.relpath(s) for s in result["screenshots"]]
+    return suite
 
-Provide detailed feedback with specific line references where applicable.
-"""
-    response = model.generate_content([Part.from_text(prompt)])
-    return {"verification": response.text}
+@app.post("/verify_script")
+def verify_script(req: ScriptRequest):
+    result = verify_script_chunked(req.script_code, llm.generate)
+    return {"verification": result["report"], "chunked": result["chunked"], "chunks": result["chunks"],
+            "prompt_tokens": result["prompt_tokens"]}
 
 @app.post("/generate_test_cases")
 def generate_test_cases_api(req: TestStepsRequest):
@@ -145,16 +389,72 @@ For each test case, provide:
 
 Format as a structured list with clear separation between test cases.
 """
-    response = model.generate_content([Part.from_text(prompt)])
-    return {"test_cases": response.text}
+    return {"test_cases": llm.generate(prompt, label="generate_test_cases")}
 
-from fastapi.responses import FileResponse
+@app.post("/generate_test_cases_structured")
+def generate_test_cases_structured(req: TestStepsRequest):
+    text = llm.generate(build_structured_prompt(req.test_steps), label="structured_test_cases",
+                        generation_config=STRUCTURED_GENERATION_CONFIG)
+    return {"test_cases": parse_test_cases(text)}
+
+@app.post("/pipeline")
+def run_pipeline_api(req: PipelineRequest):
+    text = llm.generate(build_structured_prompt(req.requirements), label="structured_test_cases",
+                        generation_config=STRUCTURED_GENERATION_CONFIG)
+    cases = parse_test_cases(text)
+    if req.output_mode == "playwright_spec":
+        records = generate_specs(cases, lambda steps, name: build_spec(steps, name), req.max_generators)
+        spec_paths = [r["spec_path"] for r in records if r.get("spec_path")]
+        try:
+            spec_run = run_specs(spec_paths, [req.browser_type], req.shards, headed=not req.headless,
+                                 test_timeout=req.timeout)
+        except RuntimeError as e:
+            spec_run = {"error": str(e)}
+        return {"total": len(records), "cases": records, "run": spec_run}
+    def generate_case_script(steps):
+        generate = lambda s: build_script(s, req.browser_type, req.headless, capture_mode=req.capture_mode)
+        if not req.reuse:
+            return generate(steps)
+        return get_script_index().generate(steps, generate, req.browser_type, req.headless)[0]
+
+    scheduler = SuiteScheduler() if req.smart_scheduling else None
+    records = run_pipeline(
+        cases,
+        generate_case_script,
+        default_run_case(None, req.headless,
+                         make_run_options(req.capture_mode, req.network_profile, req.step_timeout, req.resource_limits,
+                                          req.screenshot_sample),
+                         req.timeout, req.executor),
+        max_generators=req.max_generators,
+        max_executors=req.max_executors,
+        scheduler=scheduler
+    )
+    for record in records:
+        if record.get("status") == "success" and record.get("script_code"):
+            get_script_index().add(case_to_steps(record), record["script_code"])
+    return {
+        "total": len(records),
+        "passed": sum(1 for r in records if r.get("status") == "success"),
+        "schedule": scheduler.summary() if scheduler else None,
+        "results": records
+    }
+
+from fastapi import Header
+from fastapi.responses import FileResponse, Response
 
 @app.get("/screenshot/{filename}")
-def get_screenshot(filename: str):
-    path = os.path.join(os.getcwd(), filename)
-    if os.path.exists(path):
-        return FileResponse(path)
+def get_screenshot(filename: str, if_none_match: Optional[str] = Header(None),
+                   if_modified_since: Optional[str] = Header(None)):
+    # Screenshots of /run_script live in the working directory; run artifacts are served under /artifacts
+    try:
+        path = resolve_artifact(filename, os.getcwd())
+    except ValueError:
+        path = None
+    if path and os.path.isfile(path):
+        headers = cache_headers(path)
+        if not_modified(path, headers["ETag"], if_none_match, if_modified_since):
+            return Response(status_code=304, headers=headers)
+        return FileResponse(path, headers=headers)
     return {"error": "File not found"}
 
 # To run: uvicorn backend.main:app --reload
\ No newline at end of file
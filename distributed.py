@@ -0,0 +1,491 @@
+"""
+Multi-node distributed execution of generated Playwright scripts.
+
+- Coordinator: lives inside the FastAPI app (see build_router). Splits a job into
+  one shard per script, hands shards to workers according to their free capacity,
+  tracks heartbeats, requeues shards of failed/silent workers and stores uploaded
+  artifacts under ARTIFACT_ROOT/jobs/<job_id>/<shard_id>/.
+- WorkerAgent: runs on any host, pulls shards over HTTP, executes them with
+  script_runner.run_script and uploads screenshots back to the coordinator.
+- LocalQueue: in-process stand-in for an external queue (Redis, SQS, ...).
+
+Run everything on one box:
+    python distributed.py local --workers 3 --capacity 2
+Run a worker on another host:
+    python distributed.py worker --coordinator http://coordinator:8000/distributed --capacity 4
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from script_runner import ARTIFACT_ROOT, DEFAULT_TIMEOUT, apply_browser_options, new_run_dir, run_script
+
+# --- Configuration ---
+HEARTBEAT_INTERVAL = 5     # seconds between worker heartbeats
+HEARTBEAT_TIMEOUT = 20     # worker considered dead after this many silent seconds
+POLL_INTERVAL = 2          # seconds between lease attempts when idle
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+class LocalQueue:
+    """Thread-safe FIFO of shard ids; stands in for an external queue service"""
+
+    def __init__(self):
+        self._items = deque()
+        self._lock = threading.Lock()
+
+    def put(self, shard_id: str, front: bool = False):
+        with self._lock:
+            if front:
+                self._items.appendleft(shard_id)
+            else:
+                self._items.append(shard_id)
+
+    def get_many(self, count: int) -> list:
+        with self._lock:
+            return [self._items.popleft() for _ in range(min(count, len(self._items)))]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+
+class Coordinator:
+    """Job/shard/worker bookkeeping; all methods are thread-safe"""
+
+    def __init__(self, queue=None, artifact_root: str = ARTIFACT_ROOT, heartbeat_timeout: float = HEARTBEAT_TIMEOUT):
+        self.queue = queue or LocalQueue()
+        self.artifact_root = artifact_root
+        self.heartbeat_timeout = heartbeat_timeout
+        self.jobs = {}
+        self.shards = {}
+        self.workers = {}
+        self._lock = threading.RLock()
+
+    # --- Jobs ---
+    def submit_job(self, scripts: list, browser_type: str = None, headless: bool = True,
+                   timeout: float = DEFAULT_TIMEOUT, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> str:
+        """Create a job with one shard per {"name", "script_code"} entry and enqueue its shards"""
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            shard_ids = []
+            for i, script in enumerate(scripts, 1):
+                shard_id = f"{job_id}-{i}"
+                code = script["script_code"]
+                if browser_type:
+                    code = apply_browser_options(code, browser_type, headless)
+                self.shards[shard_id] = {
+                    "shard_id": shard_id,
+                    "job_id": job_id,
+                    "name": script.get("name") or f"case_{i}",
+                    "script_code": code,
+                    "timeout": timeout,
+                    "status": "queued",
+                    "attempts": 0,
+                    "max_attempts": max_attempts,
+                    "worker_id": None,
+                    "result": None,
+                    "artifacts": []
+                }
+                shard_ids.append(shard_id)
+            self.jobs[job_id] = {
+                "job_id": job_id,
+                "created": datetime.now().isoformat(),
+                "shard_ids": shard_ids
+            }
+        for shard_id in shard_ids:
+            self.queue.put(shard_id)
+        return job_id
+
+    def job_status(self, job_id: str) -> dict:
+        self.reap_stale_workers()
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            shards = [self.shards[s] for s in job["shard_ids"]]
+            counts = {}
+            for shard in shards:
+                counts[shard["status"]] = counts.get(shard["status"], 0) + 1
+            return {
+                "job_id": job_id,
+                "created": job["created"],
+                "done": all(s["status"] in ("success", "failed") for s in shards),
+                "counts": counts,
+                "shards": [
+                    {k: v for k, v in shard.items() if k != "script_code"}
+                    for shard in shards
+                ]
+            }
+
+    # --- Workers ---
+    def register_worker(self, host: str, capacity: int, worker_id: str = None) -> str:
+        worker_id = worker_id or uuid.uuid4().hex[:12]
+        with self._lock:
+            self.workers[worker_id] = {
+                "worker_id": worker_id,
+                "host": host,
+                "capacity": max(1, int(capacity)),
+                "active": set(),
+                "last_seen": time.monotonic(),
+                "alive": True
+            }
+        return worker_id
+
+    def heartbeat(self, worker_id: str, running: list = None) -> bool:
+        """Record a heartbeat; returns False if the worker is unknown or was declared dead"""
+        with self._lock:
+            worker = self.workers.get(worker_id)
+            if worker is None or not worker["alive"]:
+                return False
+            worker["last_seen"] = time.monotonic()
+            return True
+
+    def lease(self, worker_id: str, requested: int) -> list:
+        """Hand out up to the worker's free capacity worth of queued shards"""
+        self.reap_stale_workers()
+        with self._lock:
+            worker = self.workers.get(worker_id)
+            if worker is None or not worker["alive"]:
+                return []
+            worker["last_seen"] = time.monotonic()
+            free = worker["capacity"] - len(worker["active"])
+            granted = []
+            for shard_id in self.queue.get_many(max(0, min(free, requested))):
+                shard = self.shards.get(shard_id)
+                if shard is None or shard["status"] != "queued":
+                    continue
+                shard["status"] = "running"
+                shard["worker_id"] = worker_id
+                shard["attempts"] += 1
+                worker["active"].add(shard_id)
+                granted.append({
+                    "shard_id": shard_id,
+                    "name": shard["name"],
+                    "script_code": shard["script_code"],
+                    "timeout": shard["timeout"]
+                })
+            return granted
+
+    def complete_shard(self, worker_id: str, shard_id: str, result: dict) -> dict:
+        """Record a shard result; failed shards are requeued until max_attempts is reached"""
+        with self._lock:
+            shard = self.shards.get(shard_id)
+            if shard is None:
+                return {"accepted": False}
+            worker = self.workers.get(worker_id)
+            if worker:
+                worker["active"].discard(shard_id)
+            if shard["worker_id"] != worker_id or shard["status"] != "running":
+                # Late result from a worker whose lease was already requeued
+                return {"accepted": False}
+            shard["result"] = result
+            if result.get("status") == "success":
+                shard["status"] = "success"
+            elif shard["attempts"] < shard["max_attempts"]:
+                self._requeue(shard)
+            else:
+                shard["status"] = "failed"
+            return {"accepted": True, "status": shard["status"]}
+
+    def _requeue(self, shard: dict):
+        shard["status"] = "queued"
+        shard["worker_id"] = None
+        self.queue.put(shard["shard_id"], front=True)
+
+    def reap_stale_workers(self):
+        """Declare silent workers dead and requeue the shards they were running"""
+        now = time.monotonic()
+        with self._lock:
+            for worker in self.workers.values():
+                if worker["alive"] and now - worker["last_seen"] > self.heartbeat_timeout:
+                    worker["alive"] = False
+                    for shard_id in list(worker["active"]):
+                        shard = self.shards[shard_id]
+                        if shard["status"] == "running":
+                            self._requeue(shard)
+                    worker["active"].clear()
+
+    def workers_status(self) -> list:
+        self.reap_stale_workers()
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "worker_id": w["worker_id"],
+                    "host": w["host"],
+                    "capacity": w["capacity"],
+                    "active": sorted(w["active"]),
+                    "alive": w["alive"],
+                    "seconds_since_heartbeat": round(now - w["last_seen"], 1)
+                }
+                for w in self.workers.values()
+            ]
+
+    # --- Artifacts ---
+    def store_artifact(self, shard_id: str, filename: str, data: bytes) -> str:
+        with self._lock:
+            shard = self.shards.get(shard_id)
+            if shard is None:
+                return None
+            job_id = shard["job_id"]
+        filename = os.path.basename(filename)
+        if not filename or filename.startswith("."):
+            raise ValueError("Invalid artifact name")
+        target_dir = os.path.join(self.artifact_root, "jobs", job_id, shard_id)
+        os.makedirs(target_dir, exist_ok=True)
+        path = os.path.join(target_dir, filename)
+        with open(path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            if path not in shard["artifacts"]:
+                shard["artifacts"].append(path)
+        return path
+
+
+def build_router(coordinator: Coordinator):
+    """FastAPI router exposing the coordinator; mount with app.include_router(..., prefix="/distributed")"""
+    from fastapi import APIRouter, HTTPException, Request
+    from pydantic import BaseModel
+    from typing import List, Optional
+
+    router = APIRouter()
+
+    class ScriptItem(BaseModel):
+        name: Optional[str] = None
+        script_code: str
+
+    class JobRequest(BaseModel):
+        scripts: List[ScriptItem]
+        browser_type: Optional[str] = None
+        headless: bool = True
+        timeout: float = DEFAULT_TIMEOUT
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS
+
+    class RegisterRequest(BaseModel):
+        host: str
+        capacity: int = 1
+        worker_id: Optional[str] = None
+
+    class HeartbeatRequest(BaseModel):
+        running: List[str] = []
+
+    class LeaseRequest(BaseModel):
+        max_shards: int = 1
+
+    class CompleteRequest(BaseModel):
+        worker_id: str
+        result: dict
+
+    @router.post("/jobs")
+    def submit_job(req: JobRequest):
+        job_id = coordinator.submit_job(
+            [s.dict() for s in req.scripts], req.browser_type, req.headless, req.timeout, req.max_attempts
+        )
+        return {"job_id": job_id}
+
+    @router.get("/jobs/{job_id}")
+    def get_job(job_id: str):
+        status = coordinator.job_status(job_id)
+        if status is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return status
+
+    @router.get("/workers")
+    def list_workers():
+        return {"workers": coordinator.workers_status(), "queued": len(coordinator.queue)}
+
+    @router.post("/workers/register")
+    def register(req: RegisterRequest):
+        return {"worker_id": coordinator.register_worker(req.host, req.capacity, req.worker_id)}
+
+    @router.post("/workers/{worker_id}/heartbeat")
+    def heartbeat(worker_id: str, req: HeartbeatRequest):
+        return {"known": coordinator.heartbeat(worker_id, req.running)}
+
+    @router.post("/workers/{worker_id}/lease")
+    def lease(worker_id: str, req: LeaseRequest):
+        return {"shards": coordinator.lease(worker_id, req.max_shards)}
+
+    @router.post("/shards/{shard_id}/complete")
+    def complete(shard_id: str, req: CompleteRequest):
+        return coordinator.complete_shard(req.worker_id, shard_id, req.result)
+
+    @router.put("/shards/{shard_id}/artifacts/{filename}")
+    async def upload_artifact(shard_id: str, filename: str, request: Request):
+        try:
+            path = coordinator.store_artifact(shard_id, filename, await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if path is None:
+            raise HTTPException(status_code=404, detail="Shard not found")
+        return {"path": path}
+
+    return router
+
+
+class CoordinatorClient:
+    """Minimal HTTP client for the coordinator router (stdlib only, so workers stay lightweight)"""
+
+    def __init__(self, base_url: str, timeout: float = 30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, method: str, path: str, payload=None, data: bytes = None, content_type: str = "application/json"):
+        if payload is not None:
+            data = json.dumps(payload).encode("utf-8")
+        request = urllib.request.Request(
+            self.base_url + path, data=data, method=method, headers={"Content-Type": content_type}
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    def register(self, host: str, capacity: int, worker_id: str = None) -> str:
+        return self._request("POST", "/workers/register", {"host": host, "capacity": capacity, "worker_id": worker_id})["worker_id"]
+
+    def heartbeat(self, worker_id: str, running: list) -> bool:
+        return self._request("POST", f"/workers/{worker_id}/heartbeat", {"running": running})["known"]
+
+    def lease(self, worker_id: str, max_shards: int) -> list:
+        return self._request("POST", f"/workers/{worker_id}/lease", {"max_shards": max_shards})["shards"]
+
+    def complete(self, worker_id: str, shard_id: str, result: dict) -> dict:
+        return self._request("POST", f"/shards/{shard_id}/complete", {"worker_id": worker_id, "result": result})
+
+    def upload_artifact(self, shard_id: str, path: str) -> dict:
+        with open(path, "rb") as f:
+            data = f.read()
+        name = urllib.parse.quote(os.path.basename(path))
+        return self._request("PUT", f"/shards/{shard_id}/artifacts/{name}", data=data, content_type="application/octet-stream")
+
+    def submit_job(self, scripts: list, **options) -> str:
+        return self._request("POST", "/jobs", dict(scripts=scripts, **options))["job_id"]
+
+    def job_status(self, job_id: str) -> dict:
+        return self._request("GET", f"/jobs/{job_id}")
+
+
+class WorkerAgent:
+    """Pulls shards from a coordinator, runs them locally and reports results"""
+
+    def __init__(self, coordinator_url: str, capacity: int = 2, host: str = None,
+                 heartbeat_interval: float = HEARTBEAT_INTERVAL, poll_interval: float = POLL_INTERVAL):
+        self.client = CoordinatorClient(coordinator_url)
+        self.capacity = max(1, capacity)
+        self.host = host or f"{socket.gethostname()}:{os.getpid()}"
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self.worker_id = None
+        self._active = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                with self._lock:
+                    running = sorted(self._active)
+                if not self.client.heartbeat(self.worker_id, running):
+                    # Coordinator restarted or declared us dead: rejoin with the same id
+                    self.worker_id = self.client.register(self.host, self.capacity, self.worker_id)
+            except Exception as e:
+                print(f"[worker {self.host}] heartbeat failed: {e}")
+
+    def _run_shard(self, shard: dict):
+        shard_id = shard["shard_id"]
+        try:
+            result = run_script(shard["script_code"], run_dir=new_run_dir(f"shard_{shard_id}"), timeout=shard["timeout"])
+            for path in result.get("screenshots", []):
+                try:
+                    self.client.upload_artifact(shard_id, path)
+                except Exception as e:
+                    result["output"] += f"\nArtifact upload failed for {path}: {e}"
+            summary = {k: result.get(k) for k in ("status", "output", "return_code", "duration", "resources")}
+            summary["host"] = self.host
+            self.client.complete(self.worker_id, shard_id, summary)
+        except Exception as e:
+            print(f"[worker {self.host}] shard {shard_id} failed to report: {e}")
+        finally:
+            with self._lock:
+                self._active.discard(shard_id)
+
+    def run_forever(self):
+        self.worker_id = self.client.register(self.host, self.capacity)
+        print(f"[worker {self.host}] registered as {self.worker_id} with capacity {self.capacity}")
+        threading.Thread(target=self._heartbeat_loop, daemon=True).start()
+        with ThreadPoolExecutor(max_workers=self.capacity) as pool:
+            while not self._stop.is_set():
+                with self._lock:
+                    free = self.capacity - len(self._active)
+                shards = []
+                if free > 0:
+                    try:
+                        shards = self.client.lease(self.worker_id, free)
+                    except Exception as e:
+                        print(f"[worker {self.host}] lease failed: {e}")
+                for shard in shards:
+                    with self._lock:
+                        self._active.add(shard["shard_id"])
+                    pool.submit(self._run_shard, shard)
+                if not shards:
+                    self._stop.wait(self.poll_interval)
+
+
+def run_local_cluster(workers: int, capacity: int, port: int):
+    """Start a coordinator-only FastAPI app plus N local worker processes (single-box testing)"""
+    import uvicorn
+    from fastapi import FastAPI
+
+    app = FastAPI()
+    app.include_router(build_router(Coordinator()), prefix="/distributed")
+    coordinator_url = f"http://127.0.0.1:{port}/distributed"
+
+    processes = [
+        subprocess.Popen([
+            sys.executable, os.path.abspath(__file__), "worker",
+            "--coordinator", coordinator_url, "--capacity", str(capacity), "--host", f"local-{i}"
+        ])
+        for i in range(1, workers + 1)
+    ]
+    print(f"Coordinator on {coordinator_url} with {workers} local workers. Submit jobs to POST /distributed/jobs")
+    try:
+        uvicorn.run(app, host="127.0.0.1", port=port)
+    finally:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distributed Playwright execution")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    worker_parser = sub.add_parser("worker", help="Run a worker agent")
+    worker_parser.add_argument("--coordinator", required=True, help="Coordinator base URL, e.g. http://host:8000/distributed")
+    worker_parser.add_argument("--capacity", type=int, default=2, help="Concurrent shards on this host")
+    worker_parser.add_argument("--host", default=None, help="Name reported to the coordinator")
+
+    local_parser = sub.add_parser("local", help="Coordinator plus local worker processes")
+    local_parser.add_argument("--workers", type=int, default=3)
+    local_parser.add_argument("--capacity", type=int, default=2)
+    local_parser.add_argument("--port", type=int, default=8765)
+
+    args = parser.parse_args()
+    if args.mode == "worker":
+        WorkerAgent(args.coordinator, args.capacity, args.host).run_forever()
+    else:
+        run_local_cluster(args.workers, args.capacity, args.port)
@@ -0,0 +1,135 @@
+"""
+Bounded execution history for Streamlit sessions.
+
+ExecutionHistory behaves like the list previously kept in
+st.session_state["execution_history"] (append, len, iteration, slicing), but:
+- only the last MAX_RECORDS summary records stay in memory (ring buffer)
+- each record keeps a TAIL_CHARS excerpt of its output instead of the full text
+- the full stdout+stderr is spilled to a gzip file and loaded on demand
+- evicted records are appended to a gzip JSON-lines archive, so exports
+  (all_records) still cover every run
+- aggregate counters cover every run, including records already evicted
+
+Memory per session therefore stays flat no matter how many runs a user does.
+"""
+
+import gzip
+import json
+import os
+import uuid
+from collections import Counter, deque
+
+# --- Configuration ---
+LOG_DIR = "execution_logs"
+MAX_RECORDS = 50          # summary records kept in memory per session
+TAIL_CHARS = 4000         # output excerpt kept in memory per record
+MAX_LOG_FILES = 500       # spilled logs kept on disk per session (oldest deleted first)
+ARCHIVE_FILE = "records.jsonl.gz"  # summaries evicted from memory, per session
+
+
+def tail_excerpt(text: str, limit: int = TAIL_CHARS) -> str:
+    if len(text) <= limit:
+        return text
+    return f"... [{len(text) - limit} earlier characters in full log] ...\n" + text[-limit:]
+
+
+class ExecutionHistory:
+    """List-like ring buffer of execution summaries with full logs spilled to disk"""
+
+    def __init__(self, log_dir: str = LOG_DIR, max_records: int = MAX_RECORDS,
+                 tail_chars: int = TAIL_CHARS, max_log_files: int = MAX_LOG_FILES):
+        self.session_id = uuid.uuid4().hex[:12]
+        self.log_dir = os.path.join(log_dir, self.session_id)
+        self.tail_chars = tail_chars
+        self.max_log_files = max_log_files
+        self._records = deque(maxlen=max_records)
+        self._log_files = deque()
+        self.archive_path = os.path.join(self.log_dir, ARCHIVE_FILE)
+        self.total = 0
+        self.status_counts = Counter()
+
+    # --- list-like interface ---
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(list(self._records))
+
+    def __reversed__(self):
+        return reversed(list(self._records))
+
+    def __getitem__(self, index):
+        return list(self._records)[index]
+
+    @property
+    def successful(self) -> int:
+        return self.status_counts.get("success", 0)
+
+    def append(self, entry: dict):
+        """Store a run summary; the full output goes to a compressed log file"""
+        record = dict(entry)
+        output = record.pop("output", "") or ""
+        self.total += 1
+        self.status_counts[record.get("status", "unknown")] += 1
+        record["run_number"] = self.total
+        record["output_chars"] = len(output)
+        record["output"] = tail_excerpt(output, self.tail_chars)
+        record["log_path"] = self._spill(output) if len(output) > self.tail_chars else None
+        if len(self._records) == self._records.maxlen:
+            self._archive(self._records[0])
+        self._records.append(record)
+
+    def _archive(self, record: dict):
+        os.makedirs(self.log_dir, exist_ok=True)
+        with gzip.open(self.archive_path, "at", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+    def all_records(self):
+        """Every run's summary in order: archived (evicted) records streamed from disk, then those in memory"""
+        if os.path.exists(self.archive_path):
+            with gzip.open(self.archive_path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    yield json.loads(line)
+        yield from list(self._records)
+
+    def _spill(self, output: str) -> str:
+        os.makedirs(self.log_dir, exist_ok=True)
+        path = os.path.join(self.log_dir, f"run_{self.total:05d}.log.gz")
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(output)
+        self._log_files.append(path)
+        while len(self._log_files) > self.max_log_files:
+            old = self._log_files.popleft()
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+        return path
+
+    def clear(self):
+        self._records.clear()
+        if os.path.exists(self.archive_path):
+            os.remove(self.archive_path)
+
+
+def load_full_output(record: dict) -> str:
+    """Full output of a run: from its spilled log when there is one, else the in-memory text"""
+    path = record.get("log_path")
+    if path and os.path.exists(path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return f.read()
+    return record.get("output", "")
+
+
+def all_records(history):
+    """Every run's summary, for ExecutionHistory (including evicted runs) or a plain list"""
+    if isinstance(history, ExecutionHistory):
+        return history.all_records()
+    return iter(history)
+
+
+def history_stats(history) -> tuple:
+    """(total, successful) over every run, for ExecutionHistory or a plain list"""
+    if isinstance(history, ExecutionHistory):
+        return history.total, history.successful
+    return len(history), sum(1 for execution in history if execution.get("status") == "success")
@@ -0,0 +1,379 @@
+"""
+Fork-server execution mode (POSIX only).
+
+A long-lived server process imports Playwright and the run hooks once. Each
+run request forks a supervisor, which forks an isolated child that executes
+the generated script with runpy. The supervisor captures stdout/stderr through
+pipes, accounts the child's resource usage and enforces the run deadline, the
+per-step watchdog (step_watchdog) and resource limits by killing the child's
+whole process group.
+Per-run overhead drops from "start a Python interpreter and import playwright"
+to a fork.
+
+The Playwright driver connection itself (a node subprocess plus asyncio/greenlet
+state) is not fork-safe, so each child still opens its own driver; everything
+that can be shared across fork (interpreter, imported modules, hook code) is.
+
+Only the current user can talk to the server: the socket lives in a 0700
+directory and is itself 0600, and every server generates a random auth key that
+clients read from a 0600 file next to the socket (or PW_FORK_SERVER_AUTHKEY,
+when set, for both sides). One server owns an address at a time: it holds an
+exclusive flock on a lockfile next to the socket, and a second server started
+for the same address exits instead of taking the socket over.
+
+Start manually:  python fork_server.py
+Or let script_runner start it on first use (executor="fork_server").
+"""
+
+import os
+import runpy
+import secrets
+import selectors
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+import run_bootstrap
+from resource_monitor import SAMPLE_INTERVAL, ResourceMonitor
+from step_watchdog import read_heartbeat, stalled
+
+# --- Configuration ---
+DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(), f"pw_fork_server_{os.getuid() if hasattr(os, 'getuid') else 0}",
+                               "server.sock")
+AUTHKEY_ENV = "PW_FORK_SERVER_AUTHKEY"  # optional fixed key; otherwise a random key per server
+STARTUP_TIMEOUT = 30  # seconds
+
+
+def is_supported() -> bool:
+    return hasattr(os, "fork") and hasattr(os, "setsid")
+
+
+def key_path(address: str) -> str:
+    return address + ".key"
+
+
+def lock_path(address: str) -> str:
+    return address + ".lock"
+
+
+def _private_dir(address: str):
+    """Create the socket's directory as 0700 and refuse one that others can reach"""
+    directory = os.path.dirname(address)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.stat(directory)
+    if info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise RuntimeError(f"{directory} must be owned by the current user with mode 0700")
+
+
+def _new_authkey(address: str) -> bytes:
+    """Random key for this server, written to a 0600 file for clients (the environment key wins if set)"""
+    if os.getenv(AUTHKEY_ENV):
+        return os.environ[AUTHKEY_ENV].encode("utf-8")
+    key = secrets.token_hex(32).encode("ascii")
+    path = key_path(address)
+    if os.path.exists(path):
+        os.remove(path)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+def read_authkey(address: str) -> bytes:
+    """The running server's key (None when no server has written one)"""
+    if os.getenv(AUTHKEY_ENV):
+        return os.environ[AUTHKEY_ENV].encode("utf-8")
+    try:
+        with open(key_path(address), "rb") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _prewarm():
+    """Import everything a generated script and the run hooks will need"""
+    import playwright.sync_api  # noqa: F401
+    import playwright.async_api  # noqa: F401
+    import change_capture  # noqa: F401
+    import network_profiles  # noqa: F401
+    import step_watchdog  # noqa: F401
+    import trace_capture  # noqa: F401
+
+
+def _run_child(request: dict, out_fd: int, err_fd: int):
+    """Grandchild: become a process-group leader, redirect output and run the script"""
+    os.setsid()
+    os.dup2(out_fd, 1)
+    os.dup2(err_fd, 2)
+    code = 0
+    options = request.get("options") or {}
+    try:
+        os.chdir(request["cwd"])
+        if options:
+            import json
+            os.environ[run_bootstrap.OPTIONS_ENV] = json.dumps(options)
+            run_bootstrap.install_hooks(options)
+        sys.argv = [request["script"]]
+        try:
+            runpy.run_path(request["script"], run_name="__main__")
+        finally:
+            run_bootstrap.finalize_hooks(options)
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        if not isinstance(e.code, (int, type(None))):
+            print(e.code, file=sys.stderr)
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+def _supervise(conn):
+    """Supervisor: fork the script child, pump its output, enforce the deadlines, reply"""
+    request = conn.recv()
+    if request.get("op") == "ping":
+        conn.send({"ok": True, "pid": os.getppid()})
+        return
+
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        conn.close()
+        os.close(out_r)
+        os.close(err_r)
+        _run_child(request, out_w, err_w)
+    os.close(out_w)
+    os.close(err_w)
+
+    chunks = {out_r: [], err_r: []}
+    selector = selectors.DefaultSelector()
+    for fd in chunks:
+        selector.register(fd, selectors.EVENT_READ)
+    step_timeout = (request.get("options") or {}).get("step_timeout")
+    monitor = ResourceMonitor(pid, (request.get("options") or {}).get("resource_limits"))
+    started_at = time.time()
+    deadline = time.monotonic() + request.get("timeout", 500)
+    last_check = time.monotonic()
+    killed = violation = None
+    status = None
+    while status is None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            killed = "run"
+            break
+        if time.monotonic() - last_check >= SAMPLE_INTERVAL:
+            last_check = time.monotonic()
+            if step_timeout and stalled(read_heartbeat(request["cwd"]), started_at, step_timeout):
+                killed = "step"
+                break
+            violation = monitor.sample()
+            if violation:
+                killed = "resources"
+                break
+        if selector.get_map():
+            events = selector.select(timeout=min(remaining, 0.5))
+        else:
+            time.sleep(min(remaining, 0.05))
+            events = []
+        for key, _ in events:
+            data = os.read(key.fd, 65536)
+            if data:
+                chunks[key.fd].append(data)
+            else:
+                selector.unregister(key.fd)
+        if not events:
+            done, wait_status = os.waitpid(pid, os.WNOHANG)
+            if done:
+                status = wait_status
+    # Kill whatever is left of the child's process group (browsers, driver) on exit or when killed
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+    if status is None:
+        _, status = os.waitpid(pid, 0)
+    # Drain everything still buffered; non-blocking so a writer outside the group cannot hang us
+    for fd in selector.get_map():
+        os.set_blocking(fd, False)
+        try:
+            while True:
+                data = os.read(fd, 65536)
+                if not data:
+                    break
+                chunks[fd].append(data)
+        except BlockingIOError:
+            pass
+    selector.close()
+    os.close(out_r)
+    os.close(err_r)
+
+    conn.send({
+        "return_code": -1 if killed else os.waitstatus_to_exitcode(status),
+        "stdout": b"".join(chunks[out_r]).decode("utf-8", "replace"),
+        "stderr": b"".join(chunks[err_r]).decode("utf-8", "replace"),
+        "killed": killed,
+        "violation": violation,
+        "resources": monitor.usage()
+    })
+
+
+def _reap_children():
+    while True:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+
+
+def _claim(address: str):
+    """Exclusive lock on the address for this server's lifetime (None when another server owns it)"""
+    import fcntl
+    fd = os.open(lock_path(address), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def serve(address: str = DEFAULT_ADDRESS) -> bool:
+    """Accept run requests forever; one supervisor fork per request (False when the address is taken)"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    _prewarm()
+    _private_dir(address)
+    lock_fd = _claim(address)
+    if lock_fd is None or ForkServerClient(address).ping():
+        print(f"Fork server already running on {address}", flush=True)
+        if lock_fd is not None:
+            os.close(lock_fd)
+        return False
+    if os.path.exists(address):
+        os.remove(address)
+    authkey = _new_authkey(address)
+    old_umask = os.umask(0o177)  # the socket is created 0600
+    try:
+        listener = Listener(address, family="AF_UNIX", authkey=authkey)
+    finally:
+        os.umask(old_umask)
+    os.chmod(address, 0o600)
+    print(f"Fork server ready on {address} (pid {os.getpid()})", flush=True)
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                print(f"Rejected connection: {e}", flush=True)
+                continue
+            pid = os.fork()
+            if pid == 0:
+                listener.close()
+                os.close(lock_fd)
+                try:
+                    _supervise(conn)
+                except Exception:
+                    traceback.print_exc()
+                finally:
+                    os._exit(0)
+            conn.close()
+            _reap_children()
+    finally:
+        listener.close()
+        os.close(lock_fd)
+
+
+class ForkServerClient:
+    """Talks to (and if needed starts) the fork server"""
+
+    def __init__(self, address: str = DEFAULT_ADDRESS):
+        self.address = address
+        self._process = None
+
+    def ping(self) -> bool:
+        authkey = read_authkey(self.address)
+        if authkey is None:
+            return False
+        try:
+            with Client(self.address, family="AF_UNIX", authkey=authkey) as conn:
+                conn.send({"op": "ping"})
+                return conn.recv().get("ok", False)
+        except (OSError, EOFError, AuthenticationError):
+            return False
+
+    def ensure_started(self):
+        """Start the server unless one answers; concurrent callers start at most one"""
+        with _start_lock:
+            if self.ping():
+                return
+            self._process = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "--address", self.address],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+            )
+            deadline = time.monotonic() + STARTUP_TIMEOUT
+            while time.monotonic() < deadline:
+                if self.ping():
+                    return
+                # Exit code 0: another process's server owns the address and is still starting
+                if self._process.poll() not in (None, 0):
+                    break
+                time.sleep(0.1)
+            raise RuntimeError("Fork server failed to start (is playwright installed?)")
+
+    def _connect(self):
+        try:
+            authkey = read_authkey(self.address)
+            if authkey is None:
+                raise FileNotFoundError(key_path(self.address))
+            return Client(self.address, family="AF_UNIX", authkey=authkey)
+        except (OSError, AuthenticationError):
+            # Not running yet (or it died / was restarted with a new key): start it and retry once
+            self.ensure_started()
+            return Client(self.address, family="AF_UNIX", authkey=read_authkey(self.address))
+
+    def run(self, script: str, cwd: str, timeout: float, options: dict = None) -> dict:
+        """Execute script in an isolated forked child; returns return_code/stdout/stderr/killed"""
+        with self._connect() as conn:
+            conn.send({
+                "op": "run",
+                "script": os.path.abspath(os.path.join(cwd, script)),
+                "cwd": os.path.abspath(cwd),
+                "timeout": timeout,
+                "options": options or {}
+            })
+            return conn.recv()
+
+
+_client = None
+_start_lock = threading.Lock()
+
+
+def get_client() -> ForkServerClient:
+    global _client
+    with _start_lock:
+        if _client is None:
+            _client = ForkServerClient()
+        return _client
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pre-warmed fork server for generated Playwright scripts")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help="Unix socket path")
+    args = parser.parse_args()
+    if not is_supported():
+        print("Fork server requires a POSIX system (os.fork).")
+        sys.exit(1)
+    serve(args.address)
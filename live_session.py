@@ -0,0 +1,354 @@
+"""
+Live browser sessions driven one natural-language step at a time.
+
+The interactive loop of scripts.py as a long-lived service: a session keeps one
+browser and page open, and each submitted step is translated into a single
+Playwright command (same prompt as scripts.py), executed against the live page
+and answered with its result and a screenshot. No relaunch and no full-script
+regeneration between steps.
+
+Playwright's sync API is bound to the thread that started it, so every session
+owns a dedicated thread and receives commands through a queue. The manager caps
+concurrent sessions and closes sessions that stay idle past IDLE_TIMEOUT.
+
+Mount the API with app.include_router(build_router(manager), prefix="/sessions").
+"""
+
+import os
+import queue
+import re
+import signal
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from script_runner import BROWSER_ENGINES, DEFAULT_STEP_TIMEOUT, kill_process_tree, new_run_dir
+
+# --- Configuration ---
+MAX_SESSIONS = 4
+IDLE_TIMEOUT = 600     # seconds without a step before a session is closed
+REAP_INTERVAL = 30     # seconds between idle checks
+STARTUP_TIMEOUT = 60   # seconds to launch the browser
+STEP_GRACE = 30        # seconds past step_timeout before a step counts as stuck
+
+
+class StepTimeout(RuntimeError):
+    """A step outlived step_timeout + STEP_GRACE; its session has been killed"""
+
+
+def build_step_prompt(instruction: str) -> str:
+    """Prompt that turns one instruction into one Playwright command (shared with scripts.py)"""
+    return f"""
+You are an assistant that converts natural language test instructions into Playwright Python commands.
+
+Examples:
+- Instruction: "Open https://example.com"
+  Output: page.goto("https://example.com")
+- Instruction: "Click on the login button"
+  Output: page.click("text=login")
+- Instruction: "Type username test_user"
+  Output: page.fill("input[name='username']", "test_user")
+- Instruction: "Take screenshot"
+  Output: page.screenshot(path=f"{{SCREENSHOT_DIR}}/step.png")
+
+Now convert this instruction:
+"{instruction}"
+"""
+
+
+def clean_command(text: str) -> str:
+    """Strip markdown fences and "Output:" prefixes the model sometimes adds"""
+    text = re.sub(r"^```[a-zA-Z]*\s*|\s*```$", "", text.strip())
+    return re.sub(r"^Output:\s*", "", text.strip())
+
+
+class LiveSession:
+    """One browser + page owned by a dedicated thread"""
+
+    def __init__(self, browser_type: str = "chromium", headless: bool = True, step_timeout: float = DEFAULT_STEP_TIMEOUT):
+        if browser_type not in BROWSER_ENGINES:
+            raise ValueError(f"Unsupported browser type: {browser_type}")
+        self.session_id = uuid.uuid4().hex[:12]
+        self.browser_type = browser_type
+        self.headless = headless
+        self.step_timeout = step_timeout
+        self.run_dir = new_run_dir(f"session_{self.session_id}")
+        self.created = time.time()
+        self.last_used = self.created
+        self.steps = []
+        self.closed = False
+        self.broken = False
+        self._driver_pid = None
+        self._commands = queue.Queue()
+        self._thread = threading.Thread(target=self._worker, name=f"live-session-{self.session_id}", daemon=True)
+
+    def start(self):
+        ready = Future()
+        self._commands.put(("ready", None, ready))
+        self._thread.start()
+        ready.result(timeout=STARTUP_TIMEOUT)
+
+    def _worker(self):
+        from playwright.sync_api import expect, sync_playwright
+
+        try:
+            with sync_playwright() as p:
+                # Driver pid, so a stuck step can be killed from outside this thread
+                transport = getattr(getattr(p._impl_obj, "_connection", None), "_transport", None)
+                self._driver_pid = getattr(getattr(transport, "_proc", None), "pid", None)
+                browser = getattr(p, self.browser_type).launch(headless=self.headless)
+                context = browser.new_context()
+                context.set_default_timeout(self.step_timeout * 1000)
+                page = context.new_page()
+                namespace = {
+                    "page": page, "context": context, "browser": browser, "expect": expect,
+                    "time": time, "re": re, "os": os, "SCREENSHOT_DIR": self.run_dir
+                }
+                while True:
+                    op, payload, future = self._commands.get()
+                    if op == "close":
+                        future.set_result(True)
+                        break
+                    if op == "ready":
+                        future.set_result(True)
+                        continue
+                    future.set_result(self._execute(page, namespace, payload))
+                browser.close()
+        except BaseException as e:
+            # Fail whatever is waiting (startup or queued steps)
+            while True:
+                try:
+                    _, _, future = self._commands.get_nowait()
+                except queue.Empty:
+                    break
+                if not future.done():
+                    future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            self.closed = True
+
+    def _execute(self, page, namespace: dict, step: dict) -> dict:
+        started = time.perf_counter()
+        step_number = len(self.steps) + 1
+        screenshot = os.path.join(self.run_dir, f"step_{step_number}.png")
+        result = {"step": step_number, "instruction": step.get("instruction"), "code": step["code"],
+                  "translate_time": step.get("translate_time", 0.0)}
+        try:
+            exec(compile(step["code"], f"<session step {step_number}>", "exec"), namespace)
+            result.update(status="success", error=None)
+        except Exception as e:
+            result.update(status="error", error=f"{type(e).__name__}: {e}",
+                          traceback=traceback.format_exc(limit=3))
+        try:
+            page.screenshot(path=screenshot)
+            result["screenshot"] = screenshot
+        except Exception:
+            result["screenshot"] = None
+        result["url"] = page.url
+        result["execute_time"] = time.perf_counter() - started
+        self.steps.append(result)
+        return result
+
+    def submit(self, code: str, instruction: str = None, translate_time: float = 0.0) -> dict:
+        if self.closed:
+            raise RuntimeError("Session is closed")
+        self.last_used = time.time()
+        future = Future()
+        self._commands.put(("step", {"code": code, "instruction": instruction, "translate_time": translate_time}, future))
+        try:
+            return future.result(timeout=self.step_timeout + STEP_GRACE)
+        except FutureTimeoutError:
+            # The session thread is stuck inside the step: the session cannot be reused
+            self.broken = True
+            self.kill()
+            raise StepTimeout(f"Step did not finish within {self.step_timeout + STEP_GRACE:g}s; session closed")
+        finally:
+            self.last_used = time.time()
+
+    def kill(self):
+        """Kill the Playwright driver (and with it the browser) without going through the session thread"""
+        self.closed = True
+        self._commands.put(("close", None, Future()))  # lets the thread exit once the dead connection unblocks it
+        pid = self._driver_pid
+        if not pid:
+            return
+        if os.name == "nt":
+            kill_process_tree(pid)
+            return
+        try:
+            os.kill(pid, signal.SIGKILL)  # the browser exits when its pipe to the driver closes
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def close(self):
+        if self.closed:
+            return
+        future = Future()
+        self._commands.put(("close", None, future))
+        try:
+            future.result(timeout=30)
+        except Exception:
+            pass
+        self.closed = True
+
+    def status(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "browser_type": self.browser_type,
+            "headless": self.headless,
+            "run_dir": self.run_dir,
+            "steps": len(self.steps),
+            "idle_seconds": round(time.time() - self.last_used, 1),
+            "closed": self.closed,
+            "broken": self.broken
+        }
+
+
+class SessionManager:
+    """Opens, drives and expires live sessions; thread-safe"""
+
+    def __init__(self, translate=None, max_sessions: int = MAX_SESSIONS, idle_timeout: float = IDLE_TIMEOUT):
+        self.translate = translate  # instruction -> Playwright command (e.g. llm.generate over build_step_prompt)
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+        self._lock = threading.Lock()
+        self._reaper = threading.Thread(target=self._reap_loop, name="live-session-reaper", daemon=True)
+        self._reaper.start()
+
+    def open(self, browser_type: str = "chromium", headless: bool = True,
+             step_timeout: float = DEFAULT_STEP_TIMEOUT) -> LiveSession:
+        self.reap_idle()
+        session = LiveSession(browser_type, headless, step_timeout)
+        with self._lock:
+            if len(self.sessions) >= self.max_sessions:
+                raise RuntimeError(f"Session limit reached ({self.max_sessions} open sessions)")
+            self.sessions[session.session_id] = session
+        try:
+            session.start()
+        except Exception:
+            with self._lock:
+                self.sessions.pop(session.session_id, None)
+            raise
+        return session
+
+    def get(self, session_id: str) -> LiveSession:
+        with self._lock:
+            return self.sessions.get(session_id)
+
+    def step(self, session_id: str, instruction: str = None, code: str = None) -> dict:
+        """Run one step: code as given, or the translation of instruction"""
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        translate_time = 0.0
+        if code is None:
+            if self.translate is None:
+                raise ValueError("No translator configured; send code instead of an instruction")
+            started = time.perf_counter()
+            code = clean_command(self.translate(instruction))
+            translate_time = time.perf_counter() - started
+        try:
+            return session.submit(code, instruction, translate_time)
+        except StepTimeout:
+            with self._lock:
+                self.sessions.pop(session_id, None)  # free the slot now, not at idle reap
+            raise
+
+    def close(self, session_id: str) -> bool:
+        with self._lock:
+            session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+    def reap_idle(self) -> list:
+        now = time.time()
+        with self._lock:
+            expired = [s for s in self.sessions.values() if s.closed or now - s.last_used > self.idle_timeout]
+            for session in expired:
+                self.sessions.pop(session.session_id, None)
+        for session in expired:
+            session.close()
+        return [session.session_id for session in expired]
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(REAP_INTERVAL)
+            try:
+                self.reap_idle()
+            except Exception as e:
+                print(f"Session reaper error: {e}")
+
+    def status(self) -> list:
+        with self._lock:
+            return [session.status() for session in self.sessions.values()]
+
+
+def build_router(manager: SessionManager):
+    """FastAPI router for live sessions; mount with app.include_router(..., prefix="/sessions")"""
+    from fastapi import APIRouter, HTTPException
+    from fastapi.responses import FileResponse
+    from pydantic import BaseModel
+    from typing import Optional
+
+    router = APIRouter()
+
+    class OpenRequest(BaseModel):
+        browser_type: str = "chromium"
+        headless: bool = True
+        step_timeout: float = DEFAULT_STEP_TIMEOUT
+
+    class StepRequest(BaseModel):
+        instruction: Optional[str] = None
+        code: Optional[str] = None
+
+    @router.post("")
+    def open_session(req: OpenRequest):
+        try:
+            session = manager.open(req.browser_type, req.headless, req.step_timeout)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except RuntimeError as e:
+            raise HTTPException(status_code=429, detail=str(e))
+        return session.status()
+
+    @router.get("")
+    def list_sessions():
+        return {"sessions": manager.status(), "max_sessions": manager.max_sessions}
+
+    @router.post("/{session_id}/steps")
+    def run_step(session_id: str, req: StepRequest):
+        if not req.instruction and not req.code:
+            raise HTTPException(status_code=400, detail="Send an instruction or code")
+        try:
+            result = manager.step(session_id, req.instruction, req.code)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Session not found")
+        except StepTimeout as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except (ValueError, RuntimeError) as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        if result.get("screenshot"):
+            result["screenshot"] = os.path.basename(result["screenshot"])
+        return result
+
+    @router.get("/{session_id}/screenshots/{filename}")
+    def get_screenshot(session_id: str, filename: str):
+        session = manager.get(session_id)
+        path = os.path.join(session.run_dir, os.path.basename(filename)) if session else None
+        if not path or not os.path.exists(path):
+            raise HTTPException(status_code=404, detail="Screenshot not found")
+        return FileResponse(path)
+
+    @router.delete("/{session_id}")
+    def close_session(session_id: str):
+        if not manager.close(session_id):
+            raise HTTPException(status_code=404, detail="Session not found")
+        return {"closed": session_id}
+
+    return router
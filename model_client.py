@@ -0,0 +1,248 @@
+"""
+Shared, rate-limit-aware model client.
+
+Wraps any ``prompt -> text`` callable (Vertex AI GenerativeModel or the
+google-genai Client) with:
+- a token-bucket rate limiter
+- bounded parallelism
+- jittered exponential-backoff retries on 429/5xx errors
+- coalescing of identical in-flight prompts (one upstream call serves all waiters)
+- prompt token budgeting (PromptTooLarge before anything is sent) and a per-call
+  usage log with estimated prompt/output tokens and cost
+
+Used by chatgenaitest.py, chatgenaitest_react.py and scripts.py.
+"""
+
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# --- Configuration ---
+DEFAULT_RATE_PER_MINUTE = 60
+DEFAULT_BURST = 10
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY = 1.0   # seconds
+DEFAULT_MAX_DELAY = 30.0   # seconds
+DEFAULT_MAX_PROMPT_TOKENS = 30000
+CHARS_PER_TOKEN = 4        # estimate; close enough for budgeting English text and code
+INPUT_COST_PER_1K = 0.00125   # USD per 1K prompt tokens
+OUTPUT_COST_PER_1K = 0.005    # USD per 1K output tokens
+USAGE_LOG_SIZE = 500
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRYABLE_MARKERS = ("429", "RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED", "Too Many Requests")
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is available"""
+
+    def __init__(self, rate_per_second: float, capacity: int):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: int = 1):
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class PromptTooLarge(ValueError):
+    """Prompt exceeds the client's token budget; split it before sending"""
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text or "") + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def estimate_cost(prompt_tokens: int, output_tokens: int) -> float:
+    return prompt_tokens / 1000 * INPUT_COST_PER_1K + output_tokens / 1000 * OUTPUT_COST_PER_1K
+
+
+class _InFlight:
+    """A pending upstream call that other callers with the same prompt can wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+def is_retryable_error(exc: Exception) -> bool:
+    """Return True for rate-limit / transient server errors from either Google SDK"""
+    for attr in ("code", "status_code"):
+        code = getattr(exc, attr, None)
+        if isinstance(code, int) and code in RETRYABLE_STATUS_CODES:
+            return True
+    # google.api_core exceptions expose the HTTP status via grpc_status_code / message
+    name = type(exc).__name__
+    if name in ("ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded", "InternalServerError"):
+        return True
+    message = str(exc)
+    return any(marker in message for marker in RETRYABLE_MARKERS)
+
+
+class ModelClient:
+    """Rate-limited, retrying, coalescing front for a ``generate_fn(prompt, **kwargs) -> str``"""
+
+    def __init__(
+        self,
+        generate_fn,
+        rate_per_minute: float = DEFAULT_RATE_PER_MINUTE,
+        burst: int = DEFAULT_BURST,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        base_delay: float = DEFAULT_BASE_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        max_prompt_tokens: int = DEFAULT_MAX_PROMPT_TOKENS,
+    ):
+        self._generate_fn = generate_fn
+        self._bucket = TokenBucket(rate_per_minute / 60.0, burst)
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._max_retries = max_retries
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self.max_prompt_tokens = max_prompt_tokens
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "upstream_calls": 0, "coalesced": 0, "retries": 0, "failures": 0,
+                      "rejected": 0, "prompt_tokens": 0, "output_tokens": 0, "cost": 0.0}
+        self.usage_log = deque(maxlen=USAGE_LOG_SIZE)
+
+    @staticmethod
+    def _key(prompt: str, kwargs: dict) -> str:
+        payload = prompt + "\x00" + json.dumps(kwargs, sort_keys=True, default=repr)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def generate(self, prompt: str, label: str = None, **kwargs) -> str:
+        """Generate text for a prompt; identical concurrent prompts share one upstream call"""
+        prompt_tokens = estimate_tokens(prompt)
+        if self.max_prompt_tokens and prompt_tokens > self.max_prompt_tokens:
+            with self._lock:
+                self.stats["rejected"] += 1
+            raise PromptTooLarge(f"Prompt is ~{prompt_tokens} tokens, budget is {self.max_prompt_tokens}")
+        key = self._key(prompt, kwargs)
+        with self._lock:
+            self.stats["requests"] += 1
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = _InFlight()
+            else:
+                flight.waiters += 1
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            started = time.perf_counter()
+            flight.result = self._call_with_retries(prompt, kwargs)
+            self._record_usage(label, prompt_tokens, flight.result, time.perf_counter() - started)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            flight.event.set()
+
+    def _record_usage(self, label: str, prompt_tokens: int, result: str, duration: float):
+        output_tokens = estimate_tokens(result if isinstance(result, str) else "")
+        cost = estimate_cost(prompt_tokens, output_tokens)
+        with self._lock:
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["output_tokens"] += output_tokens
+            self.stats["cost"] = round(self.stats["cost"] + cost, 6)
+            self.usage_log.append({
+                "timestamp": datetime.now().isoformat(),
+                "label": label,
+                "prompt_tokens": prompt_tokens,
+                "output_tokens": output_tokens,
+                "cost": round(cost, 6),
+                "duration": round(duration, 3)
+            })
+
+    def recent_usage(self, limit: int = 50) -> list:
+        """Most recent upstream calls, newest first"""
+        with self._lock:
+            return list(self.usage_log)[-limit:][::-1]
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: spreads retries from many callers instead of synchronising them
+        return random.uniform(0, min(self._max_delay, self._base_delay * (2 ** attempt)))
+
+    def _call_with_retries(self, prompt: str, kwargs: dict) -> str:
+        attempt = 0
+        while True:
+            self._bucket.acquire()
+            with self._semaphore:
+                with self._lock:
+                    self.stats["upstream_calls"] += 1
+                try:
+                    return self._generate_fn(prompt, **kwargs)
+                except Exception as e:
+                    if attempt >= self._max_retries or not is_retryable_error(e):
+                        with self._lock:
+                            self.stats["failures"] += 1
+                        raise
+            with self._lock:
+                self.stats["retries"] += 1
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+
+def vertex_generate_fn(model):
+    """Adapt a vertexai GenerativeModel to ``generate_fn(prompt, **kwargs) -> str``"""
+    from vertexai.generative_models import Part
+
+    def generate(prompt: str, **kwargs) -> str:
+        response = model.generate_content([Part.from_text(prompt)], **kwargs)
+        return response.text
+
+    return generate
+
+
+def genai_generate_fn(client, model_name: str):
+    """Adapt a google-genai Client to ``generate_fn(prompt, **kwargs) -> str``"""
+
+    def generate(prompt: str, **kwargs) -> str:
+        response = client.models.generate_content(model=model_name, contents=prompt, **kwargs)
+        return response.text
+
+    return generate
+
+
+# --- Shared clients (one limiter per model per process) ---
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_shared_client(name: str, generate_fn, **options) -> ModelClient:
+    """Return the process-wide ModelClient registered under ``name``, creating it on first use"""
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = ModelClient(generate_fn, **options)
+        return _clients[name]
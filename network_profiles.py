@@ -0,0 +1,269 @@
+"""
+Network resource blocking and throttling profiles.
+
+A profile installs request routing on a browser context:
+- block resource types (image, media, font, ...) and URL patterns (analytics, ads)
+- throttle: add latency per request and, on Chromium, emulate bandwidth via CDP
+
+Blocked requests never hit the network, so their real size is unknown; bytes
+saved are estimated from typical per-type sizes (TYPICAL_BYTES) and reported
+alongside the measured bytes actually downloaded.
+"""
+
+import json
+import re
+import threading
+
+# --- Configuration ---
+NETWORK_STATS_FILE = "network_stats.json"
+
+AD_AND_ANALYTICS_PATTERNS = [
+    r"google-analytics\.com", r"googletagmanager\.com", r"doubleclick\.net",
+    r"googlesyndication\.com", r"adservice\.google\.", r"facebook\.net",
+    r"connect\.facebook\.", r"hotjar\.com", r"segment\.(io|com)", r"mixpanel\.com",
+    r"clarity\.ms", r"newrelic\.com", r"nr-data\.net", r"/ads?/", r"[?&]utm_"
+]
+
+# Rough median transfer sizes (bytes) used to estimate what blocking saved
+TYPICAL_BYTES = {
+    "image": 45_000,
+    "media": 500_000,
+    "font": 35_000,
+    "stylesheet": 20_000,
+    "script": 30_000,
+    "other": 5_000
+}
+
+PROFILES = {
+    "full": {
+        "description": "Load everything (no routing)",
+        "block_types": [],
+        "block_patterns": []
+    },
+    "functional": {
+        "description": "Block images, media, fonts, analytics and ads",
+        "block_types": ["image", "media", "font"],
+        "block_patterns": AD_AND_ANALYTICS_PATTERNS
+    },
+    "text_only": {
+        "description": "Functional profile plus stylesheets",
+        "block_types": ["image", "media", "font", "stylesheet"],
+        "block_patterns": AD_AND_ANALYTICS_PATTERNS
+    },
+    "slow_3g": {
+        "description": "Load everything over an emulated slow 3G link",
+        "block_types": [],
+        "block_patterns": [],
+        "latency_ms": 400,
+        "download_kbps": 400,
+        "upload_kbps": 400
+    },
+    "functional_slow_3g": {
+        "description": "Functional blocking over an emulated slow 3G link",
+        "block_types": ["image", "media", "font"],
+        "block_patterns": AD_AND_ANALYTICS_PATTERNS,
+        "latency_ms": 400,
+        "download_kbps": 400,
+        "upload_kbps": 400
+    }
+}
+PROFILE_NAMES = list(PROFILES)
+
+
+def get_profile(name: str) -> dict:
+    if name not in PROFILES:
+        raise ValueError(f"Unknown network profile: {name}")
+    return PROFILES[name]
+
+
+class NetworkStats:
+    """Thread-safe per-run request counters"""
+
+    def __init__(self, profile: str):
+        self.profile = profile
+        self._lock = threading.Lock()
+        self.data = {
+            "profile": profile,
+            "requests": 0,
+            "blocked": 0,
+            "blocked_by_type": {},
+            "bytes_downloaded": 0,
+            "estimated_bytes_saved": 0
+        }
+
+    def blocked(self, resource_type: str):
+        with self._lock:
+            self.data["blocked"] += 1
+            self.data["blocked_by_type"][resource_type] = self.data["blocked_by_type"].get(resource_type, 0) + 1
+            self.data["estimated_bytes_saved"] += TYPICAL_BYTES.get(resource_type, TYPICAL_BYTES["other"])
+
+    def allowed(self):
+        with self._lock:
+            self.data["requests"] += 1
+
+    def downloaded(self, size: int):
+        with self._lock:
+            self.data["bytes_downloaded"] += size
+
+    def save(self, path: str = NETWORK_STATS_FILE):
+        with self._lock:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, indent=2)
+
+
+def _block_decider(profile: dict):
+    block_types = set(profile.get("block_types", []))
+    pattern = re.compile("|".join(profile["block_patterns"])) if profile.get("block_patterns") else None
+
+    def should_block(resource_type: str, url: str) -> bool:
+        return resource_type in block_types or bool(pattern and pattern.search(url))
+
+    return should_block
+
+
+def _response_size(response) -> int:
+    try:
+        return int(response.headers.get("content-length", 0))  # chunked responses count as 0
+    except (TypeError, ValueError):
+        return 0
+
+
+def install_sync(context, profile_name: str, stats: NetworkStats = None) -> NetworkStats:
+    """Install a profile on a sync-API BrowserContext"""
+    profile = get_profile(profile_name)
+    stats = stats or NetworkStats(profile_name)
+    should_block = _block_decider(profile)
+    latency = profile.get("latency_ms", 0)
+
+    # Only route when something is blocked: a route on every request disables the HTTP cache
+    if profile.get("block_types") or profile.get("block_patterns"):
+        def handle(route):
+            request = route.request
+            if should_block(request.resource_type, request.url):
+                stats.blocked(request.resource_type)
+                route.abort("blockedbyclient")
+                return
+            stats.allowed()
+            route.continue_()
+
+        context.route("**/*", handle)
+    else:
+        context.on("request", lambda request: stats.allowed())
+    context.on("response", lambda response: stats.downloaded(_response_size(response)))
+    if latency:
+        context.on("page", lambda page: _throttle_page_sync(page, profile))
+        for page in context.pages:
+            _throttle_page_sync(page, profile)
+    return stats
+
+
+def _throttle_page_sync(page, profile: dict):
+    """Bandwidth/latency emulation through CDP (Chromium only; other engines run unthrottled)"""
+    try:
+        session = page.context.new_cdp_session(page)
+    except Exception:
+        return
+    session.send("Network.enable")
+    session.send("Network.emulateNetworkConditions", _cdp_conditions(profile))
+
+
+async def install_async(context, profile_name: str, stats: NetworkStats = None) -> NetworkStats:
+    """Install a profile on an async-API BrowserContext"""
+    profile = get_profile(profile_name)
+    stats = stats or NetworkStats(profile_name)
+    should_block = _block_decider(profile)
+    latency = profile.get("latency_ms", 0)
+
+    # Only route when something is blocked: a route on every request disables the HTTP cache
+    if profile.get("block_types") or profile.get("block_patterns"):
+        async def handle(route):
+            request = route.request
+            if should_block(request.resource_type, request.url):
+                stats.blocked(request.resource_type)
+                await route.abort("blockedbyclient")
+                return
+            stats.allowed()
+            await route.continue_()
+
+        await context.route("**/*", handle)
+    else:
+        context.on("request", lambda request: stats.allowed())
+    context.on("response", lambda response: stats.downloaded(_response_size(response)))
+    if latency:
+        async def throttle(page):
+            try:
+                session = await context.new_cdp_session(page)
+            except Exception:
+                return
+            await session.send("Network.enable")
+            await session.send("Network.emulateNetworkConditions", _cdp_conditions(profile))
+
+        context.on("page", throttle)
+    return stats
+
+
+def _cdp_conditions(profile: dict) -> dict:
+    return {
+        "offline": False,
+        "latency": profile.get("latency_ms", 0),
+        "downloadThroughput": profile.get("download_kbps", 0) * 1024 / 8 or -1,
+        "uploadThroughput": profile.get("upload_kbps", 0) * 1024 / 8 or -1
+    }
+
+
+_installed = {"stats": None}
+
+
+def install(profile_name: str):
+    """Patch sync Browser.new_context/new_page so every context of a generated script gets the profile"""
+    from playwright.sync_api import Browser
+
+    get_profile(profile_name)
+    stats = _installed["stats"] = NetworkStats(profile_name)
+
+    original_new_context = Browser.new_context
+    original_new_page = Browser.new_page
+
+    def new_context(self, *args, **kwargs):
+        context = original_new_context(self, *args, **kwargs)
+        install_sync(context, profile_name, stats)
+        return context
+
+    def new_page(self, *args, **kwargs):
+        # Browser.new_page creates an implicit context; route it through the patched new_context and keep
+        # the page owning it, so page.close() still closes the context
+        context = new_context(self, *args, **kwargs)
+        page = context.new_page()
+
+        def close_context(_):
+            try:
+                context.close()
+            except Exception:
+                pass  # browser already closing
+
+        page.on("close", close_context)
+        return page
+
+    Browser.new_context = new_context
+    Browser.new_page = new_page
+    return stats
+
+
+def finalize():
+    """Write the stats of the installed profile to the run directory"""
+    if _installed["stats"] is not None:
+        _installed["stats"].save()
+
+
+def load_stats(run_dir: str) -> dict:
+    """Read the network stats a run wrote (None when no profile was active)"""
+    import os
+
+    path = os.path.join(run_dir, NETWORK_STATS_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,249 @@
+"""
+Page outline context for script generation.
+
+Before a script is generated, the target URLs named in the test steps are
+fetched once and reduced to a compact outline of their interactive elements
+(forms, inputs, buttons, links, ARIA widgets) with the attributes that make
+good selectors (id, name, data-testid, placeholder, aria-label, visible text).
+The outline goes into the generation prompt so the model picks selectors that
+exist instead of guessing.
+
+Outlines are cached per URL with a TTL and pruned to a token budget
+(roughly 4 characters per token). Only the server-rendered HTML is seen; pages
+that build their UI in JavaScript yield a thinner outline.
+"""
+
+import re
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from html.parser import HTMLParser
+
+# --- Configuration ---
+OUTLINE_TTL = 900          # seconds an outline stays cached
+FAILURE_TTL = 60           # seconds a failed fetch is remembered
+FETCH_TIMEOUT = 10         # seconds
+MAX_PAGE_BYTES = 2_000_000
+MAX_OUTLINE_TOKENS = 800   # per prompt, across all URLs
+MAX_URLS = 3
+MAX_CACHE_ENTRIES = 128
+CHARS_PER_TOKEN = 4
+USER_AGENT = "Mozilla/5.0 (compatible; PlaywrightTestGenerator/1.0)"
+
+# Explicit URLs and bare hosts ("google.com", "www.example.com/login"), as in script_index
+_URL_RE = re.compile(r"https?://[^\s'\"<>)\]]+"
+                     r"|(?<![@\w./-])(?:www\.)?(?:[a-z0-9-]+\.)+[a-z]{2,}(?::\d+)?(?:/[^\s'\"<>)\]]*)?",
+                     re.IGNORECASE)
+_FILE_RE = re.compile(r"\.(?:png|jpe?g|gif|svg|txt|csv|json|xlsx?|pdf|py|js|ts|html?|zip)$", re.IGNORECASE)
+_WIDGET_ROLES = {"button", "link", "tab", "menuitem", "checkbox", "radio", "switch", "combobox", "textbox", "searchbox", "option"}
+_SELECTOR_ATTRS = ("id", "name", "data-testid", "data-test", "data-qa", "type", "placeholder", "aria-label",
+                   "role", "title", "alt", "value", "for", "action", "method")
+# Lower rank = kept first when the budget is tight
+_RANK = {"form": 0, "input": 1, "textarea": 1, "select": 1, "button": 2, "label": 3, "role": 3, "a": 4}
+
+
+def extract_urls(text: str) -> list:
+    """URLs mentioned in test steps, in order, without duplicates (bare hosts get https://)"""
+    urls = []
+    for url in _URL_RE.findall(text or ""):
+        url = url.rstrip(".,;:")
+        if not re.match(r"https?://", url, re.IGNORECASE):
+            if "/" not in url and _FILE_RE.search(url):
+                continue  # "save step_1.png" names a file, not a host
+            url = "https://" + url
+        if url not in urls:
+            urls.append(url)
+    return urls
+
+
+class _OutlineParser(HTMLParser):
+    """Collects interactive elements and their selector-worthy attributes"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self.elements = []
+        self._open = []        # elements still collecting their visible text
+        self._skip = 0         # inside <script>/<style>/<noscript>/<svg>
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {k: (v or "") for k, v in attrs}
+        if tag in ("script", "style", "noscript", "svg"):
+            self._skip += 1
+            return
+        if self._skip:
+            return
+        if tag == "title":
+            self._in_title = True
+            return
+        kind = tag if tag in _RANK else ("role" if attrs.get("role") in _WIDGET_ROLES else None)
+        if kind is None or (tag == "input" and attrs.get("type") == "hidden"):
+            return
+        element = {"tag": tag, "kind": kind, "text": "",
+                   "attrs": {k: attrs[k][:60] for k in _SELECTOR_ATTRS if attrs.get(k)}}
+        if tag == "a" and attrs.get("href") and not attrs["href"].startswith("javascript:"):
+            element["attrs"]["href"] = attrs["href"][:80]
+        self.elements.append(element)
+        if tag not in ("input", "form"):
+            self._open.append(element)
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style", "noscript", "svg"):
+            self._skip = max(0, self._skip - 1)
+        elif self._skip:
+            return
+        elif tag == "title":
+            self._in_title = False
+        elif self._open and self._open[-1]["tag"] == tag:
+            self._open.pop()
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        text = " ".join(data.split())
+        if not text:
+            return
+        if self._in_title:
+            self.title = (self.title + " " + text).strip()[:100]
+        for element in self._open[-2:]:
+            if len(element["text"]) < 60:
+                element["text"] = (element["text"] + " " + text).strip()[:60]
+
+
+def _format_element(element: dict) -> str:
+    attrs = " ".join(f'{k}="{v}"' for k, v in element["attrs"].items())
+    text = f' "{element["text"]}"' if element["text"] else ""
+    return f"- <{element['tag']}{' ' + attrs if attrs else ''}>{text}"
+
+
+def _outline_lines(html: str, url: str) -> tuple:
+    """Header and ranked, de-duplicated element lines for a page, before any budget"""
+    parser = _OutlineParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        pass  # keep whatever was parsed before malformed markup
+
+    lines, seen = [], set()
+    elements = [e for e in parser.elements if e["attrs"] or e["text"]]
+    # Stable sort: forms and fields first, links last, document order within each group
+    for element in sorted(elements, key=lambda e: _RANK[e["kind"]]):
+        line = _format_element(element)
+        if line not in seen:
+            seen.add(line)
+            lines.append(line)
+
+    header = f"Page: {url}" + (f' (title: "{parser.title}")' if parser.title else "")
+    return header, lines
+
+
+def _prune(header: str, lines: list, max_tokens: int) -> str:
+    budget = max_tokens * CHARS_PER_TOKEN - len(header)
+    kept, used = [], 0
+    for line in lines:
+        if used + len(line) + 1 > budget:
+            break
+        kept.append(line)
+        used += len(line) + 1
+    if len(kept) < len(lines):
+        kept.append(f"- ... {len(lines) - len(kept)} more element(s) omitted")
+    return "\n".join([header] + kept)
+
+
+def build_outline(html: str, url: str, max_tokens: int = MAX_OUTLINE_TOKENS) -> str:
+    """Compact outline of a page's interactive elements within max_tokens"""
+    return _prune(*_outline_lines(html, url), max_tokens)
+
+
+def fetch_html(url: str) -> str:
+    request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT, "Accept": "text/html"})
+    with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT) as response:
+        charset = response.headers.get_content_charset() or "utf-8"
+        return response.read(MAX_PAGE_BYTES).decode(charset, "replace")
+
+
+class PageOutlineCache:
+    """Per-URL outline cache with TTL and LRU eviction; concurrent requests for a URL fetch once
+
+    The full outline is cached and pruned to the caller's token budget on every read,
+    so one fetch serves any budget
+    """
+
+    def __init__(self, ttl: float = OUTLINE_TTL, max_entries: int = MAX_CACHE_ENTRIES, fetch=fetch_html):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.fetch = fetch
+        self._entries = OrderedDict()  # url -> (expires_at, (header, lines) or None)
+        self._url_locks = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "fetches": 0, "failures": 0}
+
+    def _cached(self, url: str):
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(url)
+                self.stats["hits"] += 1
+                return True, entry[1]
+            return False, None
+
+    def get(self, url: str, max_tokens: int = MAX_OUTLINE_TOKENS) -> str:
+        """Outline for url within max_tokens (None when the page could not be fetched)"""
+        hit, outline = self._cached(url)
+        if not hit:
+            outline = self._load(url)
+        return _prune(*outline, max_tokens) if outline else None
+
+    def _load(self, url: str):
+        with self._lock:
+            url_lock = self._url_locks.setdefault(url, threading.Lock())
+        with url_lock:
+            hit, outline = self._cached(url)
+            if hit:
+                return outline
+            try:
+                outline = _outline_lines(self.fetch(url), url)
+                ttl = self.ttl
+                self.stats["fetches"] += 1
+            except Exception:
+                outline, ttl = None, FAILURE_TTL
+                self.stats["failures"] += 1
+            with self._lock:
+                self._entries[url] = (time.monotonic() + ttl, outline)
+                self._entries.move_to_end(url)
+                while len(self._entries) > self.max_entries:
+                    evicted, _ = self._entries.popitem(last=False)
+                    self._url_locks.pop(evicted, None)
+        return outline
+
+    def outline_for_steps(self, test_steps: str, max_tokens: int = MAX_OUTLINE_TOKENS) -> str:
+        """Outlines of up to MAX_URLS pages named in the steps, sharing one token budget"""
+        urls = extract_urls(test_steps)[:MAX_URLS]
+        if not urls:
+            return ""
+        per_url = max(100, max_tokens // len(urls))
+        outlines = [self.get(url, per_url) for url in urls]
+        return "\n\n".join(o for o in outlines if o)
+
+
+_cache = PageOutlineCache()
+
+
+def get_cache() -> PageOutlineCache:
+    return _cache
+
+
+def build_outline_section(test_steps: str, max_tokens: int = MAX_OUTLINE_TOKENS) -> str:
+    """Prompt section with page outlines for the steps ("" when no URL could be outlined)"""
+    outline = _cache.outline_for_steps(test_steps, max_tokens)
+    if not outline:
+        return ""
+    return f"""
+Interactive elements found on the target page(s) (prefer selectors built from these
+ids, names, test ids, labels and texts; they were read from the live page):
+
+{outline}
+"""
@@ -0,0 +1,234 @@
+"""
+Data-driven runs: generate a script once, execute it over many data rows.
+
+parameterize() walks the script's AST and lifts the literal values typed,
+selected, navigated to or asserted (fill/type/press_sequentially/select_option,
+goto, expect(...).to_have_text/value/url/...) into named parameters:
+    page.fill("input[name='username']", "testuser")
+becomes
+    page.fill("input[name='username']", PARAMS["username"])
+with a PARAMS block after the imports that holds the original values as
+defaults and overlays test_params.json from the working directory. Selectors
+and screenshot paths are left alone.
+
+run_data_table() runs the parameterized script once per row, in parallel, each
+row in its own run directory with its own test_params.json, and returns
+per-row results. The script is not regenerated per row.
+"""
+
+import ast
+import csv
+import io
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from script_runner import DEFAULT_TIMEOUT, apply_browser_options, new_run_dir, run_script
+
+# --- Configuration ---
+PARAMS_FILE = "test_params.json"
+MAX_ROW_WORKERS = 4
+MAX_ROWS = 1000
+
+# method -> index of the value argument (-1: last positional argument)
+VALUE_METHODS = {"fill": -1, "type": -1, "press_sequentially": -1, "select_option": -1, "set_input_files": -1,
+                 "goto": 0}
+ASSERTION_METHODS = {"to_have_text", "to_contain_text", "to_have_value", "to_have_url", "to_have_title",
+                     "to_have_attribute"}
+PAGE_RECEIVERS = {"page", "frame"}
+
+_PARAMS_BLOCK = '''
+# --- Test parameters (defaults; a {params_file} in the working directory overrides them) ---
+import json as _json
+import os as _os
+PARAMS = {defaults}
+if _os.path.exists("{params_file}"):
+    with open("{params_file}", "r", encoding="utf-8") as _f:
+        PARAMS.update(_json.load(_f))
+'''
+
+
+def _slug(text: str) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")
+    return slug[:30] if slug and not slug[0].isdigit() else f"value_{slug}"[:30]
+
+
+def _selector_name(selector: str) -> str:
+    """Best parameter name for a selector: name/id/placeholder/test id/label text"""
+    for pattern in (r"""name\s*=\s*['"]?([\w-]+)""", r"""data-test(?:id)?\s*=\s*['"]?([\w-]+)""",
+                    r"#([\w-]+)", r"""placeholder\s*=\s*['"]?([^'"\]]+)""",
+                    r"""aria-label\s*=\s*['"]?([^'"\]]+)""", r"""(?:text|label)\s*=\s*['"]?([^'"\]]+)"""):
+        match = re.search(pattern, selector, re.IGNORECASE)
+        if match:
+            return _slug(match.group(1))
+    return ""
+
+
+def _receiver_name(node) -> str:
+    """Parameter name from the page.locator("...")/page.get_by_*("...") chain a value method is called on"""
+    receiver = node.func.value
+    while isinstance(receiver, ast.Call) and isinstance(receiver.func, ast.Attribute):
+        if receiver.args and isinstance(receiver.args[0], ast.Constant) and isinstance(receiver.args[0].value, str):
+            text = receiver.args[0].value
+            # get_by_label("Email") / get_by_placeholder("Search") name the field directly
+            return _slug(text) if receiver.func.attr.startswith("get_by_") else _selector_name(text)
+        receiver = receiver.func.value
+    return ""
+
+
+def _is_page_call(node) -> bool:
+    receiver = node.func.value
+    return isinstance(receiver, ast.Name) and receiver.id in PAGE_RECEIVERS
+
+
+def find_literals(script_code: str) -> list:
+    """[{name_hint, value, kind, node}] for every parameterizable string literal"""
+    tree = ast.parse(script_code)
+    found = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Attribute):
+            continue
+        method = node.func.attr
+        strings = [a for a in node.args if isinstance(a, ast.Constant) and isinstance(a.value, str)]
+        if method in VALUE_METHODS and strings:
+            if method == "goto":
+                target, hint, kind = node.args[0], "url", "url"
+            else:
+                # page.fill(selector, value) vs locator.fill(value)
+                target = node.args[-1]
+                if _is_page_call(node) and len(node.args) > 1 and isinstance(node.args[0], ast.Constant):
+                    hint = _selector_name(str(node.args[0].value))
+                else:
+                    hint = _receiver_name(node)
+                hint, kind = hint or "value", "input"
+        elif method in ASSERTION_METHODS and strings:
+            target = node.args[-1]
+            hint = {"to_have_url": "expected_url", "to_have_title": "expected_title"}.get(method, "expected_text")
+            kind = "expected"
+        else:
+            continue
+        if isinstance(target, ast.Constant) and isinstance(target.value, str) and target.value:
+            found.append({"name_hint": hint, "value": target.value, "kind": kind, "node": target})
+    found.sort(key=lambda f: (f["node"].lineno, f["node"].col_offset))
+    return found
+
+
+def parameterize(script_code: str) -> dict:
+    """{"script", "parameters": [{name, default, kind, lines}]}; the script reads PARAMS instead of literals
+
+    One parameter per field: literals are merged only when they share a name hint
+    and a value (the same field filled twice), never because two fields happen to
+    hold the same value (username and password both "admin").
+    """
+    literals = find_literals(script_code)
+    by_field, parameters = {}, []
+    for literal in literals:
+        key = (literal["name_hint"], literal["value"])
+        param = by_field.get(key)
+        if param is None:
+            name, suffix = literal["name_hint"], 2
+            while any(p["name"] == name for p in parameters):
+                name, suffix = f"{literal['name_hint']}_{suffix}", suffix + 1
+            param = {"name": name, "default": literal["value"], "kind": literal["kind"], "lines": []}
+            by_field[key] = param
+            parameters.append(param)
+        param["lines"].append(literal["node"].lineno)
+        literal["param"] = param["name"]
+
+    lines = script_code.splitlines(keepends=True)
+    # Replace from the end so earlier offsets stay valid (literals of interest are single-line)
+    for literal in sorted(literals, key=lambda f: (f["node"].lineno, f["node"].col_offset), reverse=True):
+        node = literal["node"]
+        if node.lineno != node.end_lineno:
+            continue
+        line = lines[node.lineno - 1].encode("utf-8")
+        line = line[:node.col_offset] + f'PARAMS["{literal["param"]}"]'.encode("utf-8") + line[node.end_col_offset:]
+        lines[node.lineno - 1] = line.decode("utf-8")
+
+    if not parameters:
+        return {"script": script_code, "parameters": []}
+
+    tree = ast.parse(script_code)
+    insert_at = 0
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)) or \
+                (isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant)):
+            insert_at = node.end_lineno
+        else:
+            break
+    defaults = json.dumps({p["name"]: p["default"] for p in parameters}, indent=4, ensure_ascii=False)
+    block = _PARAMS_BLOCK.format(defaults=defaults, params_file=PARAMS_FILE)
+    script = "".join(lines[:insert_at]) + block + "".join(lines[insert_at:])
+    return {"script": script, "parameters": parameters}
+
+
+def parameters_to_csv(parameters: list) -> str:
+    """Starter data table: header of parameter names and one row of the original values"""
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows([[p["name"] for p in parameters],
+                                                       [p["default"] for p in parameters]])
+    return buffer.getvalue()
+
+
+def parse_data_table(text: str) -> list:
+    """Rows from CSV text (header = parameter names) or a JSON list of objects"""
+    text = (text or "").strip()
+    if not text:
+        return []
+    if text.startswith("["):
+        rows = json.loads(text)
+    else:
+        rows = list(csv.DictReader(io.StringIO(text)))
+    rows = [{str(k).strip(): ("" if v is None else str(v)) for k, v in row.items() if k} for row in rows]
+    if len(rows) > MAX_ROWS:
+        raise ValueError(f"Data table has {len(rows)} rows; the limit is {MAX_ROWS}")
+    return rows
+
+
+def run_data_table(script_code: str, rows: list, parameters: list = None, browser_type: str = None,
+                   headless: bool = True, timeout: float = DEFAULT_TIMEOUT, options: dict = None,
+                   executor: str = "subprocess", max_workers: int = MAX_ROW_WORKERS) -> dict:
+    """Run a parameterized script once per row in parallel; each row gets its own run directory"""
+    if browser_type is not None:
+        script_code = apply_browser_options(script_code, browser_type, headless)
+    known = {p["name"] for p in parameters or []}
+    table_dir = new_run_dir("data")
+
+    def run_row(indexed):
+        index, row = indexed
+        row_dir = os.path.join(table_dir, f"row_{index:04d}")
+        os.makedirs(row_dir, exist_ok=True)
+        with open(os.path.join(row_dir, PARAMS_FILE), "w", encoding="utf-8") as f:
+            json.dump(row, f, ensure_ascii=False)
+        result = run_script(script_code, run_dir=row_dir, timeout=timeout, options=options, executor=executor)
+        result.update(row=index, params=row, run_dir=row_dir)
+        return result
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        results = list(pool.map(run_row, enumerate(rows, start=1)))
+    return {
+        "run_dir": table_dir,
+        "rows": results,
+        "total": len(results),
+        "passed": sum(1 for r in results if r["status"] == "success"),
+        "failed": sum(1 for r in results if r["status"] != "success"),
+        "unknown_columns": sorted({k for row in rows for k in row} - known) if known else [],
+        "wall_time": time.perf_counter() - started,
+        "sequential_time": sum(r["duration"] for r in results)
+    }
+
+
+def format_data_run(run: dict) -> str:
+    """Small per-row text table of a data-driven run"""
+    lines = [f"{'Row':>4} {'Status':<8} {'Time (s)':>9}  Params"]
+    for result in run["rows"]:
+        params = ", ".join(f"{k}={v}" for k, v in result["params"].items())
+        lines.append(f"{result['row']:>4} {result['status'].upper():<8} {result['duration']:>9.1f}  {params[:80]}")
+    lines.append(f"{run['passed']}/{run['total']} rows passed. Wall time: {run['wall_time']:.1f}s "
+                 f"(sequential would be {run['sequential_time']:.1f}s)")
+    if run["unknown_columns"]:
+        lines.append(f"Ignored columns (not parameters of the script): {', '.join(run['unknown_columns'])}")
+    return "\n".join(lines)
@@ -0,0 +1,246 @@
+"""
+@playwright/test output mode.
+
+Instead of standalone Python scripts, generated tests are written as TypeScript
+specs into the testDir configured in playwright.config.ts (under a generated/
+folder) and executed by the Node test runner:
+    npx playwright test <specs> --reporter=json [--project=...] [--shard=i/n] [--workers=n]
+The runner's worker pool (fullyParallel in the config) and sharding schedule the
+suite; shards run as concurrent runner processes and their JSON reports are
+merged. The JSON results are converted into execution history entries.
+"""
+
+import json
+import os
+import re
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from script_runner import DEFAULT_TIMEOUT, kill_process_tree, new_run_dir
+from test_case_pipeline import case_to_steps
+
+# --- Configuration ---
+PLAYWRIGHT_CONFIG = "playwright.config.ts"
+DEFAULT_TEST_DIR = "./tests"
+GENERATED_SUBDIR = "generated"
+OUTPUT_MODES = ["python_script", "playwright_spec"]
+SPEC_RUN_TIMEOUT = 1800  # seconds for a whole runner invocation
+REPORT_FILE = "report.json"
+
+_TEST_DIR_RE = re.compile(r"""testDir\s*:\s*['"]([^'"]+)['"]""")
+_STATUS = {"passed": "success", "timedOut": "timeout", "skipped": "skipped"}
+
+
+def read_test_dir(config_path: str = PLAYWRIGHT_CONFIG) -> str:
+    """testDir from playwright.config.ts, resolved relative to the config file"""
+    test_dir = DEFAULT_TEST_DIR
+    if os.path.exists(config_path):
+        with open(config_path, "r", encoding="utf-8") as f:
+            match = _TEST_DIR_RE.search(f.read())
+        if match:
+            test_dir = match.group(1)
+    return os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(config_path)), test_dir))
+
+
+def build_spec_prompt(test_steps: str, test_name: str, outline: str = "") -> str:
+    test_name = test_name.replace("'", "").replace("\\", "")
+    return f"""
+You are an assistant that converts natural language test instructions into a Playwright Test spec in TypeScript.
+Write one spec file for the following test steps:
+
+{test_steps}
+{outline}
+The spec must:
+- Start with: import {{ test, expect }} from '@playwright/test';
+- Define this helper and call it after every step as await snap(page, 'step_1'), 'step_2', ...:
+  async function snap(page, name: string) {{
+    const path = test.info().outputPath(`${{name}}.png`);
+    await page.screenshot({{ path }});
+    await test.info().attach(name, {{ path, contentType: 'image/png' }});
+  }}
+- Contain a single test named '{test_name}' using the {{ page }} fixture
+- Wrap each step in await test.step('<step description>', async () => {{ ... }})
+- Use web-first assertions (expect(...).toBeVisible(), toHaveURL, ...) to verify expected results
+- Not launch or close browsers itself (the runner provides the page and the browser projects)
+
+Only output the TypeScript code, nothing else.
+"""
+
+
+def clean_spec(code: str) -> str:
+    code = code.strip()
+    code = re.sub(r"^```[a-zA-Z]*\s*", "", code)
+    return re.sub(r"\s*```$", "", code).strip() + "\n"
+
+
+def spec_filename(name: str, index: int = None) -> str:
+    """File name for a spec; index keeps same-named cases of one batch apart"""
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", name).strip("-").lower()[:60] or "generated-test"
+    return f"{index:03d}-{slug}.spec.ts" if index is not None else f"{slug}.spec.ts"
+
+
+def write_spec(code: str, name: str, test_dir: str = None, index: int = None) -> str:
+    """Write a spec into <testDir>/generated/ and return its path"""
+    spec_dir = os.path.join(test_dir or read_test_dir(), GENERATED_SUBDIR)
+    os.makedirs(spec_dir, exist_ok=True)
+    path = os.path.join(spec_dir, spec_filename(name, index))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(clean_spec(code))
+    return path
+
+
+def generate_specs(cases: list, generate_spec, max_workers: int = 4, test_dir: str = None) -> list:
+    """Generate and write one spec per structured test case in parallel; returns the cases with spec_path"""
+
+    def generate(indexed):
+        index, case = indexed
+        record = dict(case)
+        name = f"{case['id']} {case['name']}" if case.get("id") else case["name"]
+        try:
+            record["spec_path"] = write_spec(generate_spec(case_to_steps(case), name), name, test_dir, index)
+        except Exception as e:
+            record.update(status="error", output=f"Spec generation failed: {e}", screenshots=[])
+        return record
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(generate, enumerate(cases, start=1)))
+
+
+def npx_command() -> str:
+    npx = shutil.which("npx") or shutil.which("npx.cmd")
+    if npx is None:
+        raise RuntimeError("npx not found: install Node.js and run `npm install` to use the Playwright Test runner")
+    return npx
+
+
+def _run_shard(command: list, report_path: str, timeout: float, cwd: str) -> dict:
+    env = dict(os.environ, PLAYWRIGHT_JSON_OUTPUT_NAME=os.path.abspath(report_path))
+    group = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP} if os.name == "nt" else {"start_new_session": True}
+    proc = subprocess.Popen(command, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                            **group)
+    timed_out = False
+    try:
+        stdout, stderr = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        kill_process_tree(proc.pid)
+        stdout, stderr = proc.communicate()
+    report = None
+    if os.path.exists(report_path):
+        try:
+            with open(report_path, "r", encoding="utf-8") as f:
+                report = json.load(f)
+        except ValueError:
+            report = None
+    return {"return_code": proc.returncode, "output": stdout + "\n" + stderr, "report": report, "timed_out": timed_out}
+
+
+def run_specs(spec_paths: list = None, projects: list = None, shards: int = 1, workers: int = None,
+              headed: bool = False, test_timeout: float = DEFAULT_TIMEOUT, timeout: float = SPEC_RUN_TIMEOUT) -> dict:
+    """Run specs through the Node runner (all shards concurrently) and return merged results
+
+    spec_paths=None runs the whole testDir; an empty list runs nothing (e.g. every
+    spec failed to generate), so stale specs are never picked up by accident.
+    """
+    if spec_paths is not None and not spec_paths:
+        return {"run_dir": None, "command": "", "shards": 0, "return_code": 0, "timed_out": False,
+                "output": "No specs to run", "results": [], "passed": 0, "failed": 0, "flaky": 0, "wall_time": 0.0}
+    run_dir = os.path.abspath(new_run_dir("specs"))
+    root = os.path.dirname(os.path.abspath(PLAYWRIGHT_CONFIG))
+    # CLI filters are matched as regexes against file paths: pass root-relative, forward-slash paths
+    filters = [os.path.relpath(os.path.abspath(p), root).replace(os.sep, "/") for p in spec_paths or []]
+    base = [npx_command(), "playwright", "test", *filters, "--reporter=json",
+            f"--timeout={int(test_timeout * 1000)}"]
+    for project in projects or []:
+        base.append(f"--project={project}")
+    if workers:
+        base.append(f"--workers={workers}")
+    if headed:
+        base.append("--headed")
+
+    shards = max(1, shards)
+    commands = []
+    for index in range(1, shards + 1):
+        shard_dir = os.path.join(run_dir, f"shard_{index}")
+        command = base + [f"--output={os.path.join(shard_dir, 'test-results')}"]
+        if shards > 1:
+            command.append(f"--shard={index}/{shards}")
+        commands.append((command, os.path.join(shard_dir, REPORT_FILE)))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=shards) as pool:
+        shard_results = list(pool.map(lambda c: _run_shard(c[0], c[1], timeout, root), commands))
+
+    reports = [r["report"] for r in shard_results if r["report"]]
+    results = [entry for report in reports for entry in parse_json_report(report)]
+    return {
+        "run_dir": run_dir,
+        "command": " ".join(base),
+        "shards": shards,
+        "return_code": max((r["return_code"] or 0) for r in shard_results),
+        "timed_out": any(r["timed_out"] for r in shard_results),
+        "output": "\n".join(r["output"] for r in shard_results),
+        "results": results,
+        "passed": sum(1 for r in results if r["status"] == "success"),
+        "failed": sum(1 for r in results if r["status"] not in ("success", "skipped")),
+        "flaky": sum(1 for r in results if r["flaky"]),
+        "wall_time": time.perf_counter() - started
+    }
+
+
+def _walk_specs(suite: dict, file: str = None):
+    file = suite.get("file") or file
+    for spec in suite.get("specs", []):
+        yield spec, spec.get("file") or file
+    for child in suite.get("suites", []):
+        yield from _walk_specs(child, file)
+
+
+def parse_json_report(report: dict) -> list:
+    """One result per (spec, project) from a Playwright JSON report"""
+    results = []
+    for suite in report.get("suites", []):
+        for spec, file in _walk_specs(suite):
+            for test in spec.get("tests", []):
+                attempts = test.get("results", [])
+                final = attempts[-1] if attempts else {}
+                output = []
+                for attempt in attempts:
+                    output += [chunk.get("text", "") for chunk in attempt.get("stdout", []) + attempt.get("stderr", [])]
+                    output += [error.get("message", "") for error in attempt.get("errors", [])]
+                screenshots = [
+                    a["path"] for a in final.get("attachments", [])
+                    if a.get("path") and a.get("contentType", "").startswith("image/")
+                ]
+                results.append({
+                    "name": spec.get("title"),
+                    "file": file,
+                    "project": test.get("projectName"),
+                    "status": _STATUS.get(final.get("status"), "error"),
+                    "flaky": test.get("status") == "flaky",
+                    "attempts": len(attempts),
+                    "duration": sum(a.get("duration", 0) for a in attempts) / 1000,
+                    "output": "\n".join(o for o in output if o),
+                    "screenshots": screenshots
+                })
+    return results
+
+
+def results_to_history(run: dict) -> list:
+    """Execution history entries for the results of run_specs"""
+    return [
+        {
+            "timestamp": datetime.now().isoformat(),
+            "status": result["status"],
+            "output": result["output"],
+            "screenshots": result["screenshots"],
+            "browser": result["project"],
+            "duration": result["duration"],
+            "case": result["name"],
+            "runner": "playwright_test"
+        }
+        for result in run["results"]
+    ]
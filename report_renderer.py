@@ -0,0 +1,311 @@
+"""
+Report rendering: HTML from precompiled templates, PDF through a pooled headless browser.
+
+- Templates are string.Template objects compiled once at import.
+- Static assets are cached: the logo data URI is built once per (path, mtime),
+  and screenshot thumbnails once per (path, mtime, width). They are embedded
+  as data URIs, so a report is a single self-contained file.
+- PdfRenderer keeps one headless Chromium and a pool of pages on a dedicated
+  event-loop thread. Each report is page.set_content() + page.pdf() on a free
+  page, with no browser launch per report. Batches are rendered concurrently
+  across the pool. A page that crashed or was closed is replaced instead of
+  going back to the pool, and Chromium is relaunched if it disconnected.
+
+Thumbnails need pillow; without it, reports list screenshot names only.
+"""
+
+import asyncio
+import atexit
+import base64
+import html
+import io
+import mimetypes
+import os
+import threading
+import zipfile
+from concurrent.futures import Future
+from datetime import datetime
+from functools import lru_cache
+from string import Template
+
+try:
+    from PIL import Image
+except ImportError:  # thumbnails need pillow
+    Image = None
+
+# --- Configuration ---
+PDF_POOL_SIZE = 4            # pages rendering concurrently
+PDF_FORMAT = "A4"
+PDF_RENDER_TIMEOUT = 60      # seconds per report
+STARTUP_TIMEOUT = 60         # seconds to launch the browser
+THUMB_WIDTH = 240
+THUMB_QUALITY = 70
+MAX_REPORT_EXECUTIONS = 50   # executions listed in a session report
+MAX_THUMBS_PER_EXECUTION = 6
+MAX_OUTPUT_CHARS = 4000      # output tail per execution report
+
+_PAGE = Template("""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>$title</title>
+<style>
+    body { font-family: Arial, sans-serif; margin: 20px; }
+    .header { background-color: #f0f0f0; padding: 20px; text-align: center; }
+    .header img { max-width: 80px; height: 60px; display: block; margin: 0 auto 20px; }
+    .section { margin: 20px 0; page-break-inside: avoid; }
+    pre { background-color: #f5f5f5; padding: 10px; white-space: pre-wrap; word-break: break-word; }
+    table { border-collapse: collapse; width: 100%; font-size: 12px; }
+    th, td { border: 1px solid #ddd; padding: 6px; text-align: left; vertical-align: top; }
+    .success { color: #1a7f37; font-weight: bold; }
+    .error, .timeout, .resource_limit { color: #cf222e; font-weight: bold; }
+    .thumbs img { width: ${thumb_width}px; margin: 4px; border: 1px solid #ccc; }
+    .footer { text-align: center; margin-top: 40px; font-size: 12px; color: #666; }
+</style>
+</head>
+<body>
+    <div class="header">
+        $logo
+        <h1>Gemini Test Automation Suite</h1>
+        <h2>$title</h2>
+        <p>Generated: $generated</p>
+    </div>
+$sections
+    <div class="footer">
+        <p>Generated by Gemini Test Automation Suite | Powered by Google Vertex AI</p>
+    </div>
+</body>
+</html>""")
+
+_SECTION = Template("""    <div class="section">
+        <h2>$heading</h2>
+        $body
+    </div>
+""")
+
+_EXECUTION_ROW = Template("""<tr><td>$number</td><td>$timestamp</td><td class="$status">$status_label</td>"""
+                          """<td>$browser</td><td>$duration</td><td class="thumbs">$thumbs</td></tr>""")
+
+_EXECUTION_TABLE = Template("""<p>$summary</p>
+        <table>
+            <tr><th>#</th><th>Timestamp</th><th>Status</th><th>Browser</th><th>Duration</th><th>Screenshots</th></tr>
+            $rows
+        </table>""")
+
+
+@lru_cache(maxsize=8)
+def _logo_uri(path: str, mtime: float) -> str:
+    mime = mimetypes.guess_type(path)[0] or "image/svg+xml"
+    with open(path, "rb") as f:
+        return f"data:{mime};base64,{base64.b64encode(f.read()).decode()}"
+
+
+def logo_tag(path: str) -> str:
+    """<img> with the logo as a data URI, read and encoded once per file version"""
+    try:
+        return f'<img src="{_logo_uri(path, os.path.getmtime(path))}" alt="Logo">'
+    except OSError:
+        return ""
+
+
+@lru_cache(maxsize=2048)
+def _thumbnail_uri(path: str, mtime: float, width: int) -> str:
+    with Image.open(path) as image:
+        image.thumbnail((width, width * 4))
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, "JPEG", quality=THUMB_QUALITY)
+    return f"data:image/jpeg;base64,{base64.b64encode(buffer.getvalue()).decode()}"
+
+
+def thumbnail_tag(path: str, width: int = THUMB_WIDTH) -> str:
+    name = html.escape(os.path.basename(path))
+    if Image is None:
+        return name
+    try:
+        return f'<img src="{_thumbnail_uri(path, os.path.getmtime(path), width)}" alt="{name}" title="{name}">'
+    except (OSError, ValueError):
+        return name
+
+
+def _pre(text: str, empty: str) -> str:
+    return f"<pre>{html.escape(str(text)) if text else empty}</pre>"
+
+
+def _execution_rows(executions: list, start: int = 1) -> str:
+    rows = []
+    for offset, execution in enumerate(executions):
+        status = execution.get("status", "unknown")
+        duration = execution.get("duration")
+        screenshots = execution.get("screenshots", [])
+        rows.append(_EXECUTION_ROW.substitute(
+            number=execution.get("run_number") or start + offset,
+            timestamp=html.escape(str(execution.get("timestamp", ""))),
+            status=html.escape(status),
+            status_label=html.escape(status.upper()),
+            browser=html.escape(str(execution.get("browser") or "")),
+            duration=f"{duration:.1f}s" if isinstance(duration, (int, float)) else "",
+            thumbs="".join(thumbnail_tag(s) for s in screenshots[:MAX_THUMBS_PER_EXECUTION])
+        ))
+    return "\n            ".join(rows)
+
+
+def render_page(title: str, sections: list, logo_path: str = None) -> str:
+    """Full HTML document from (heading, body_html) sections"""
+    return _PAGE.substitute(
+        title=html.escape(title),
+        thumb_width=THUMB_WIDTH,
+        logo=logo_tag(logo_path) if logo_path else "",
+        generated=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        sections="".join(_SECTION.substitute(heading=html.escape(h), body=b) for h, b in sections)
+    )
+
+
+def render_session_report(session_state: dict, logo_path: str = None) -> str:
+    """HTML report of test cases, script, verification and recent executions with thumbnails"""
+    history = list(session_state.get("execution_history", []))
+    recent = history[-MAX_REPORT_EXECUTIONS:]
+    passed = sum(1 for e in history if e.get("status") == "success")
+    sections = [
+        ("Test Cases", _pre(session_state.get("test_cases", ""), "No test cases available")),
+        ("Generated Script", _pre(session_state.get("script_code", ""), "No script generated")),
+        ("Verification Results", _pre(session_state.get("verification_results", ""), "No verification results")),
+    ]
+    if history:
+        summary = f"{passed}/{len(history)} executions passed" + \
+                  (f" (latest {len(recent)} shown)" if len(recent) < len(history) else "")
+        table = _EXECUTION_TABLE.substitute(summary=summary,
+                                            rows=_execution_rows(recent, len(history) - len(recent) + 1))
+        sections.append(("Executions", table))
+    return render_page("Test Automation Report", sections, logo_path)
+
+
+def render_execution_report(execution: dict, number: int = None, logo_path: str = None) -> str:
+    """HTML report of a single execution: status, resources, output tail and screenshot thumbnails"""
+    table = _EXECUTION_TABLE.substitute(summary="", rows=_execution_rows([execution], number or 1))
+    output = execution.get("output", "")
+    if len(output) > MAX_OUTPUT_CHARS:
+        output = "... (truncated)\n" + output[-MAX_OUTPUT_CHARS:]
+    sections = [("Execution", table), ("Output", _pre(output, "No output"))]
+    if execution.get("resources"):
+        resources = execution["resources"]
+        sections.append(("Resources", _pre(
+            f"Peak RSS {resources.get('peak_rss_mb')} MB, CPU {resources.get('cpu_seconds')} s, "
+            f"{resources.get('browser_processes')} browser process(es)", "")))
+    number = execution.get("run_number") or number
+    return render_page(f"Execution {number} - {execution.get('status', 'unknown').upper()}", sections, logo_path)
+
+
+class PdfRenderer:
+    """One headless Chromium with a pool of pages, driven from its own event-loop thread"""
+
+    def __init__(self, pool_size: int = PDF_POOL_SIZE):
+        self.pool_size = pool_size
+        self._loop = asyncio.new_event_loop()
+        self._ready = Future()
+        self._stop = None
+        self.rendered = 0
+        self._thread = threading.Thread(target=self._run, name="pdf-renderer", daemon=True)
+        self._thread.start()
+        self._ready.result(timeout=STARTUP_TIMEOUT)
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._serve())
+
+    async def _serve(self):
+        from playwright.async_api import async_playwright
+
+        try:
+            async with async_playwright() as p:
+                self._playwright = p
+                self._browser = await p.chromium.launch(headless=True)
+                self._relaunch = asyncio.Lock()
+                self._pages = asyncio.Queue()
+                for _ in range(self.pool_size):
+                    self._pages.put_nowait(await self._new_page())
+                self._stop = asyncio.Event()
+                self._ready.set_result(True)
+                await self._stop.wait()
+                await self._browser.close()
+        except BaseException as e:
+            if not self._ready.done():
+                self._ready.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+
+    async def _new_page(self):
+        page = await self._browser.new_page()
+        page.on("crash", lambda crashed: crashed.close())  # a crashed page reads as closed from now on
+        return page
+
+    async def _usable(self, page):
+        """page itself while it is open, else a fresh page (relaunching Chromium if it went away)"""
+        if not page.is_closed():
+            return page
+        async with self._relaunch:
+            if not self._browser.is_connected():
+                self._browser = await self._playwright.chromium.launch(headless=True)
+        return await self._new_page()
+
+    async def _render(self, html_text: str) -> bytes:
+        page = await self._pages.get()
+        try:
+            page = await self._usable(page)
+            # Everything is inlined (data URIs), so "load" means ready to print
+            await page.set_content(html_text, wait_until="load")
+            return await page.pdf(format=PDF_FORMAT, print_background=True,
+                                  margin={"top": "12mm", "bottom": "12mm", "left": "10mm", "right": "10mm"})
+        finally:
+            try:
+                page = await self._usable(page)
+            except Exception:
+                pass  # keep the slot: the dead page is replaced on its next checkout
+            self._pages.put_nowait(page)
+
+    def render(self, html_text: str) -> bytes:
+        data = asyncio.run_coroutine_threadsafe(self._render(html_text), self._loop).result(PDF_RENDER_TIMEOUT)
+        self.rendered += 1
+        return data
+
+    def render_many(self, documents: list) -> list:
+        """PDF bytes for each HTML document, rendered concurrently across the page pool"""
+        futures = [asyncio.run_coroutine_threadsafe(self._render(d), self._loop) for d in documents]
+        results = [f.result(PDF_RENDER_TIMEOUT * max(1, len(documents) // self.pool_size)) for f in futures]
+        self.rendered += len(results)
+        return results
+
+    def close(self):
+        if self._stop is not None and self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._stop.set)
+            self._thread.join(timeout=30)
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_pdf_renderer() -> PdfRenderer:
+    """Process-wide renderer, started on first PDF export and reused afterwards"""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None or not _renderer._thread.is_alive():
+            _renderer = PdfRenderer()
+            atexit.register(_renderer.close)
+        return _renderer
+
+
+def session_pdf(session_state: dict, logo_path: str = None) -> bytes:
+    return get_pdf_renderer().render(render_session_report(session_state, logo_path))
+
+
+def batch_execution_pdfs(executions: list, logo_path: str = None) -> bytes:
+    """Zip with one PDF report per execution"""
+    executions = list(executions)
+    documents = [render_execution_report(e, i, logo_path) for i, e in enumerate(executions, start=1)]
+    pdfs = get_pdf_renderer().render_many(documents)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for i, (execution, pdf) in enumerate(zip(executions, pdfs), start=1):
+            number = execution.get("run_number") or i
+            archive.writestr(f"execution_{number:05d}_{execution.get('status', 'unknown')}.pdf", pdf)
+    return buffer.getvalue()
@@ -0,0 +1,188 @@
+"""
+Per-run resource accounting and limits.
+
+ResourceMonitor samples the process tree of a run (the script, the Playwright
+driver and the browsers it launched) and tracks:
+- peak RSS: largest sum of resident memory over the tree (shared pages count once per process)
+- CPU seconds: user + system time of every process seen in the tree
+- browser processes: largest number of browser processes alive at once
+
+Optional hard limits (max_rss_mb, max_cpu_seconds, max_browser_processes) make
+sample() report a violation so the runner can kill the tree.
+
+Uses psutil when installed; otherwise reads /proc (Linux). Elsewhere accounting
+is unavailable and runs report no resource usage.
+"""
+
+import os
+import threading
+
+try:
+    import psutil
+except ImportError:  # fall back to /proc on Linux
+    psutil = None
+
+# --- Configuration ---
+SAMPLE_INTERVAL = 0.5  # seconds
+BROWSER_PROCESS_MARKERS = ("chrome", "chromium", "headless_shell", "firefox", "webkit", "minibrowser")
+LIMIT_KEYS = ("max_rss_mb", "max_cpu_seconds", "max_browser_processes")
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def is_supported() -> bool:
+    return psutil is not None or os.path.isdir("/proc/self")
+
+
+def _proc_table() -> dict:
+    """pid -> (ppid, name, cpu_seconds, rss_bytes) from /proc"""
+    table = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        name = stat[stat.index("(") + 1:stat.rindex(")")]
+        fields = stat[stat.rindex(")") + 2:].split()
+        # fields[0] is state (stat field 3): ppid=4, utime=14, stime=15, rss=24
+        table[int(entry)] = (
+            int(fields[1]), name,
+            (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS,
+            int(fields[21]) * _PAGE_SIZE
+        )
+    return table
+
+
+def _tree_proc(root: int) -> list:
+    table = _proc_table()
+    children = {}
+    for pid, (ppid, *_rest) in table.items():
+        children.setdefault(ppid, []).append(pid)
+    tree, stack = [], [root]
+    while stack:
+        pid = stack.pop()
+        if pid in table:
+            tree.append((pid,) + table[pid][1:])
+            stack.extend(children.get(pid, []))
+    return tree
+
+
+def _tree_psutil(root: int) -> list:
+    try:
+        parent = psutil.Process(root)
+        procs = [parent] + parent.children(recursive=True)
+    except psutil.Error:
+        return []
+    tree = []
+    for proc in procs:
+        try:
+            with proc.oneshot():
+                cpu = proc.cpu_times()
+                tree.append((proc.pid, proc.name(), cpu.user + cpu.system, proc.memory_info().rss))
+        except psutil.Error:
+            continue
+    return tree
+
+
+def process_tree(root: int) -> list:
+    """[(pid, name, cpu_seconds, rss_bytes)] for root and all its descendants"""
+    if psutil is not None:
+        return _tree_psutil(root)
+    return _tree_proc(root) if is_supported() else []
+
+
+def _is_browser(name: str) -> bool:
+    name = name.lower()
+    return any(marker in name for marker in BROWSER_PROCESS_MARKERS)
+
+
+class ResourceMonitor:
+    """Accumulates usage of one run's process tree across samples"""
+
+    def __init__(self, root_pid: int, limits: dict = None):
+        self.root_pid = root_pid
+        self.limits = {k: v for k, v in (limits or {}).items() if k in LIMIT_KEYS and v}
+        self._cpu = {}
+        self.peak_rss = 0
+        self.peak_browsers = 0
+        self.peak_processes = 0
+        self.samples = 0
+
+    def sample(self) -> str:
+        """Take one sample; returns a description of the violated limit, or None"""
+        tree = process_tree(self.root_pid)
+        if not tree:
+            return None
+        self.samples += 1
+        for pid, _name, cpu, _rss in tree:
+            self._cpu[pid] = max(cpu, self._cpu.get(pid, 0.0))
+        self.peak_rss = max(self.peak_rss, sum(rss for *_rest, rss in tree))
+        self.peak_browsers = max(self.peak_browsers, sum(1 for _pid, name, *_rest in tree if _is_browser(name)))
+        self.peak_processes = max(self.peak_processes, len(tree))
+        return self._violation()
+
+    def _violation(self) -> str:
+        usage = self._usage()
+        if self.limits.get("max_rss_mb") and usage["peak_rss_mb"] > self.limits["max_rss_mb"]:
+            return f"memory limit exceeded: {usage['peak_rss_mb']:.0f} MB RSS > {self.limits['max_rss_mb']} MB"
+        if self.limits.get("max_cpu_seconds") and usage["cpu_seconds"] > self.limits["max_cpu_seconds"]:
+            return f"CPU limit exceeded: {usage['cpu_seconds']:.1f} s > {self.limits['max_cpu_seconds']} s"
+        if self.limits.get("max_browser_processes") and usage["browser_processes"] > self.limits["max_browser_processes"]:
+            return (f"browser process limit exceeded: {usage['browser_processes']} > "
+                    f"{self.limits['max_browser_processes']}")
+        return None
+
+    def usage(self) -> dict:
+        """Accumulated usage; None when the run ended before the first sample (nothing was measured)"""
+        return self._usage() if self.samples else None
+
+    def _usage(self) -> dict:
+        return {
+            "peak_rss_mb": round(self.peak_rss / (1024 * 1024), 1),
+            "cpu_seconds": round(sum(self._cpu.values()), 2),
+            "browser_processes": self.peak_browsers,
+            "processes": self.peak_processes,
+            "samples": self.samples
+        }
+
+
+class UsageTotals:
+    """Process-wide aggregate of run usage, served by the metrics endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.data = {"runs": 0, "limit_kills": 0, "cpu_seconds_total": 0.0, "peak_rss_mb_max": 0.0,
+                     "peak_rss_mb_sum": 0.0, "browser_processes_max": 0}
+
+    def record(self, usage: dict, limit_killed: bool = False):
+        if not usage or not usage.get("samples"):
+            return  # unmeasured runs would drag the averages towards zero
+        with self._lock:
+            self.data["runs"] += 1
+            self.data["limit_kills"] += int(limit_killed)
+            self.data["cpu_seconds_total"] += usage["cpu_seconds"]
+            self.data["peak_rss_mb_max"] = max(self.data["peak_rss_mb_max"], usage["peak_rss_mb"])
+            self.data["peak_rss_mb_sum"] += usage["peak_rss_mb"]
+            self.data["browser_processes_max"] = max(self.data["browser_processes_max"], usage["browser_processes"])
+
+    def summary(self) -> dict:
+        with self._lock:
+            data = dict(self.data)
+        rss_sum = data.pop("peak_rss_mb_sum")
+        runs = data["runs"] or 1
+        data["peak_rss_mb_avg"] = round(rss_sum / runs, 1)
+        data["cpu_seconds_avg"] = round(data["cpu_seconds_total"] / runs, 2)
+        data["cpu_seconds_total"] = round(data["cpu_seconds_total"], 2)
+        return data
+
+
+totals = UsageTotals()
+
+
+def format_usage(usage: dict) -> str:
+    return (f"Peak RSS {usage['peak_rss_mb']:.0f} MB | CPU {usage['cpu_seconds']:.1f} s | "
+            f"{usage['browser_processes']} browser process(es)")
@@ -0,0 +1,61 @@
+"""
+Bootstrap for generated scripts.
+
+script_runner starts ``python run_bootstrap.py <script>`` instead of the script
+itself when run options are set. The options arrive as JSON in the
+PW_RUN_OPTIONS environment variable; the matching Playwright hooks are installed
+before the generated script runs unchanged as __main__.
+"""
+
+import json
+import os
+import runpy
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+OPTIONS_ENV = "PW_RUN_OPTIONS"
+
+
+def install_hooks(options: dict):
+    """Install the Playwright patches requested by options"""
+    if options.get("capture_mode") == "on_change":
+        import change_capture
+        change_capture.install()
+    elif options.get("capture_mode") in ("trace", "video"):
+        import trace_capture
+        trace_capture.install(options["capture_mode"], options.get("screenshot_sample", 0))
+    if options.get("network_profile"):
+        import network_profiles
+        network_profiles.install(options["network_profile"])
+    if options.get("step_timeout"):
+        import step_watchdog
+        step_watchdog.install(options["step_timeout"])
+
+
+def finalize_hooks(options: dict):
+    """Flush per-run data written by the hooks (runs even if the script fails)"""
+    if options.get("capture_mode") in ("trace", "video"):
+        import trace_capture
+        trace_capture.finalize()
+    if options.get("network_profile"):
+        import network_profiles
+        network_profiles.finalize()
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python run_bootstrap.py <script.py>")
+        sys.exit(2)
+    options = json.loads(os.environ.get(OPTIONS_ENV, "{}"))
+    install_hooks(options)
+    script = sys.argv[1]
+    sys.argv = sys.argv[1:]
+    try:
+        runpy.run_path(script, run_name="__main__")
+    finally:
+        finalize_hooks(options)
+
+
+if __name__ == "__main__":
+    main()
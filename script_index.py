@@ -0,0 +1,295 @@
+"""
+Local similarity index of passed (test steps -> script) pairs.
+
+Every Python script that passes is recorded with the steps it was generated
+from. Before generating, the steps are looked up: wording is normalised
+("Go to", "Navigate to", "Visit" -> "open"; URLs lose scheme, "www." and
+trailing slashes) and values (URLs, quoted strings, "field: value" tails) are
+lifted out, leaving a skeleton. Skeletons are compared by character-trigram
+Jaccard similarity through an inverted index, so lookups touch only entries
+that share trigrams.
+
+Similarity only shortlists candidates. A candidate at or above MATCH_THRESHOLD
+is reused only when it describes the same flow: the same number of steps and,
+step by step, the same normalised verb and target (identical skeleton lines),
+so "results are displayed" vs "results are not displayed", a dropped or extra
+step, or "images button" vs "search button" never match. Only values may
+differ: the script is reused directly when they are the same, or adapted when
+every old value can be found in a string literal of the stored script. URLs
+are adapted only within the same host, since selectors rarely carry over
+between sites. Near matches of a different flow are offered by suggest() for
+review and are never used automatically; anything else falls back to the model.
+Entries persist in script_index.jsonl.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+from script_runner import apply_browser_options
+
+# --- Configuration ---
+INDEX_FILE = "script_index.jsonl"
+MATCH_THRESHOLD = 0.8
+SUGGEST_THRESHOLD = 0.6  # near matches of a different flow shown as suggestions
+NGRAM = 3
+MAX_ENTRIES = 5000
+
+_VERBS = [
+    (r"\b(?:go to|goto|navigate to|browse to|visit|load|launch|open up|open)\b", "open"),
+    (r"\b(?:click on|click|press|tap on|tap|hit|select)\b", "click"),
+    (r"\b(?:type in|type|enter|input|fill in|fill|write)\b", "fill"),
+    (r"\b(?:verify that|verify|check that|check|assert that|assert|ensure that|ensure|confirm that|confirm|"
+     r"make sure|validate)\b", "verify"),
+    (r"\b(?:wait for|wait until|wait)\b", "wait"),
+    (r"\b(?:take a screenshot|take screenshot|capture screenshot|screenshot)\b", "screenshot"),
+]
+_FILLER = re.compile(r"\b(?:the|a|an|please|then|and|on|in|into|to|of|page|button|field|link|website|site)\b")
+_URL_RE = re.compile(r"\b(?:https?://)?(?:www\.)?(?:[a-z0-9-]+\.)+[a-z]{2,}(?::\d+)?(?:/[^\s'\"]*)?", re.IGNORECASE)
+_QUOTED_RE = re.compile(r"'([^']*)'|\"([^\"]*)\"")
+_TAIL_RE = re.compile(r":\s*(\S.*)$")
+_STRING_LITERAL_RE = re.compile(r"(['\"])((?:\\.|(?!\1).)*)\1")
+_SCRIPT_URL_RE = re.compile(r"https?://[^\s'\"]+|(?<=['\"])(?:www\.)?(?:[a-z0-9-]+\.)+[a-z]{2,}[^\s'\"]*", re.IGNORECASE)
+
+
+def normalize_url(url: str) -> str:
+    url = re.sub(r"^https?://", "", url.strip(), flags=re.IGNORECASE)
+    url = re.sub(r"^www\.", "", url, flags=re.IGNORECASE)
+    return url.rstrip("/").lower()
+
+
+def url_host(url: str) -> str:
+    return re.split(r"[/:?#]", normalize_url(url), maxsplit=1)[0]
+
+
+def parse_steps(steps: str) -> tuple:
+    """(skeleton, values): normalised step text with values replaced by <v>, and the values in order"""
+    skeleton, values = [], []
+    for line in (steps or "").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        line = re.sub(r"^(?:step\s*)?\d+[.):]\s*", "", line, flags=re.IGNORECASE)
+
+        def quoted(match):
+            values.append(("text", match.group(1) if match.group(1) is not None else match.group(2)))
+            return " <v> "
+
+        line = _QUOTED_RE.sub(quoted, line)
+
+        def url(match):
+            values.append(("url", match.group(0).rstrip(".,;")))
+            return " <v> "
+
+        line = _URL_RE.sub(url, line)
+        tail = _TAIL_RE.search(line)
+        if tail and "<v>" not in tail.group(1):
+            values.append(("text", tail.group(1).strip()))
+            line = line[:tail.start()] + " <v>"
+        line = line.lower()
+        for pattern, verb in _VERBS:
+            line = re.sub(pattern, verb, line)
+        line = _FILLER.sub(" ", line)
+        skeleton.append(" ".join(re.sub(r"[^\w<>]+", " ", line).split()))
+    return "\n".join(skeleton), values
+
+
+def _value_key(value: tuple) -> str:
+    kind, text = value
+    return normalize_url(text) if kind == "url" else text
+
+
+def shingles(text: str, n: int = NGRAM) -> set:
+    text = f" {text} "
+    return {text[i:i + n] for i in range(max(1, len(text) - n + 1))}
+
+
+def _replace_url(script: str, old: str, new: str) -> tuple:
+    """Replace URLs in script whose normalised form equals old; returns (script, replaced)"""
+    target = normalize_url(old)
+    new_url = new if re.match(r"^https?://", new, re.IGNORECASE) else "https://" + new
+    count = 0
+
+    def repl(match):
+        nonlocal count
+        if normalize_url(match.group(0)) == target:
+            count += 1
+            return new_url
+        return match.group(0)
+
+    return _SCRIPT_URL_RE.sub(repl, script), count > 0
+
+
+def _replace_text(script: str, old: str, new: str) -> tuple:
+    """Replace old inside string literals only, so code and identifiers are never touched
+
+    Literals that are exactly old are replaced; only when there are none is old
+    replaced inside longer literals (so "user" does not rewrite a "#user" selector
+    when a literal "user" exists).
+    """
+    literals = [m.group(2) for m in _STRING_LITERAL_RE.finditer(script)]
+    whole = old in literals
+    count = 0
+
+    def repl(match):
+        nonlocal count
+        quote, content = match.group(1), match.group(2)
+        if (whole and content != old) or old not in content:
+            return match.group(0)
+        count += 1
+        escaped = new.replace("\\", "\\\\").replace(quote, "\\" + quote)
+        return quote + content.replace(old, escaped) + quote
+
+    return _STRING_LITERAL_RE.sub(repl, script), count > 0
+
+
+def adapt_script(script: str, old_values: list, new_values: list) -> tuple:
+    """Substitute changed values into script; returns (script, substitutions) or (None, reason)"""
+    if len(old_values) != len(new_values):
+        return None, "different number of values"
+    substitutions = []
+    for old, new in zip(old_values, new_values):
+        if _value_key(old) == _value_key(new):
+            continue
+        if old[0] == "url" and new[0] == "url":
+            # Selectors rarely carry over between sites: only paths on the same host are adapted
+            if url_host(old[1]) != url_host(new[1]):
+                return None, "different site"
+            script, replaced = _replace_url(script, old[1], new[1])
+        else:
+            script, replaced = _replace_text(script, old[1], new[1]) if old[1] else (script, False)
+        if not replaced:
+            return None, f"value {old[1]!r} not found in the script"
+        substitutions.append({"from": old[1], "to": new[1]})
+    return script, substitutions
+
+
+class ScriptIndex:
+    """Thread-safe trigram index over passed scripts, persisted as JSON lines"""
+
+    def __init__(self, path: str = INDEX_FILE, threshold: float = MATCH_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._entries = {}
+        self._postings = defaultdict(set)
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "exact_reuse": 0, "adapted": 0, "misses": 0, "suggested": 0, "entries": 0}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self._insert(json.loads(line))
+                    except (ValueError, KeyError):
+                        continue
+
+    def _insert(self, entry: dict):
+        old = self._entries.get(entry["id"])
+        if old:
+            entry["passes"] = old["passes"] + entry.get("passes", 1)
+        entry["shingles"] = shingles(entry["skeleton"])
+        self._entries[entry["id"]] = entry
+        for gram in entry["shingles"]:
+            self._postings[gram].add(entry["id"])
+        while len(self._entries) > MAX_ENTRIES:
+            evicted = self._entries.pop(next(iter(self._entries)))
+            for gram in evicted["shingles"]:
+                self._postings[gram].discard(evicted["id"])
+        self.stats["entries"] = len(self._entries)
+
+    def add(self, steps: str, script_code: str) -> dict:
+        """Record a passed script for the steps it was generated from"""
+        skeleton, values = parse_steps(steps)
+        if not skeleton or not script_code.strip():
+            return None
+        entry_id = hashlib.sha1((skeleton + "\x00" + script_code).encode("utf-8")).hexdigest()[:16]
+        entry = {"id": entry_id, "steps": steps, "skeleton": skeleton, "values": values,
+                 "script": script_code, "passes": 1, "timestamp": datetime.now().isoformat()}
+        with self._lock:
+            record = dict(entry)
+            self._insert(entry)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        return entry
+
+    def search(self, steps: str, limit: int = 3) -> list:
+        """Most similar entries as [(score, entry)], best first"""
+        skeleton, _ = parse_steps(steps)
+        query = shingles(skeleton)
+        overlap = defaultdict(int)
+        with self._lock:
+            for gram in query:
+                for entry_id in self._postings.get(gram, ()):
+                    overlap[entry_id] += 1
+            scored = []
+            for entry_id, common in overlap.items():
+                entry = self._entries[entry_id]
+                scored.append((common / (len(query) + len(entry["shingles"]) - common), entry))
+        scored.sort(key=lambda item: (item[0], item[1]["passes"]), reverse=True)
+        return scored[:limit]
+
+    def find(self, steps: str, browser_type: str = None, headless: bool = None) -> dict:
+        """Reusable script for steps of the same flow, or None; adapted to the new values and browser options"""
+        skeleton, values = parse_steps(steps)
+        with self._lock:
+            self.stats["lookups"] += 1
+        for score, entry in self.search(steps):
+            if score < self.threshold:
+                break
+            if entry["skeleton"] != skeleton:
+                continue  # similar text, different flow: a suggestion at most
+            script, substitutions = adapt_script(entry["script"], [tuple(v) for v in entry["values"]], values)
+            if script is None:
+                continue
+            if browser_type is not None:
+                script = apply_browser_options(script, browser_type, bool(headless))
+            with self._lock:
+                self.stats["adapted" if substitutions else "exact_reuse"] += 1
+            return {"script": script, "score": round(score, 3), "substitutions": substitutions,
+                    "source_id": entry["id"], "source_steps": entry["steps"], "passes": entry["passes"]}
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def suggest(self, steps: str, limit: int = 3) -> list:
+        """Similar passed scripts of a different flow, for review only: [{score, source_steps, script, differences}]"""
+        skeleton, _ = parse_steps(steps)
+        lines = skeleton.splitlines()
+        suggestions = []
+        for score, entry in self.search(steps, limit):
+            if score < SUGGEST_THRESHOLD or entry["skeleton"] == skeleton:
+                continue
+            stored = entry["skeleton"].splitlines()
+            count = max(len(stored), len(lines))
+            pairs = zip(stored + [""] * (count - len(stored)), lines + [""] * (count - len(lines)))
+            differences = [f"step {i}: {old or '(none)'!r} vs {new or '(none)'!r}"
+                           for i, (old, new) in enumerate(pairs, start=1) if old != new]
+            suggestions.append({"score": round(score, 3), "source_id": entry["id"], "source_steps": entry["steps"],
+                                "script": entry["script"], "differences": differences})
+        if suggestions:
+            with self._lock:
+                self.stats["suggested"] += 1
+        return suggestions
+
+    def generate(self, steps: str, generate, browser_type: str = None, headless: bool = None) -> tuple:
+        """(script, match): a reused script when one fits, otherwise generate(steps) with match None"""
+        match = self.find(steps, browser_type, headless)
+        if match:
+            return match["script"], match
+        return generate(steps), None
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> ScriptIndex:
+    """Process-wide index, loaded on first use"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ScriptIndex()
+        return _index
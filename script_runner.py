@@ -0,0 +1,260 @@
+"""
+Shared execution helpers for generated Playwright scripts.
+
+Runs a script in its own working directory so that several runs (e.g. one per
+browser engine) can write their step_*.png screenshots side by side without
+clobbering each other.
+"""
+
+import glob
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from change_capture import MANIFEST_FILE, load_manifest
+from network_profiles import NETWORK_STATS_FILE, PROFILE_NAMES, load_stats
+from resource_monitor import LIMIT_KEYS, SAMPLE_INTERVAL, ResourceMonitor, is_supported as accounting_supported, totals
+from step_watchdog import HEARTBEAT_FILE, describe_stall, read_heartbeat, stalled
+from trace_capture import RECORDING_MODES, clear_recordings, recording_stats, schedule_extraction, wait_for_frames
+
+# --- Configuration ---
+ARTIFACT_ROOT = "artifacts"
+GENERATED_SCRIPT = "generated_playwright_test.py"
+DEFAULT_TIMEOUT = 500  # seconds
+DEFAULT_STEP_TIMEOUT = 30  # seconds per browser action
+WATCHDOG_POLL = SAMPLE_INTERVAL  # seconds between deadline/heartbeat/resource checks
+BROWSER_ENGINES = ["chromium", "firefox", "webkit"]
+CAPTURE_MODES = ["every_step", "on_change", "trace", "video"]
+EXECUTORS = ["subprocess", "fork_server"]
+BOOTSTRAP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "run_bootstrap.py")
+
+_KILLED_STATUS = {"run": "timeout", "step": "timeout", "resources": "resource_limit"}
+_LAUNCH_RE = re.compile(r"\.(chromium|firefox|webkit)\.launch\(([^()]*)\)")
+_HEADLESS_RE = re.compile(r"\s*headless\s*=\s*[^,]+,?")
+_STEP_RE = re.compile(r"step_(\d+)")
+
+
+def apply_browser_options(script_code: str, browser_type: str = "chromium", headless: bool = False) -> str:
+    """Rewrite every ``<p>.<engine>.launch(...)`` call to use the requested engine and headless flag"""
+    if browser_type not in BROWSER_ENGINES:
+        raise ValueError(f"Unsupported browser type: {browser_type}")
+
+    def repl(match):
+        args = _HEADLESS_RE.sub("", match.group(2)).strip().rstrip(",").strip()
+        args = f"headless={headless}" + (f", {args}" if args else "")
+        return f".{browser_type}.launch({args})"
+
+    return _LAUNCH_RE.sub(repl, script_code)
+
+
+def step_sort_key(path: str):
+    """Sort step_2.png before step_10.png"""
+    match = _STEP_RE.search(os.path.basename(path))
+    return (int(match.group(1)) if match else sys.maxsize, path)
+
+
+def clear_screenshots(run_dir: str = "."):
+    """Remove step screenshots, extracted frames, recordings and manifests left by a previous run"""
+    # A previous recorded run may still be extracting frames into this directory
+    wait_for_frames(run_dir)
+    run_files = [os.path.join(run_dir, name) for name in (MANIFEST_FILE, NETWORK_STATS_FILE, HEARTBEAT_FILE)]
+    for f in glob.glob(os.path.join(run_dir, "step_*.png")) + glob.glob(os.path.join(run_dir, "step_*.jpg")) + run_files:
+        if os.path.exists(f):
+            os.remove(f)
+    clear_recordings(run_dir)
+
+
+def collect_screenshots(run_dir: str = ".") -> list:
+    """Return one image path per step in step order
+
+    Skipped (unchanged) steps resolve to the image they reference; frames
+    extracted from a trace/video (step_N.jpg) fill steps without a screenshot.
+    """
+    steps = {}
+    for pattern in ("step_*.jpg", "step_*.png"):  # a real screenshot wins over an extracted frame
+        for p in glob.glob(os.path.join(run_dir, pattern)):
+            steps[os.path.splitext(os.path.basename(p))[0]] = os.path.normpath(p)
+    for name, entry in load_manifest(run_dir).get("steps", {}).items():
+        ref = os.path.normpath(os.path.join(run_dir, entry.get("ref", "")))
+        step = os.path.splitext(os.path.basename(name))[0]
+        if "ref" in entry and step not in steps and os.path.exists(ref):
+            steps[step] = ref
+    return [steps[name] for name in sorted(steps, key=step_sort_key)]
+
+
+def settle_capture(result: dict, timeout: float = None) -> dict:
+    """Wait for background frame extraction of a trace/video run and refresh its screenshots in place"""
+    capture = result.get("capture") or {}
+    if not capture.get("frames_pending") or not result.get("run_dir"):
+        return result
+    extraction = wait_for_frames(result["run_dir"], timeout)
+    if extraction is None:
+        return result
+    result["screenshots"] = collect_screenshots(result["run_dir"])
+    capture.update(frames_pending=False, frames=len(extraction.get("frames", [])),
+                   missing=len(extraction.get("missing", [])), extraction_error=extraction.get("error"))
+    return result
+
+
+def make_run_options(capture_mode: str = "every_step", network_profile: str = "full", step_timeout: float = None,
+                     resource_limits: dict = None, screenshot_sample: int = 0) -> dict:
+    """Run options for run_script; defaults are omitted so plain runs skip the bootstrap
+
+    screenshot_sample=N still takes a real screenshot every Nth step in trace/video mode.
+    """
+    if capture_mode not in CAPTURE_MODES:
+        raise ValueError(f"Unsupported capture mode: {capture_mode}")
+    if network_profile not in PROFILE_NAMES:
+        raise ValueError(f"Unsupported network profile: {network_profile}")
+    options = {}
+    if capture_mode != "every_step":
+        options["capture_mode"] = capture_mode
+    if capture_mode in RECORDING_MODES and screenshot_sample:
+        options["screenshot_sample"] = int(screenshot_sample)
+    if network_profile != "full":
+        options["network_profile"] = network_profile
+    if step_timeout:
+        options["step_timeout"] = float(step_timeout)
+    limits = {k: v for k, v in (resource_limits or {}).items() if k in LIMIT_KEYS and v}
+    if limits:
+        options["resource_limits"] = limits
+    return options
+
+
+def fork_server_available() -> bool:
+    """Fork server needs os.fork (POSIX); callers fall back to subprocess elsewhere"""
+    return hasattr(os, "fork") and hasattr(os, "setsid")
+
+
+def build_command(script_name: str, options: dict = None):
+    """Command and environment for a run; options route the script through run_bootstrap"""
+    if not options:
+        return [sys.executable, script_name], None
+    env = dict(os.environ, PW_RUN_OPTIONS=json.dumps(options))
+    return [sys.executable, BOOTSTRAP, script_name], env
+
+
+def capture_stats(run_dir: str) -> dict:
+    """Captured/skipped screenshot counts for change-aware and recorded runs (None otherwise)"""
+    manifest = load_manifest(run_dir)
+    if not manifest:
+        return recording_stats(run_dir)
+    return {"captured": manifest.get("captured", 0), "skipped": manifest.get("skipped", 0)}
+
+
+def new_run_dir(prefix: str = "run") -> str:
+    """Create and return a fresh directory under ARTIFACT_ROOT"""
+    run_dir = os.path.join(ARTIFACT_ROOT, f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}")
+    os.makedirs(run_dir, exist_ok=True)
+    return run_dir
+
+
+def kill_process_tree(pid: int):
+    """Kill a run and everything it spawned (browsers, Playwright driver)"""
+    if os.name == "nt":
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(pid)], capture_output=True)
+        return
+    try:
+        os.killpg(pid, signal.SIGKILL)  # the run is its own session/process group leader
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _run_subprocess(script_name: str, run_dir: str, timeout: float, options: dict) -> dict:
+    """Run in a new process group with the run deadline, the per-step watchdog and resource accounting/limits"""
+    command, env = build_command(script_name, options)
+    step_timeout = (options or {}).get("step_timeout")
+    group = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP} if os.name == "nt" else {"start_new_session": True}
+    started_at = time.time()
+    deadline = time.monotonic() + timeout
+    proc = subprocess.Popen(command, cwd=run_dir, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            text=True, **group)
+    monitor = ResourceMonitor(proc.pid, (options or {}).get("resource_limits")) if accounting_supported() else None
+    killed = violation = None
+    while True:
+        try:
+            stdout, stderr = proc.communicate(timeout=WATCHDOG_POLL)
+            break
+        except subprocess.TimeoutExpired:
+            pass
+        if time.monotonic() >= deadline:
+            killed = "run"
+        elif step_timeout and stalled(read_heartbeat(run_dir), started_at, step_timeout):
+            killed = "step"
+        elif monitor is not None:
+            violation = monitor.sample()
+            killed = "resources" if violation else None
+        if killed:
+            kill_process_tree(proc.pid)
+            stdout, stderr = proc.communicate()
+            break
+    # Browsers left behind by a crashed or killed script share the group; clean them up too
+    if os.name != "nt":
+        kill_process_tree(proc.pid)
+    return {"return_code": proc.returncode, "stdout": stdout, "stderr": stderr, "killed": killed,
+            "violation": violation, "resources": monitor.usage() if monitor is not None else None}
+
+
+def _run_in_fork_server(script_name: str, run_dir: str, timeout: float, options: dict) -> dict:
+    """Run through the pre-warmed fork server (same reply shape as _run_subprocess)"""
+    import fork_server
+
+    return fork_server.get_client().run(script_name, run_dir, timeout, options)
+
+
+def run_script(script_code: str, run_dir: str = ".", script_name: str = GENERATED_SCRIPT,
+               timeout: float = DEFAULT_TIMEOUT, options: dict = None, executor: str = "subprocess") -> dict:
+    """Execute a Playwright script inside run_dir and return results"""
+    started = time.perf_counter()
+    try:
+        os.makedirs(run_dir, exist_ok=True)
+        # Remove old screenshots
+        clear_screenshots(run_dir)
+
+        with open(os.path.join(run_dir, script_name), "w", encoding="utf-8") as f:
+            f.write(script_code)
+
+        if executor == "fork_server" and fork_server_available():
+            result = _run_in_fork_server(script_name, run_dir, timeout, options)
+        else:
+            result = _run_subprocess(script_name, run_dir, timeout, options)
+        output = result["stdout"] + "\n" + result["stderr"]
+        stalled_step = None
+        if result["killed"] == "step":
+            heartbeat = read_heartbeat(run_dir)
+            output += "\n" + describe_stall(heartbeat, options["step_timeout"])
+            stalled_step = heartbeat or {"step": 0, "action": "startup", "target": "", "state": "running"}
+        elif result["killed"] == "run":
+            output += f"\nScript execution timed out after {timeout} seconds"
+        elif result["killed"] == "resources":
+            output += f"\nScript execution stopped: {result['violation']}"
+        totals.record(result.get("resources"), result["killed"] == "resources")
+        capture = capture_stats(run_dir)
+        if capture and capture.get("frames_pending"):
+            # Frames come out of the trace/video off the critical path; settle_capture() picks them up
+            schedule_extraction(run_dir)
+        return {
+            "status": _KILLED_STATUS.get(result["killed"], "success" if result["return_code"] == 0 else "error"),
+            "output": output,
+            "screenshots": collect_screenshots(run_dir),
+            "return_code": -1 if result["killed"] else result["return_code"],
+            "duration": time.perf_counter() - started,
+            "capture": capture,
+            "run_dir": run_dir,
+            "network": load_stats(run_dir),
+            "stalled_step": stalled_step,
+            "resources": result.get("resources")
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "output": f"Error running script: {str(e)}",
+            "screenshots": [],
+            "return_code": -1,
+            "duration": time.perf_counter() - started
+        }
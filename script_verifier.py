@@ -0,0 +1,222 @@
+"""
+Script verification within a prompt token budget.
+
+Small scripts are verified in one prompt. Scripts whose prompt would exceed
+MAX_VERIFY_PROMPT_TOKENS are split along the AST into function/class chunks
+(module-level code is grouped into step chunks, and any oversized block - a
+function, class or with/for/while/if/try statement such as the single
+`with sync_playwright() as p:` of a generated script - is split between its
+inner statements, recursively), each chunk is verified concurrently, and the
+answers are merged into one report. Every chunk is sent with its original line
+numbers so line references in the report point into the full script.
+"""
+
+import ast
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from model_client import estimate_tokens
+
+# --- Configuration ---
+MAX_VERIFY_PROMPT_TOKENS = 6000   # whole-script prompts above this are chunked
+CHUNK_TOKENS = 2500               # target size of one chunk's code
+MAX_CONTEXT_TOKENS = 400          # imports/constants repeated in every chunk
+MAX_WORKERS = 4
+
+VERIFY_SECTIONS = """1. Code Quality Assessment
+2. Best Practices Check
+3. Potential Issues/Bugs
+4. Performance Optimization Suggestions
+5. Security Considerations
+6. Maintainability Score (1-10)
+7. Specific Improvements"""
+
+# Models echo the "(1-10)" range from the prompt heading; skip it so "(1-10): 8/10" reads 8
+_SCORE_RE = re.compile(r"Maintainability Score(?:\s*\(\s*\d+\s*(?:-|\u2013|to)\s*\d+\s*\))?[^0-9]{0,40}(\d+(?:\.\d+)?)",
+                       re.IGNORECASE)
+
+
+def number_lines(lines: list, start: int) -> str:
+    """Lines prefixed with their 1-based line number in the full script"""
+    width = len(str(start + len(lines)))
+    return "\n".join(f"{start + i:>{width}}| {line}" for i, line in enumerate(lines))
+
+
+def build_verify_prompt(code: str, start: int = 1, scope: str = None, context: str = "") -> str:
+    numbered = number_lines(code.splitlines(), start)
+    if scope is None:
+        return f"""
+Analyze the following Playwright test script and provide:
+
+{VERIFY_SECTIONS}
+
+Test Script (each line is prefixed with its line number):
+{numbered}
+
+Provide detailed feedback with specific line references where applicable.
+"""
+    return f"""
+Analyze one part ({scope}) of a larger Playwright test script and provide:
+
+{VERIFY_SECTIONS}
+
+Module context (imports and constants of the script, for reference only):
+{context or "(none)"}
+
+Code to review (each line is prefixed with its line number in the full script):
+{numbered}
+
+Only review the code shown. Refer to lines by the numbers shown.
+"""
+
+
+_BLOCKS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.With, ast.AsyncWith,
+           ast.For, ast.AsyncFor, ast.While, ast.If, ast.Try)
+
+
+def _node_start(node) -> int:
+    decorators = getattr(node, "decorator_list", [])
+    return min([node.lineno] + [d.lineno for d in decorators])
+
+
+def _is_context(node) -> bool:
+    """Imports and simple constant assignments: shared by every chunk"""
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        return True
+    if isinstance(node, (ast.Assign, ast.AnnAssign)) and isinstance(getattr(node, "value", None), ast.Constant):
+        return True
+    return isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant)  # docstring
+
+
+def _spans(statements: list, lines: list, end: int, max_tokens: int) -> list:
+    """(first, last) line spans of the statements, with oversized blocks broken up between their inner statements"""
+    spans = []
+    for i, node in enumerate(statements):
+        first = _node_start(node)
+        last = _node_start(statements[i + 1]) - 1 if i + 1 < len(statements) else end
+        if isinstance(node, _BLOCKS) and estimate_tokens("\n".join(lines[first - 1:last])) > max_tokens:
+            # The block header goes with the first part; else/except/finally clauses with the last
+            inner = _spans(node.body, lines, last, max_tokens)
+            inner[0] = (first, inner[0][1])
+            spans.extend(inner)
+        else:
+            spans.append((first, last))
+    return spans
+
+
+def _split_statements(statements: list, lines: list, end: int, label: str, max_tokens: int) -> list:
+    """Group consecutive statements into chunks of at most ~max_tokens"""
+    chunks, current = [], None
+    for first, last in _spans(statements, lines, end, max_tokens):
+        size = estimate_tokens("\n".join(lines[first - 1:last]))
+        if current and current["tokens"] + size > max_tokens:
+            chunks.append(current)
+            current = None
+        if current is None:
+            current = {"start": first, "end": last, "tokens": 0}
+        current["end"] = last
+        current["tokens"] += size
+    if current:
+        chunks.append(current)
+    for index, chunk in enumerate(chunks, start=1):
+        chunk["name"] = label if len(chunks) == 1 else f"{label}, part {index}"
+    return chunks
+
+
+def chunk_script(code: str, max_tokens: int = CHUNK_TOKENS) -> dict:
+    """Split a script into {"context": str, "chunks": [{name, start, end, code}]}"""
+    lines = code.splitlines()
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        # Not parseable: fixed-size line windows
+        window = max(1, max_tokens * 4 // 80)
+        chunks = [{"name": f"lines {i + 1}-{min(i + window, len(lines))}", "start": i + 1,
+                   "end": min(i + window, len(lines))} for i in range(0, len(lines), window)]
+        return {"context": "", "chunks": [dict(c, code="\n".join(lines[c["start"] - 1:c["end"]])) for c in chunks]}
+
+    body = tree.body
+    context_nodes = [n for n in body if _is_context(n)]
+    context = "\n".join(ast.get_source_segment(code, n) or "" for n in context_nodes)
+    if estimate_tokens(context) > MAX_CONTEXT_TOKENS:
+        context = context[:MAX_CONTEXT_TOKENS * 4] + "\n# ... (truncated)"
+
+    chunks, steps, steps_end = [], [], 0
+    ends = [(_node_start(body[i + 1]) - 1) if i + 1 < len(body) else len(lines) for i in range(len(body))]
+    for node, end in zip(body, ends):
+        if node in context_nodes:
+            continue
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            if steps:
+                chunks.extend(_split_statements(steps, lines, steps_end, "module-level steps", max_tokens))
+                steps = []
+            kind = "class" if isinstance(node, ast.ClassDef) else "function"
+            chunks.extend(_split_statements([node], lines, end, f"{kind} {node.name}", max_tokens))
+        else:
+            steps.append(node)
+            steps_end = end
+    if steps:
+        chunks.extend(_split_statements(steps, lines, steps_end, "module-level steps", max_tokens))
+
+    chunks.sort(key=lambda c: c["start"])
+    return {
+        "context": context,
+        "chunks": [
+            {"name": c["name"], "start": c["start"], "end": c["end"],
+             "code": "\n".join(lines[c["start"] - 1:c["end"]])}
+            for c in chunks
+        ]
+    }
+
+
+def _merge(results: list) -> str:
+    scores = []
+    sections = []
+    for result in results:
+        header = f"## {result['name']} (lines {result['start']}-{result['end']})"
+        if result.get("error"):
+            sections.append(f"{header}\n\nVerification failed: {result['error']}")
+            continue
+        match = _SCORE_RE.search(result["report"])
+        if match and float(match.group(1)) <= 10:
+            scores.append(float(match.group(1)))
+        sections.append(f"{header}\n\n{result['report'].strip()}")
+    failed = sum(1 for r in results if r.get("error"))
+    summary = [f"# Verification Report ({len(results)} chunks verified in parallel"
+               + (f", {failed} failed)" if failed else ")")]
+    if scores:
+        summary.append(f"Overall Maintainability Score: {sum(scores) / len(scores):.1f}/10 "
+                       f"(average of {len(scores)} chunk score(s))")
+    summary.append("Line references below refer to the full script.")
+    return "\n\n".join(["\n".join(summary)] + sections)
+
+
+def verify_script(code: str, generate, max_prompt_tokens: int = MAX_VERIFY_PROMPT_TOKENS,
+                  chunk_tokens: int = CHUNK_TOKENS, max_workers: int = MAX_WORKERS) -> dict:
+    """Verify code with generate(prompt, label=...) -> text; chunked and parallel when over budget"""
+    prompt = build_verify_prompt(code)
+    prompt_tokens = estimate_tokens(prompt)
+    if prompt_tokens <= max_prompt_tokens:
+        return {"report": generate(prompt, label="verify"), "chunked": False, "chunks": [],
+                "prompt_tokens": prompt_tokens}
+
+    split = chunk_script(code, chunk_tokens)
+
+    def verify_chunk(chunk):
+        chunk_prompt = build_verify_prompt(chunk["code"], chunk["start"], chunk["name"], split["context"])
+        result = {"name": chunk["name"], "start": chunk["start"], "end": chunk["end"],
+                  "prompt_tokens": estimate_tokens(chunk_prompt)}
+        try:
+            result["report"] = generate(chunk_prompt, label=f"verify:{chunk['name']}")
+        except Exception as e:
+            result["error"] = str(e)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(verify_chunk, split["chunks"]))
+    return {
+        "report": _merge(results),
+        "chunked": True,
+        "chunks": [{k: v for k, v in r.items() if k != "report"} for r in results],
+        "prompt_tokens": sum(r["prompt_tokens"] for r in results)
+    }
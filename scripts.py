@@ -1,6 +1,8 @@
 import os
 from playwright.sync_api import sync_playwright
 from google import genai
+from model_client import get_shared_client, genai_generate_fn
+from live_session import build_step_prompt, clean_command
 
 # ========= CONFIG =========
 SCREENSHOT_DIR = "screenshots"
@@ -21,27 +23,11 @@ os.makedirs(SCREENSHOT_DIR, exist_ok=True)
 
 # Init Google GenAI client
 client = genai.Client(api_key=API_KEY)
+llm = get_shared_client(MODEL, genai_generate_fn(client, MODEL))
 
 def interpret_instruction(instruction: str) -> str:
     """Convert natural language instruction into Playwright Python code."""
-    prompt = f"""
-You are an assistant that converts natural language test instructions into Playwright Python commands.
-
-Examples:
-- Instruction: "Open https://example.com"
-  Output: page.goto("https://example.com")
-- Instruction: "Click on the login button"
-  Output: page.click("text=login")
-- Instruction: "Type username test_user"
-  Output: page.fill("input[name='username']", "test_user")
-- Instruction: "Take screenshot"
-  Output: page.screenshot(path=f"{{SCREENSHOT_DIR}}/step.png")
-
-Now convert this instruction:
-"{instruction}"
-"""
-    resp = client.models.generate_content(model=MODEL, contents=prompt)
-    return resp.text.strip()
+    return clean_command(llm.generate(build_step_prompt(instruction), label="step"))
 
 def run():
     with sync_playwright() as p:
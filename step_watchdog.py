@@ -0,0 +1,123 @@
+"""
+Per-step heartbeats for generated scripts.
+
+When installed (run option ``step_timeout``), every Playwright page/locator
+action writes step_heartbeat.json in the run directory before and after it
+runs, and every page gets ``step_timeout`` as its default action/navigation
+timeout. The runner (script_runner or the fork-server supervisor) reads the
+heartbeat while the script runs: when it has not moved for longer than the
+step timeout plus a grace period, the run is killed and the heartbeat tells
+which step stalled.
+"""
+
+import json
+import os
+import time
+
+# --- Configuration ---
+HEARTBEAT_FILE = "step_heartbeat.json"
+STALL_GRACE = 5  # seconds past the step timeout before a silent step counts as stalled
+
+PAGE_ACTIONS = [
+    "goto", "reload", "go_back", "go_forward", "click", "dblclick", "fill", "type", "press",
+    "check", "uncheck", "select_option", "hover", "focus", "set_input_files", "wait_for_selector",
+    "wait_for_load_state", "wait_for_url", "wait_for_timeout", "screenshot"
+]
+LOCATOR_ACTIONS = [
+    "click", "dblclick", "fill", "type", "press", "press_sequentially", "check", "uncheck",
+    "select_option", "hover", "focus", "set_input_files", "wait_for", "screenshot",
+    "text_content", "inner_text", "input_value"
+]
+
+_state = {"step": 0, "depth": 0, "timeout_ms": None}
+
+
+def _write_heartbeat(data: dict):
+    tmp = HEARTBEAT_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, HEARTBEAT_FILE)
+
+
+def _page_target(page, args: tuple, kwargs: dict) -> str:
+    """Selector/URL of a page action; for fill/type/press the value is the second argument and is never recorded"""
+    value = args[0] if args else kwargs.get("url") or kwargs.get("selector") or kwargs.get("path") or ""
+    return str(value)[:120]
+
+
+def _locator_target(locator, args: tuple, kwargs: dict) -> str:
+    """Selector of a locator; its arguments (typed text, keys, files) are never recorded"""
+    selector = getattr(getattr(locator, "_impl_obj", None), "_selector", None)
+    return str(selector or "locator")[:120]
+
+
+def _configure_page(page):
+    if not getattr(page, "_step_timeout_set", False):
+        page.set_default_timeout(_state["timeout_ms"])
+        page.set_default_navigation_timeout(_state["timeout_ms"])
+        page._step_timeout_set = True
+
+
+def _wrap(original, action: str, page_of, target_of):
+    def wrapper(self, *args, **kwargs):
+        # Actions called from inside another watched action (e.g. by a hook) are part of that step
+        if _state["depth"]:
+            return original(self, *args, **kwargs)
+        _state["step"] += 1
+        beat = {"step": _state["step"], "action": action, "target": target_of(self, args, kwargs)}
+        _state["depth"] += 1
+        try:
+            _configure_page(page_of(self))
+            _write_heartbeat({**beat, "state": "running", "time": time.time()})
+            result = original(self, *args, **kwargs)
+        except BaseException:
+            _write_heartbeat({**beat, "state": "failed", "time": time.time()})
+            raise
+        finally:
+            _state["depth"] -= 1
+        _write_heartbeat({**beat, "state": "done", "time": time.time()})
+        return result
+
+    wrapper._step_watchdog = True
+    return wrapper
+
+
+def install(step_timeout: float):
+    """Patch sync Page/Locator actions to write heartbeats and default to step_timeout (seconds)"""
+    from playwright.sync_api import Locator, Page
+
+    if getattr(Page.click, "_step_watchdog", False):
+        return
+    _state["timeout_ms"] = float(step_timeout) * 1000
+    for name in PAGE_ACTIONS:
+        if hasattr(Page, name):
+            setattr(Page, name, _wrap(getattr(Page, name), name, lambda page: page, _page_target))
+    for name in LOCATOR_ACTIONS:
+        if hasattr(Locator, name):
+            setattr(Locator, name, _wrap(getattr(Locator, name), name, lambda locator: locator.page,
+                                         _locator_target))
+
+
+def read_heartbeat(run_dir: str) -> dict:
+    """Last heartbeat a run wrote (None before its first watched action)"""
+    path = os.path.join(run_dir, HEARTBEAT_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def stalled(heartbeat: dict, started_at: float, step_timeout: float, now: float = None) -> bool:
+    """True when nothing has moved for step_timeout + STALL_GRACE (started_at/now are time.time() values)"""
+    last = heartbeat["time"] if heartbeat else started_at
+    return ((now or time.time()) - last) > step_timeout + STALL_GRACE
+
+
+def describe_stall(heartbeat: dict, step_timeout: float) -> str:
+    if not heartbeat:
+        return f"Run stalled before its first browser action (no progress for over {step_timeout:g}s)"
+    where = f"step {heartbeat['step']} ({heartbeat['action']} {heartbeat['target']})".replace(" )", ")")
+    if heartbeat.get("state") == "running":
+        return f"Run stalled in {where}: no progress for over {step_timeout:g}s"
+    return f"Run stalled after {where}: no browser action for over {step_timeout:g}s"
@@ -0,0 +1,202 @@
+"""
+Structured test-case pipeline: requirements -> test cases -> scripts -> results.
+
+1. The model is asked for schema-constrained JSON test cases (TEST_CASE_SCHEMA),
+   which parse_test_cases() turns into plain dict records.
+2. Script generation fans out over a thread pool, highest priority first.
+3. Each generated script is handed to the execution pool the moment it is ready,
+   so generation and execution overlap instead of running strictly in sequence.
+
+The pipeline is model-agnostic: callers pass ``generate_script(steps) -> code``
+(and optionally ``run_case(record) -> result``).
+"""
+
+import json
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from script_runner import DEFAULT_TIMEOUT, apply_browser_options, new_run_dir, run_script
+
+# --- Configuration ---
+DEFAULT_MAX_GENERATORS = 4
+DEFAULT_MAX_EXECUTORS = 2
+PRIORITY_ORDER = {"High": 0, "Medium": 1, "Low": 2}
+
+TEST_CASE_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "id": {"type": "string"},
+            "name": {"type": "string"},
+            "preconditions": {"type": "array", "items": {"type": "string"}},
+            "steps": {"type": "array", "items": {"type": "string"}},
+            "expected_results": {"type": "array", "items": {"type": "string"}},
+            "priority": {"type": "string", "enum": ["High", "Medium", "Low"]},
+            "test_type": {"type": "string"}
+        },
+        "required": ["id", "name", "steps", "expected_results", "priority"]
+    }
+}
+
+# Passed as generate_content(generation_config=...) so Gemini returns JSON matching the schema
+STRUCTURED_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": TEST_CASE_SCHEMA
+}
+
+
+def build_structured_prompt(requirements: str) -> str:
+    return f"""
+Generate comprehensive, independently executable UI test cases from the following requirements:
+
+{requirements}
+
+Return a JSON array. Each element has:
+- "id": unique test case ID such as "TC-001"
+- "name": short test case name
+- "preconditions": list of pre-conditions
+- "steps": list of concrete browser steps (one action per item, include full URLs and input values)
+- "expected_results": list of expected results that can be verified in the browser
+- "priority": "High", "Medium" or "Low"
+- "test_type": Functional, UI, Integration, etc.
+
+Only output the JSON array, nothing else.
+"""
+
+
+def _strip_fences(text: str) -> str:
+    text = text.strip()
+    text = re.sub(r"^```[a-zA-Z]*\s*", "", text)
+    return re.sub(r"\s*```$", "", text).strip()
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [line.strip(" -*\t") for line in str(value).splitlines() if line.strip(" -*\t")]
+
+
+def normalize_test_case(raw: dict, index: int) -> dict:
+    """Coerce one parsed test case into the pipeline record shape"""
+    priority = str(raw.get("priority", "Medium")).strip().capitalize()
+    return {
+        "id": str(raw.get("id") or raw.get("test_case_id") or f"TC-{index:03d}"),
+        "name": str(raw.get("name") or raw.get("test_case_name") or f"Test case {index}"),
+        "preconditions": _as_list(raw.get("preconditions")),
+        "steps": _as_list(raw.get("steps") or raw.get("test_steps")),
+        "expected_results": _as_list(raw.get("expected_results")),
+        "priority": priority if priority in PRIORITY_ORDER else "Medium",
+        "test_type": str(raw.get("test_type", "Functional"))
+    }
+
+
+def parse_test_cases(text: str) -> list:
+    """Parse the model's JSON output into test case records"""
+    text = _strip_fences(text)
+    try:
+        data = json.loads(text, strict=False)
+    except ValueError:
+        match = re.search(r"\[.*\]", text, re.DOTALL)
+        if not match:
+            raise ValueError("Model output did not contain a JSON array of test cases")
+        data = json.loads(match.group(0), strict=False)
+    if isinstance(data, dict):
+        data = data.get("test_cases", [data])
+    cases = [normalize_test_case(raw, i) for i, raw in enumerate(data, 1) if isinstance(raw, dict)]
+    return [case for case in cases if case["steps"]]
+
+
+def case_to_steps(case: dict) -> str:
+    """Render a record as the plain step list generate_playwright_script expects"""
+    lines = list(case["steps"])
+    lines += [f"Verify {expected}" for expected in case["expected_results"]]
+    return "\n".join(lines)
+
+
+def format_test_cases(cases: list) -> str:
+    """Human-readable rendering for the Test Cases text area and reports"""
+    blocks = []
+    for case in cases:
+        block = [f"{case['id']}: {case['name']}", f"Priority: {case['priority']} | Type: {case['test_type']}"]
+        if case["preconditions"]:
+            block.append("Pre-conditions: " + "; ".join(case["preconditions"]))
+        block.append("Steps:")
+        block += [f"  {i}. {step}" for i, step in enumerate(case["steps"], 1)]
+        block.append("Expected Results:")
+        block += [f"  - {expected}" for expected in case["expected_results"]]
+        blocks.append("\n".join(block))
+    return "\n\n".join(blocks)
+
+
+def default_run_case(browser_type: str = None, headless: bool = True, options: dict = None,
+                     timeout: float = DEFAULT_TIMEOUT, executor: str = "subprocess"):
+    """Execution stage that runs each case's script in its own run directory"""
+
+    def run_case(record: dict) -> dict:
+        code = record["script_code"]
+        if browser_type:
+            code = apply_browser_options(code, browser_type, headless)
+        run_dir = new_run_dir("case_" + re.sub(r"[^A-Za-z0-9_-]+", "_", record["id"]))
+        return run_script(code, run_dir=run_dir, timeout=timeout, options=options, executor=executor)
+
+    return run_case
+
+
+def case_test_id(record: dict) -> str:
+    """History key of a structured test case"""
+    return f"{record['id']}:{record['name']}"
+
+
+def run_pipeline(cases: list, generate_script, run_case=None, max_generators: int = DEFAULT_MAX_GENERATORS,
+                 max_executors: int = DEFAULT_MAX_EXECUTORS, on_event=None, scheduler=None) -> list:
+    """Generate and execute every case with overlapping stages; returns the completed records
+
+    on_event(event, record) is called from the calling thread for "generated",
+    "generation_failed", "retrying" and "executed" events, so UIs can update progress safely.
+    With a test_scheduler.SuiteScheduler, cases run failure-first and likely-flaky
+    failures are retried within the scheduler's budget.
+    """
+    run_case = run_case or default_run_case()
+    records = [dict(case) for case in cases]
+    if scheduler is not None:
+        records.sort(key=lambda c: (scheduler.rank(case_test_id(c)), PRIORITY_ORDER.get(c["priority"], 1)))
+        scheduler.start_suite([case_test_id(r) for r in records])
+    else:
+        records.sort(key=lambda c: PRIORITY_ORDER.get(c["priority"], 1))
+    emit = on_event or (lambda event, record: None)
+
+    with ThreadPoolExecutor(max_workers=max_generators) as generators, \
+            ThreadPoolExecutor(max_workers=max_executors) as executors:
+        pending = {generators.submit(generate_script, case_to_steps(r)): ("generate", r) for r in records}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, record = pending.pop(future)
+                if stage == "generate":
+                    try:
+                        record["script_code"] = future.result()
+                    except Exception as e:
+                        record.update(status="error", output=f"Script generation failed: {e}", screenshots=[])
+                        emit("generation_failed", record)
+                        continue
+                    emit("generated", record)
+                    pending[executors.submit(run_case, record)] = ("execute", record)
+                else:
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {"status": "error", "output": f"Execution failed: {e}", "screenshots": []}
+                    record.update(result)
+                    record["attempts"] = record.get("attempts", 0) + 1
+                    if scheduler is not None:
+                        test_id = case_test_id(record)
+                        scheduler.record(test_id, result, record["attempts"])
+                        if scheduler.should_retry(test_id, result, record["attempts"]):
+                            emit("retrying", record)
+                            pending[executors.submit(run_case, record)] = ("execute", record)
+                            continue
+                    emit("executed", record)
+    return records
@@ -0,0 +1,189 @@
+"""
+Failure-first ordering and flaky-aware retries, driven by past run history.
+
+- RunHistory: append-only JSON-lines log of every attempt (run_history.jsonl).
+- SuiteScheduler:
+  * order(): recently failed tests first, then tests without history, then the
+    rest; slowest first inside each group so long tests start early.
+  * should_retry(): only failures of tests whose flakiness score reaches
+    FLAKY_THRESHOLD are retried, within a per-suite retry budget.
+  * summary(): first-fail rate, flaky rate, final fail rate and time to first failure.
+
+Flakiness of a test = max(flip rate between consecutive runs, share of failed
+suites that passed on retry), over the last HISTORY_WINDOW attempts. Retry
+decisions score only earlier suites (the failure being judged is not its own
+evidence), and a test with fewer than MIN_FLIPS flips and no suite recovered on
+retry is not flaky at all, so a first real regression is not retried.
+"""
+
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime
+
+# --- Configuration ---
+HISTORY_FILE = "run_history.jsonl"
+HISTORY_WINDOW = 30          # attempts per test considered for scoring
+RECENT_FAILURE_WINDOW = 3    # a failure among the last N runs counts as "recently failed"
+FLAKY_THRESHOLD = 0.2
+MIN_FLIPS = 2                # pass/fail flips needed before a test can count as flaky
+RETRY_BUDGET_RATIO = 0.2     # retries per suite = ratio * number of tests (at least 1)
+MAX_ATTEMPTS = 3
+
+
+def script_test_id(script_code: str) -> str:
+    """Stable id for a test that has no case id of its own"""
+    return "script-" + hashlib.sha1(script_code.encode("utf-8")).hexdigest()[:12]
+
+
+class RunHistory:
+    """Per-test attempt history, loaded once and appended to on every record()"""
+
+    def __init__(self, path: str = HISTORY_FILE, window: int = HISTORY_WINDOW):
+        self.path = path
+        self._runs = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._runs[entry["test_id"]].append(entry)
+
+    def record(self, test_id: str, status: str, duration: float = None, attempt: int = 1, suite_id: str = None):
+        entry = {
+            "test_id": test_id,
+            "status": status,
+            "duration": duration,
+            "attempt": attempt,
+            "suite_id": suite_id,
+            "timestamp": datetime.now().isoformat()
+        }
+        with self._lock:
+            self._runs[test_id].append(entry)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def runs(self, test_id: str) -> list:
+        with self._lock:
+            return list(self._runs.get(test_id, ()))
+
+    def test_stats(self, test_id: str, exclude_suite: str = None) -> dict:
+        """Scores over the test's history, leaving out exclude_suite's attempts"""
+        runs = [r for r in self.runs(test_id) if exclude_suite is None or r.get("suite_id") != exclude_suite]
+        passed = [r["status"] == "success" for r in runs]
+        durations = [r["duration"] for r in runs if r.get("duration") is not None]
+        flips = sum(1 for a, b in zip(passed, passed[1:]) if a != b)
+
+        # Suites in which the test failed at least once, and those where a retry then passed
+        by_suite = defaultdict(list)
+        for r in runs:
+            if r.get("suite_id"):
+                by_suite[r["suite_id"]].append(r)
+        failed_suites = [s for s in by_suite.values() if any(r["status"] != "success" for r in s)]
+        recovered = sum(
+            1 for s in failed_suites
+            if sorted(s, key=lambda r: r["attempt"])[-1]["status"] == "success"
+        )
+
+        flip_rate = flips / (len(runs) - 1) if len(runs) > 1 else 0.0
+        recovery_rate = recovered / len(failed_suites) if failed_suites else 0.0
+        return {
+            "runs": len(runs),
+            "fail_rate": (passed.count(False) / len(runs)) if runs else 0.0,
+            "recently_failed": not all(passed[-RECENT_FAILURE_WINDOW:]) if runs else False,
+            "avg_duration": sum(durations) / len(durations) if durations else 0.0,
+            "flakiness": max(flip_rate, recovery_rate) if flips >= MIN_FLIPS or recovered else 0.0
+        }
+
+
+class SuiteScheduler:
+    """Orders one suite run and decides which failures earn a retry"""
+
+    def __init__(self, history: RunHistory = None, flaky_threshold: float = FLAKY_THRESHOLD,
+                 retry_budget_ratio: float = RETRY_BUDGET_RATIO, max_attempts: int = MAX_ATTEMPTS):
+        self.history = history or RunHistory()
+        self.flaky_threshold = flaky_threshold
+        self.retry_budget_ratio = retry_budget_ratio
+        self.max_attempts = max_attempts
+        self.suite_id = None
+        self.retry_budget = 0
+        self._results = {}
+        self._started = None
+        self._first_failure_at = None
+        self._lock = threading.Lock()
+
+    def rank(self, test_id: str) -> tuple:
+        stats = self.history.test_stats(test_id)
+        group = 0 if stats["recently_failed"] else (1 if stats["runs"] == 0 else 2)
+        return (group, -stats["avg_duration"])
+
+    def order(self, items: list, key=lambda item: item) -> list:
+        """Sort items (test ids, or records mapped to ids by key) failure-first, then slowest-first"""
+        return sorted(items, key=lambda item: self.rank(key(item)))
+
+    def start_suite(self, test_ids: list) -> str:
+        with self._lock:
+            self.suite_id = uuid.uuid4().hex[:12]
+            self.retry_budget = max(1, math.ceil(len(test_ids) * self.retry_budget_ratio))
+            self._results = {test_id: [] for test_id in test_ids}
+            self._started = time.monotonic()
+            self._first_failure_at = None
+        return self.suite_id
+
+    def record(self, test_id: str, result: dict, attempt: int):
+        status = result.get("status", "error")
+        with self._lock:
+            self._results.setdefault(test_id, []).append(status)
+            if status != "success" and self._first_failure_at is None:
+                self._first_failure_at = time.monotonic() - self._started
+        self.history.record(test_id, status, result.get("duration"), attempt, self.suite_id)
+
+    def should_retry(self, test_id: str, result: dict, attempt: int) -> bool:
+        """True (and one unit of budget spent) for failures of likely-flaky tests"""
+        if result.get("status") == "success" or attempt >= self.max_attempts:
+            return False
+        if self.history.test_stats(test_id, exclude_suite=self.suite_id)["flakiness"] < self.flaky_threshold:
+            return False
+        with self._lock:
+            if self.retry_budget <= 0:
+                return False
+            self.retry_budget -= 1
+            return True
+
+    def summary(self) -> dict:
+        with self._lock:
+            results = dict(self._results)
+            first_failure = self._first_failure_at
+            budget_left = self.retry_budget
+        attempted = [statuses for statuses in results.values() if statuses]
+        total = len(attempted) or 1
+        first_fail = sum(1 for s in attempted if s[0] != "success")
+        flaky = sum(1 for s in attempted if s[0] != "success" and s[-1] == "success")
+        final_fail = sum(1 for s in attempted if s[-1] != "success")
+        return {
+            "suite_id": self.suite_id,
+            "tests": len(attempted),
+            "first_fail_rate": first_fail / total,
+            "flaky_rate": flaky / total,
+            "final_fail_rate": final_fail / total,
+            "retries_used": sum(len(s) - 1 for s in attempted),
+            "retry_budget_left": budget_left,
+            "time_to_first_failure": first_failure
+        }
+
+
+def format_suite_summary(summary: dict) -> str:
+    ttff = f"{summary['time_to_first_failure']:.1f}s" if summary["time_to_first_failure"] is not None else "n/a"
+    return (
+        f"First-fail rate {summary['first_fail_rate'] * 100:.0f}% | flaky rate {summary['flaky_rate'] * 100:.0f}% | "
+        f"final fail rate {summary['final_fail_rate'] * 100:.0f}% | retries used {summary['retries_used']} | "
+        f"time to first failure {ttff}"
+    )
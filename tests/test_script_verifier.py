@@ -0,0 +1,49 @@
+"""Chunking of oversized scripts in the shape script generation produces"""
+
+from model_client import estimate_tokens
+from script_verifier import CHUNK_TOKENS, chunk_script, verify_script
+
+
+def generated_script(steps: int) -> str:
+    """One module-level `with sync_playwright() as p:` block, like generated_playwright_script.py"""
+    lines = ["from playwright.sync_api import sync_playwright", "", "",
+             "with sync_playwright() as p:",
+             "    browser = p.chromium.launch(headless=False)",
+             "    page = browser.new_page()", ""]
+    for i in range(1, steps + 1):
+        lines += [f"    # Step {i}: Fill in field {i} of the form",
+                  f"    page.locator(\"#field-{i}\").fill(\"value number {i}\")",
+                  f"    page.screenshot(path=\"step_{i}.png\")", ""]
+    lines.append("    browser.close()")
+    return "\n".join(lines) + "\n"
+
+
+def test_with_block_is_split_between_steps():
+    code = generated_script(900)
+    split = chunk_script(code)
+    chunks = split["chunks"]
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(c["code"]) <= CHUNK_TOKENS for c in chunks)
+    # The with header opens the first part, the chunks are contiguous and cover every line
+    assert chunks[0]["code"].splitlines()[0] == "with sync_playwright() as p:"
+    assert [c["start"] for c in chunks[1:]] == [c["end"] + 1 for c in chunks[:-1]]
+    assert chunks[-1]["code"].rstrip().endswith("browser.close()")
+    assert "sync_playwright" in split["context"]
+
+
+def test_large_generated_script_verifies_in_budget():
+    prompts = []
+
+    def generate(prompt, label=None):
+        prompts.append(prompt)
+        if estimate_tokens(prompt) > 6000:
+            raise RuntimeError("prompt too large")
+        return "Maintainability Score (1-10): 7/10"
+
+    result = verify_script(generated_script(2000), generate)
+
+    assert result["chunked"]
+    assert len(prompts) > 1
+    assert "failed" not in result["report"].splitlines()[0]
+    assert "Overall Maintainability Score: 7.0/10" in result["report"]
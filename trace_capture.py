@@ -0,0 +1,399 @@
+"""
+Trace/video capture: record the run once, extract per-step frames afterwards.
+
+With capture_mode "trace" every browser context records a Playwright trace
+with screencast frames (no DOM snapshots); with "video" every page records a
+video. Generated scripts still call ``page.screenshot(path="step_N.png")``
+after each step, but in these modes the call only records a step marker (name,
+page and wall-clock time) in trace_manifest.json and returns at once, so no
+image is encoded on the critical path. With screenshot_sample=N every Nth step
+is still captured for real.
+
+After the run, extract_frames() takes for each marker the last recorded frame
+at or just before it and writes it as step_N.jpg next to the sampled PNGs.
+Traces need only the zip; videos need ffmpeg (on PATH or the copy Playwright
+downloads). schedule_extraction() runs this on a background pool so a run's
+result does not wait for it.
+"""
+
+import bisect
+import glob
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# --- Configuration ---
+TRACE_MANIFEST_FILE = "trace_manifest.json"
+TRACE_DIR = "traces"
+VIDEO_DIR = "videos"
+RECORDING_MODES = ("trace", "video")
+TRACE_SNAPSHOTS = False   # DOM snapshots make the trace browsable but cost time on every action
+FRAME_GRACE_MS = 150      # screencast frames arrive slightly after the change they show
+EXTRACT_WORKERS = 2
+FFMPEG_TIMEOUT = 30       # seconds per extracted video frame
+
+_STEP_RE = re.compile(r"step_(\d+)\.png")
+
+_state = {"mode": None, "sample": 0, "steps": [], "pages": [], "traces": [], "tracing": {}, "owners": set(),
+          "page_index": {}}
+
+
+def _write_manifest():
+    manifest = {k: _state[k] for k in ("mode", "sample", "steps", "pages", "traces")}
+    with open(TRACE_MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def _register_page(page):
+    entry = {"index": len(_state["pages"]) + 1, "started": time.time(), "video": None}
+    if _state["mode"] == "video":
+        try:
+            entry["video"] = os.path.relpath(page.video.path())
+        except Exception:
+            pass  # no video for this page (e.g. remote browser)
+    _state["page_index"][id(page)] = entry["index"]
+    _state["pages"].append(entry)
+    _write_manifest()
+
+
+def _start_tracing(context):
+    if _state["mode"] == "trace" and id(context) not in _state["tracing"]:
+        context.tracing.start(screenshots=True, snapshots=TRACE_SNAPSHOTS)
+        _state["tracing"][id(context)] = context
+
+
+def _stop_tracing(context):
+    if _state["tracing"].pop(id(context), None) is None:
+        return
+    path = os.path.join(TRACE_DIR, f"trace_{len(_state['traces']) + 1}.zip")
+    try:
+        context.tracing.stop(path=path)
+        _state["traces"].append(path)
+    except Exception:
+        pass  # context already gone: its frames are lost, steps fall back to sampled screenshots
+    _write_manifest()
+
+
+def install(mode: str, sample_every: int = 0):
+    """Patch the sync API to record traces/videos and turn step screenshots into markers"""
+    from playwright.sync_api import Browser, BrowserContext, Page
+
+    if mode not in RECORDING_MODES:
+        raise ValueError(f"Unsupported recording mode: {mode}")
+    if getattr(Page.screenshot, "_step_marker", False):
+        return
+    _state.update(mode=mode, sample=int(sample_every or 0))
+    video_dir = os.path.abspath(VIDEO_DIR)
+
+    original_new_context = Browser.new_context
+    original_browser_new_page = Browser.new_page
+    original_browser_close = Browser.close
+    original_context_new_page = BrowserContext.new_page
+    original_context_close = BrowserContext.close
+    original_page_close = Page.close
+    original_screenshot = Page.screenshot
+
+    def new_context(self, *args, **kwargs):
+        if mode == "video":
+            kwargs.setdefault("record_video_dir", video_dir)
+        context = original_new_context(self, *args, **kwargs)
+        _start_tracing(context)
+        return context
+
+    def browser_new_page(self, *args, **kwargs):
+        # Browser.new_page creates its own context internally, bypassing new_context above
+        if mode == "video":
+            kwargs.setdefault("record_video_dir", video_dir)
+        page = original_browser_new_page(self, *args, **kwargs)
+        _start_tracing(page.context)
+        _state["owners"].add(id(page))
+        _register_page(page)
+        return page
+
+    def context_new_page(self, *args, **kwargs):
+        page = original_context_new_page(self, *args, **kwargs)
+        _register_page(page)
+        return page
+
+    def context_close(self, *args, **kwargs):
+        _stop_tracing(self)
+        return original_context_close(self, *args, **kwargs)
+
+    def browser_close(self, *args, **kwargs):
+        for context in list(self.contexts):
+            _stop_tracing(context)
+        return original_browser_close(self, *args, **kwargs)
+
+    def page_close(self, *args, **kwargs):
+        if id(self) in _state["owners"]:
+            _stop_tracing(self.context)  # closing an owner page closes its context
+        return original_page_close(self, *args, **kwargs)
+
+    def screenshot(self, *args, **kwargs):
+        path = kwargs.get("path")
+        match = _STEP_RE.fullmatch(os.path.basename(str(path))) if path and not args else None
+        if not match:
+            return original_screenshot(self, *args, **kwargs)
+        step = int(match.group(1))
+        marker = {"path": str(path), "step": step, "time": time.time(), "page": _state["page_index"].get(id(self))}
+        data = b""
+        if _state["sample"] and step % _state["sample"] == 0:
+            data = original_screenshot(self, *args, **kwargs)
+            marker["sampled"] = True
+        _state["steps"].append(marker)
+        _write_manifest()
+        return data
+
+    screenshot._step_marker = True
+    Browser.new_context = new_context
+    Browser.new_page = browser_new_page
+    Browser.close = browser_close
+    BrowserContext.new_page = context_new_page
+    BrowserContext.close = context_close
+    Page.close = page_close
+    Page.screenshot = screenshot
+
+
+def step_capture_instruction(capture_mode: str = "every_step") -> str:
+    """Generation prompt line saying how each step is captured in this mode"""
+    if capture_mode in RECORDING_MODES:
+        return ("- Mark the end of each step with page.screenshot(path='step_1.png'), 'step_2.png', etc. "
+                f"without full_page (the run is recorded as a {capture_mode}, so these calls only mark steps "
+                "and cost nothing; do not add waits for them)")
+    return "- Take a screenshot after each step (save as 'step_1.png', 'step_2.png', etc.)"
+
+
+def finalize():
+    """Save traces of contexts the script left open and flush the manifest"""
+    if not _state["mode"]:
+        return
+    for context in list(_state["tracing"].values()):
+        _stop_tracing(context)
+    _write_manifest()
+
+
+def load_trace_manifest(run_dir: str) -> dict:
+    """Read a run's trace/video manifest ({} if the run was not recorded)"""
+    path = os.path.join(run_dir, TRACE_MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _frame_path(run_dir: str, marker: dict) -> str:
+    return os.path.join(run_dir, os.path.splitext(marker["path"])[0] + ".jpg")
+
+
+def read_trace_frames(trace_path: str) -> list:
+    """[(wall_ms, page_id, entry_name)] of the screencast frames in a trace zip, oldest first"""
+    frames = []
+    with zipfile.ZipFile(trace_path) as archive:
+        names = set(archive.namelist())
+        for name in sorted(n for n in names if n.endswith(".trace")):
+            wall0 = mono0 = None
+            for line in archive.read(name).decode("utf-8", "replace").splitlines():
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get("type") == "context-options":
+                    wall0, mono0 = event.get("wallTime"), event.get("monotonicTime")
+                elif event.get("type") == "screencast-frame":
+                    # Newer traces store frames under screencast/, older ones by sha1 under resources/
+                    entry = event.get("file") or f"resources/{event.get('sha1')}"
+                    if entry not in names:
+                        continue
+                    if wall0 and mono0 is not None:
+                        wall = wall0 + (event["timestamp"] - mono0)
+                    else:
+                        wall = event.get("frameSwapWallTime") or 0
+                    frames.append((wall, event.get("pageId"), entry))
+    frames.sort()
+    return frames
+
+
+def _nearest(frames: list, wall_ms: float):
+    """Last frame at or just before wall_ms, else the first one after it"""
+    index = bisect.bisect_right([f[0] for f in frames], wall_ms + FRAME_GRACE_MS)
+    if index:
+        return frames[index - 1]
+    return frames[0] if frames else None
+
+
+def extract_trace_frames(run_dir: str, manifest: dict) -> dict:
+    by_page, trace_of = {}, {}
+    for trace in manifest.get("traces", []):
+        path = os.path.join(run_dir, trace)
+        if not os.path.exists(path):
+            continue
+        for wall, page_id, entry in read_trace_frames(path):
+            key = (trace, page_id)
+            by_page.setdefault(key, []).append((wall, entry, key))
+            trace_of[key] = path
+    if not by_page:
+        return {"frames": [], "missing": [m["path"] for m in manifest.get("steps", []) if not m.get("sampled")],
+                "error": "No screencast frames recorded"}
+    # Pages are numbered in creation order; match them to trace pages by their first frame
+    pages = sorted(by_page, key=lambda key: by_page[key][0][0])
+    everything = sorted(f for frames in by_page.values() for f in frames)
+    written, missing, archives = [], [], {}
+    try:
+        for marker in manifest.get("steps", []):
+            if marker.get("sampled"):
+                continue
+            page = marker.get("page")
+            frames = by_page[pages[page - 1]] if page and page <= len(pages) else everything
+            frame = _nearest(frames, marker["time"] * 1000)
+            if frame is None:
+                missing.append(marker["path"])
+                continue
+            _, entry, key = frame
+            if trace_of[key] not in archives:
+                archives[trace_of[key]] = zipfile.ZipFile(trace_of[key])
+            out = _frame_path(run_dir, marker)
+            os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+            with open(out, "wb") as f:
+                f.write(archives[trace_of[key]].read(entry))
+            written.append(out)
+    finally:
+        for archive in archives.values():
+            archive.close()
+    return {"frames": written, "missing": missing}
+
+
+def find_ffmpeg() -> str:
+    """ffmpeg on PATH, else the one Playwright installs for video recording (None if neither)"""
+    found = shutil.which("ffmpeg")
+    if found:
+        return found
+    root = os.environ.get("PLAYWRIGHT_BROWSERS_PATH")
+    if not root or root == "0":
+        if sys.platform == "win32":
+            root = os.path.join(os.environ.get("LOCALAPPDATA", ""), "ms-playwright")
+        elif sys.platform == "darwin":
+            root = os.path.expanduser("~/Library/Caches/ms-playwright")
+        else:
+            root = os.path.expanduser("~/.cache/ms-playwright")
+    candidates = sorted(glob.glob(os.path.join(root, "ffmpeg-*", "ffmpeg-*")))
+    return candidates[-1] if candidates else None
+
+
+def _video_frame(ffmpeg: str, video: str, offset: float, out: str) -> bool:
+    # Seeking past the last frame (marker right before close) yields nothing: retry from the end
+    for seek in (["-ss", f"{max(0.0, offset):.3f}"], ["-sseof", "-0.5"]):
+        subprocess.run([ffmpeg, "-y", "-loglevel", "error", *seek, "-i", video, "-frames:v", "1", "-q:v", "3", out],
+                       capture_output=True, timeout=FFMPEG_TIMEOUT)
+        if os.path.exists(out) and os.path.getsize(out):
+            return True
+    return False
+
+
+def extract_video_frames(run_dir: str, manifest: dict) -> dict:
+    ffmpeg = find_ffmpeg()
+    pending = [m for m in manifest.get("steps", []) if not m.get("sampled")]
+    if ffmpeg is None:
+        return {"frames": [], "missing": [m["path"] for m in pending], "error": "ffmpeg not found"}
+    pages = {p["index"]: p for p in manifest.get("pages", []) if p.get("video")}
+    written, missing = [], []
+    for marker in pending:
+        page = pages.get(marker.get("page")) or next(iter(pages.values()), None)
+        video = os.path.join(run_dir, page["video"]) if page else None
+        out = _frame_path(run_dir, marker)
+        if video and os.path.exists(video) and _video_frame(ffmpeg, video, marker["time"] - page["started"], out):
+            written.append(out)
+        else:
+            missing.append(marker["path"])
+    return {"frames": written, "missing": missing}
+
+
+def extract_frames(run_dir: str) -> dict:
+    """Write step_N.jpg for every unsampled step marker of a recorded run"""
+    started = time.perf_counter()
+    manifest = load_trace_manifest(run_dir)
+    if not manifest.get("mode"):
+        return {"frames": [], "missing": [], "error": "Run was not recorded"}
+    try:
+        if manifest["mode"] == "trace":
+            result = extract_trace_frames(run_dir, manifest)
+        else:
+            result = extract_video_frames(run_dir, manifest)
+    except Exception as e:
+        result = {"frames": [], "missing": [m["path"] for m in manifest.get("steps", []) if not m.get("sampled")],
+                  "error": str(e)}
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def recording_stats(run_dir: str) -> dict:
+    """Capture summary of a recorded run, shaped like change_capture's (None if not recorded)"""
+    manifest = load_trace_manifest(run_dir)
+    if not manifest.get("mode"):
+        return None
+    steps = manifest.get("steps", [])
+    sampled = sum(1 for m in steps if m.get("sampled"))
+    return {
+        "mode": manifest["mode"],
+        "captured": sampled,
+        "skipped": len(steps) - sampled,
+        "recordings": manifest.get("traces", []) + [p["video"] for p in manifest.get("pages", []) if p.get("video")],
+        "frames_pending": True
+    }
+
+
+_pool = None
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def schedule_extraction(run_dir: str):
+    """Extract a run's frames on the background pool; returns the Future"""
+    global _pool
+    with _pending_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=EXTRACT_WORKERS, thread_name_prefix="frame-extract")
+        future = _pool.submit(extract_frames, run_dir)
+        _pending[os.path.abspath(run_dir)] = future
+    return future
+
+
+def wait_for_frames(run_dir: str, timeout: float = None) -> dict:
+    """Extraction result for run_dir once done; None while still running after timeout
+
+    Returns {} when nothing was scheduled (e.g. after a restart) so callers simply
+    collect whatever frames are on disk.
+    """
+    key = os.path.abspath(run_dir)
+    with _pending_lock:
+        future = _pending.get(key)
+    if future is None:
+        return {}
+    try:
+        result = future.result(timeout)
+    except FutureTimeoutError:
+        return None
+    except Exception as e:
+        result = {"frames": [], "missing": [], "error": str(e)}
+    with _pending_lock:
+        if _pending.get(key) is future:
+            del _pending[key]
+    return result
+
+
+def clear_recordings(run_dir: str):
+    """Remove the traces, videos and manifest of a previous recorded run"""
+    for name in (TRACE_DIR, VIDEO_DIR):
+        shutil.rmtree(os.path.join(run_dir, name), ignore_errors=True)
+    path = os.path.join(run_dir, TRACE_MANIFEST_FILE)
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,205 @@
+"""
+Visual regression engine for step screenshots.
+
+- compare_images: NumPy-vectorized pixel diff with per-channel tolerance,
+  ignore regions and a diff image (changed pixels in red over a dimmed capture).
+- PerceptualHashIndex: 64-bit difference hashes (dHash) kept in a NumPy array so
+  the closest baseline among thousands is found with one vectorized popcount.
+- BaselineStore: baselines/<test_key>/step_N.png plus the hash index; check_run()
+  flags regressions for a whole run automatically. Given a run_dir it copies the
+  run's screenshots there first and writes the diffs next to them, so a result
+  keeps pointing at its own images after the next run overwrites step_N.png.
+
+Requires: pip install numpy pillow
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+from PIL import Image
+
+# --- Configuration ---
+BASELINE_DIR = "baselines"
+INDEX_FILE = "phash_index.json"
+PIXEL_TOLERANCE = 16        # max per-channel delta (0-255) still treated as equal
+MAX_DIFF_RATIO = 0.001      # fraction of changed pixels tolerated before flagging
+NEAREST_MAX_DISTANCE = 10   # hamming distance (of 64 bits) for "same screen" lookups
+
+
+def load_image(path: str) -> np.ndarray:
+    """Load an image as an RGB uint8 array"""
+    with Image.open(path) as img:
+        return np.asarray(img.convert("RGB"))
+
+
+def ignore_mask(shape: tuple, ignore_regions: list) -> np.ndarray:
+    """Boolean HxW mask that is True inside any (x, y, width, height) ignore region"""
+    mask = np.zeros(shape[:2], dtype=bool)
+    for x, y, w, h in ignore_regions or []:
+        mask[max(0, y):max(0, y + h), max(0, x):max(0, x + w)] = True
+    return mask
+
+
+def compare_images(baseline_path: str, current_path: str, pixel_tolerance: int = PIXEL_TOLERANCE,
+                   max_diff_ratio: float = MAX_DIFF_RATIO, ignore_regions: list = None,
+                   diff_path: str = None) -> dict:
+    """Diff current_path against baseline_path and optionally write a diff image"""
+    baseline = load_image(baseline_path)
+    current = load_image(current_path)
+
+    if baseline.shape != current.shape:
+        # Compare the overlapping area; every pixel outside it counts as changed
+        h = min(baseline.shape[0], current.shape[0])
+        w = min(baseline.shape[1], current.shape[1])
+        total = max(baseline.shape[0] * baseline.shape[1], current.shape[0] * current.shape[1])
+        extra = total - h * w
+        baseline, current_overlap = baseline[:h, :w], current[:h, :w]
+    else:
+        total, extra, current_overlap = baseline.shape[0] * baseline.shape[1], 0, current
+
+    delta = np.abs(baseline.astype(np.int16) - current_overlap.astype(np.int16)).max(axis=2)
+    changed = delta > pixel_tolerance
+    ignored = ignore_mask(changed.shape, ignore_regions)
+    changed &= ~ignored
+
+    compared = total - int(ignored.sum())
+    diff_pixels = int(changed.sum()) + extra
+    diff_ratio = diff_pixels / compared if compared else 0.0
+
+    if diff_path:
+        overlay = (current_overlap * 0.3).astype(np.uint8)
+        overlay[changed] = (255, 0, 0)
+        overlay[ignored] = (current_overlap[ignored] * 0.3 + np.array([0, 0, 120])).astype(np.uint8)
+        Image.fromarray(overlay).save(diff_path)
+
+    return {
+        "baseline": baseline_path,
+        "current": current_path,
+        "diff_pixels": diff_pixels,
+        "diff_ratio": diff_ratio,
+        "size_mismatch": extra > 0,
+        "passed": diff_ratio <= max_diff_ratio,
+        "diff_image": diff_path
+    }
+
+
+def dhash(path: str, hash_size: int = 8) -> int:
+    """64-bit difference hash: robust to scaling/compression, sensitive to layout"""
+    with Image.open(path) as img:
+        small = np.asarray(img.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+class PerceptualHashIndex:
+    """Vectorized nearest-neighbour lookup over dHashes by Hamming distance"""
+
+    def __init__(self):
+        self.paths = []
+        self._hashes = np.zeros(0, dtype=np.uint64)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def add(self, path: str, image_hash: int = None):
+        image_hash = dhash(path) if image_hash is None else image_hash
+        if path in self.paths:
+            self._hashes[self.paths.index(path)] = image_hash
+            return
+        self.paths.append(path)
+        self._hashes = np.append(self._hashes, np.uint64(image_hash))
+
+    def remove(self, path: str):
+        if path in self.paths:
+            i = self.paths.index(path)
+            del self.paths[i]
+            self._hashes = np.delete(self._hashes, i)
+
+    def nearest(self, image_hash: int, k: int = 1) -> list:
+        """Return [(path, distance)] for the k closest hashes"""
+        if not self.paths:
+            return []
+        xor = np.bitwise_xor(self._hashes, np.uint64(image_hash))
+        distances = np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+        order = np.argsort(distances, kind="stable")[:k]
+        return [(self.paths[i], int(distances[i])) for i in order]
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({p: str(int(h)) for p, h in zip(self.paths, self._hashes)}, f)
+
+    @classmethod
+    def load(cls, path: str):
+        index = cls()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            index.paths = list(data.keys())
+            index._hashes = np.array([int(h) for h in data.values()], dtype=np.uint64)
+        return index
+
+
+class BaselineStore:
+    """Baseline images on disk under baseline_dir/<test_key>/ plus their perceptual-hash index"""
+
+    def __init__(self, baseline_dir: str = BASELINE_DIR):
+        self.baseline_dir = baseline_dir
+        os.makedirs(baseline_dir, exist_ok=True)
+        self.index_path = os.path.join(baseline_dir, INDEX_FILE)
+        self.index = PerceptualHashIndex.load(self.index_path)
+
+    def baseline_path(self, test_key: str, screenshot: str) -> str:
+        return os.path.join(self.baseline_dir, test_key, os.path.basename(screenshot))
+
+    def approve(self, test_key: str, screenshot: str) -> str:
+        """Store (or replace) screenshot as the baseline for its step"""
+        target = self.baseline_path(test_key, screenshot)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(screenshot, target)
+        self.index.add(target)
+        self.index.save(self.index_path)
+        return target
+
+    def find_closest(self, screenshot: str, max_distance: int = NEAREST_MAX_DISTANCE):
+        """Closest stored baseline by perceptual hash, or None if nothing is similar enough"""
+        matches = self.index.nearest(dhash(screenshot), k=1)
+        if matches and matches[0][1] <= max_distance:
+            return matches[0]
+        return None
+
+    def check_run(self, test_key: str, screenshots: list, ignore_regions: list = None,
+                  pixel_tolerance: int = PIXEL_TOLERANCE, max_diff_ratio: float = MAX_DIFF_RATIO,
+                  record_missing: bool = True, run_dir: str = None) -> dict:
+        """Compare every step screenshot with its baseline and flag regressions"""
+        steps = []
+        if run_dir:
+            os.makedirs(run_dir, exist_ok=True)
+        for screenshot in screenshots:
+            if run_dir:
+                screenshot = shutil.copy2(screenshot, os.path.join(run_dir, os.path.basename(screenshot)))
+            baseline = self.baseline_path(test_key, screenshot)
+            matched_by = "step"
+            if not os.path.exists(baseline):
+                closest = self.find_closest(screenshot)
+                if closest is None:
+                    steps.append({
+                        "current": screenshot,
+                        "status": "new",
+                        "baseline": self.approve(test_key, screenshot) if record_missing else None
+                    })
+                    continue
+                baseline, matched_by = closest[0], "phash"
+            diff_path = os.path.join(os.path.dirname(screenshot), "diff_" + os.path.basename(screenshot))
+            result = compare_images(baseline, screenshot, pixel_tolerance, max_diff_ratio, ignore_regions, diff_path)
+            result["status"] = "passed" if result["passed"] else "regression"
+            result["matched_by"] = matched_by
+            steps.append(result)
+        return {
+            "test_key": test_key,
+            "run_dir": run_dir,
+            "steps": steps,
+            "regressions": sum(1 for s in steps if s["status"] == "regression"),
+            "new_baselines": sum(1 for s in steps if s["status"] == "new")
+        }